@@ -453,36 +453,45 @@ class UniversalCVClassifier:
         
         return min(score, 100)
 
+    def _classification_fields(self, text: str) -> Tuple[Dict, List[Habilidad], List[Lenguaje]]:
+        """Clasificación por regex y keywords: (campos del CV, habilidades, idiomas)"""
+        contact_info = self.extract_contact_info(text)
+        name = self.extract_name(text)
+        years = self.extract_years_experience(text)
+        industria = self.classify_industry(text)
+        rol = self.classify_role(text)
+        puesto = self.map_seniority_to_puesto(years)
+        habilidades = self.extract_skills(text)
+        lenguajes = self.extract_languages(text)
+
+        # Calcular score
+        overall_score = self.score_cv(text, contact_info, years, habilidades, lenguajes)
+
+        campos = dict(
+            nombre_completo=name,
+            email=contact_info["email"],
+            telefono=contact_info["telefono"],
+            linkedin_url=contact_info["linkedin_url"],
+            github_url=contact_info["github_url"],
+            portafolio_url=contact_info["portafolio_url"],
+            anhos_experiencia=years,
+            overall_score=overall_score,
+            id_industria=industria.id if industria else None,
+            id_rol=rol.id if rol else None,
+            id_puesto=puesto.id if puesto else None,
+        )
+        return campos, habilidades, lenguajes
+
     def save_cv(self, text: str, filename: str) -> CV:
         """Guarda el CV procesado en la base de datos - CON MANEJO DE ERRORES"""
         try:
-            contact_info = self.extract_contact_info(text)
-            name = self.extract_name(text)
-            years = self.extract_years_experience(text)
-            industria = self.classify_industry(text)
-            rol = self.classify_role(text)
-            puesto = self.map_seniority_to_puesto(years)
-            habilidades = self.extract_skills(text)
-            lenguajes = self.extract_languages(text)
-            
-            # Calcular score
-            overall_score = self.score_cv(text, contact_info, years, habilidades, lenguajes)
+            campos, habilidades, lenguajes = self._classification_fields(text)
 
             nuevo_cv = CV(
                 filename=filename,
                 contenido=text,
-                nombre_completo=name,
-                email=contact_info["email"],
-                telefono=contact_info["telefono"],
-                linkedin_url=contact_info["linkedin_url"],
-                github_url=contact_info["github_url"],
-                portafolio_url=contact_info["portafolio_url"],
-                anhos_experiencia=years,
-                overall_score=overall_score,
-                id_industria=industria.id if industria else None,
-                id_rol=rol.id if rol else None,
-                id_puesto=puesto.id if puesto else None,
-                processed_status="completed"
+                processed_status="completed",
+                **campos
             )
             
             # Asociar habilidades e idiomas (relaciones many-to-many)
@@ -496,11 +505,11 @@ class UniversalCVClassifier:
             self.db.refresh(nuevo_cv)
             
             print(f"CV procesado exitosamente: {filename}")
-            print(f"  - Nombre: {name}")
-            print(f"  - Email: {contact_info['email']}")
-            print(f"  - Teléfono: {contact_info['telefono']}")
-            print(f"  - Años experiencia: {years}")
-            print(f"  - Score: {overall_score}")
+            print(f"  - Nombre: {campos['nombre_completo']}")
+            print(f"  - Email: {campos['email']}")
+            print(f"  - Teléfono: {campos['telefono']}")
+            print(f"  - Años experiencia: {campos['anhos_experiencia']}")
+            print(f"  - Score: {campos['overall_score']}")
             print(f"  - Habilidades encontradas: {len(habilidades)}")
             print(f"  - Idiomas encontrados: {len(lenguajes)}")
             
@@ -524,6 +533,29 @@ class UniversalCVClassifier:
             
             return cv_error
 
+    def classify_existing_cv(self, cv: CV) -> CV:
+        """
+        Clasifica con regex un CV ya creado (ej: el registro de un job de /upload)
+        usando su contenido extraído. Es la vía rápida del modo tiered: el
+        análisis con Ollama reemplaza estos campos cuando termina.
+        """
+        try:
+            campos, habilidades, lenguajes = self._classification_fields(cv.contenido)
+            for campo, valor in campos.items():
+                setattr(cv, campo, valor)
+            cv.habilidades = habilidades
+            cv.lenguajes = lenguajes
+            cv.processing_method = "regex_fast"
+
+            self.db.commit()
+            print(f"[INFO] CV {cv.id} clasificado por regex: rol={cv.rol.nombre if cv.rol else 'N/A'}, score={cv.overall_score}")
+            return cv
+
+        except Exception as e:
+            self.db.rollback()
+            print(f"[ERROR] Error en la clasificación rápida del CV {cv.id}: {e}")
+            raise
+
     def get_cv_analysis(self, cv_id: int) -> Dict:
         """Obtiene análisis detallado de un CV"""
         try:
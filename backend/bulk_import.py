@@ -0,0 +1,200 @@
+"""
+Importación masiva de CVs sin pasar por HTTP.
+
+Uso:
+    python bulk_import.py /ruta/a/cvs --llm-concurrency 4 --chunk-size 32
+
+Recorre el directorio (recursivamente), y procesa los PDFs por ventanas con el
+mismo pipeline por lotes de /upload/batch: extracción en pool de procesos,
+análisis con Ollama con concurrencia acotada, inserts en bloque, un encode y un
+upsert a ChromaDB por chunk.
+
+Volver a ejecutar el mismo comando reanuda la importación: los PDFs ya
+completados se saltan por su huella SHA-256 y los que quedaron a mitad
+retoman desde su último checkpoint.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, List, Tuple
+
+
+def find_pdfs(root: str) -> List[str]:
+    """Lista ordenada de PDFs bajo root"""
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for nombre in filenames:
+            if nombre.lower().endswith(".pdf"):
+                paths.append(os.path.join(dirpath, nombre))
+    return sorted(paths)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def find_existing_by_hash(file_hashes: List[str]) -> Tuple[set, Dict[str, Tuple[int, str]]]:
+    """
+    Retorna (huellas ya completadas, {huella: (cv_id, filename)} de CVs a medio procesar)
+    """
+    from database import SessionLocal
+    from model import CV
+
+    db = SessionLocal()
+    try:
+        rows = db.query(CV.id, CV.filename, CV.file_sha256, CV.processed_status).filter(
+            CV.file_sha256.in_(file_hashes)
+        ).order_by(CV.id).all()
+    finally:
+        db.close()
+
+    completados = {r.file_sha256 for r in rows if r.processed_status == "completed"}
+    parciales = {}
+    for r in rows:
+        if r.file_sha256 not in completados:
+            # Si hay varios intentos previos se retoma el más reciente
+            parciales[r.file_sha256] = (r.id, r.filename)
+    return completados, parciales
+
+
+async def resume_partial(main, parciales: List[Tuple[int, bytes, str]], concurrency: int) -> Tuple[int, int]:
+    """Retoma CVs que quedaron a mitad usando los checkpoints de process_cv_job"""
+    slots = asyncio.Semaphore(concurrency)
+    ok = 0
+    errores = 0
+
+    async def retomar(cv_id: int, content: bytes, filename: str):
+        nonlocal ok, errores
+        async with slots:
+            try:
+                await main.process_cv_job(cv_id, content, filename)
+                ok += 1
+            except Exception as e:
+                errores += 1
+                print(f"[ERROR] {filename} (CV {cv_id}): {e}")
+
+    await asyncio.gather(*[retomar(cv_id, content, filename) for cv_id, content, filename in parciales])
+    return ok, errores
+
+
+async def run_import(args) -> Dict:
+    # Importar la app carga el modelo de embeddings, ChromaDB y los clientes de Ollama
+    import main
+    from executors import get_io_executor, run_in, shutdown_executors
+
+    paths = find_pdfs(args.directory)
+    total = len(paths)
+    print(f"[INFO] {total} PDFs encontrados en {args.directory}")
+
+    io_pool = get_io_executor()
+    window_size = args.chunk_size * args.window_chunks
+    started = time.perf_counter()
+    totales = {"completed": 0, "duplicates": 0, "reused_analyses": 0, "resumed": 0, "skipped": 0, "errors": 0}
+    stage_seconds: Dict[str, float] = {}
+
+    try:
+        for window_start in range(0, total, window_size):
+            window = paths[window_start:window_start + window_size]
+            t0 = time.perf_counter()
+
+            contents = await asyncio.gather(*[run_in(io_pool, read_file, p) for p in window])
+            file_hashes = [hashlib.sha256(c).hexdigest() for c in contents]
+            read_seconds = time.perf_counter() - t0
+            stage_seconds["lectura"] = stage_seconds.get("lectura", 0.0) + read_seconds
+
+            # ===== Reanudación =====
+            completados, parciales = await run_in(io_pool, find_existing_by_hash, file_hashes)
+            nuevos = []
+            a_retomar = []
+            vistos = set()
+            for path, content, file_sha256 in zip(window, contents, file_hashes):
+                if file_sha256 in completados or file_sha256 in vistos:
+                    totales["skipped"] += 1
+                    continue
+                vistos.add(file_sha256)
+                if file_sha256 in parciales:
+                    cv_id, filename = parciales[file_sha256]
+                    a_retomar.append((cv_id, content, filename))
+                else:
+                    nuevos.append((os.path.basename(path), content))
+
+            if a_retomar:
+                t0 = time.perf_counter()
+                ok, errores = await resume_partial(main, a_retomar, args.llm_concurrency)
+                totales["resumed"] += ok
+                totales["errors"] += errores
+                stage_seconds["reanudacion"] = stage_seconds.get("reanudacion", 0.0) + time.perf_counter() - t0
+
+            # ===== Pipeline por lotes =====
+            if nuevos:
+                report = await main.process_cv_batch(nuevos, args.llm_concurrency, args.chunk_size)
+                for clave in ("completed", "duplicates", "reused_analyses", "errors"):
+                    totales[clave] += report[clave]
+                for etapa, segundos in report["stage_seconds"].items():
+                    stage_seconds[etapa] = stage_seconds.get(etapa, 0.0) + segundos
+                if args.verbose:
+                    for r in report["results"]:
+                        if r["status"] == "error":
+                            print(f"[ERROR] {r['filename']}: {r.get('error')}")
+
+            elapsed = time.perf_counter() - started
+            hechos = min(window_start + len(window), total)
+            procesados = totales["completed"] + totales["resumed"]
+            print(
+                f"[PROGRESO] {hechos}/{total} archivos | "
+                f"completados={totales['completed']} reanudados={totales['resumed']} "
+                f"saltados={totales['skipped']} errores={totales['errors']} | "
+                f"{procesados * 60 / elapsed:.1f} CVs/min"
+            )
+    finally:
+        shutdown_executors()
+
+    elapsed = time.perf_counter() - started
+    procesados = totales["completed"] + totales["resumed"]
+    return {
+        "total_files": total,
+        **totales,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_cvs_per_minute": round(procesados * 60 / elapsed, 2) if elapsed > 0 else 0,
+        "stage_seconds": {k: round(v, 2) for k, v in stage_seconds.items()},
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Importación masiva de CVs en PDF (sin HTTP)")
+    parser.add_argument("directory", help="Directorio con los PDFs (se recorre recursivamente)")
+    parser.add_argument("--llm-concurrency", type=int, default=int(os.getenv("BATCH_LLM_CONCURRENCY", "2")),
+                        help="Análisis con Ollama en paralelo")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("BATCH_CHUNK_SIZE", "32")),
+                        help="CVs por chunk (un insert, un encode y un upsert por chunk)")
+    parser.add_argument("--window-chunks", type=int, default=8,
+                        help="Chunks leídos a memoria por ventana")
+    parser.add_argument("--extract-workers", type=int, default=None,
+                        help="Procesos para la extracción con pdfplumber")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar el error de cada archivo fallido")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.extract_workers:
+        # Debe definirse antes de importar executors
+        os.environ["EXTRACT_PROCESSES"] = str(args.extract_workers)
+
+    resumen = asyncio.run(run_import(args))
+
+    print("\n========== RESUMEN ==========")
+    print(f"Archivos encontrados: {resumen['total_files']}")
+    print(f"Completados:          {resumen['completed']}")
+    print(f"Reanudados:           {resumen['resumed']}")
+    print(f"Análisis reutilizados:{resumen['reused_analyses']:>5}")
+    print(f"Duplicados/saltados:  {resumen['duplicates'] + resumen['skipped']}")
+    print(f"Errores:              {resumen['errors']}")
+    print(f"Tiempo total:         {resumen['elapsed_seconds']} s")
+    print(f"Throughput:           {resumen['throughput_cvs_per_minute']} CVs/min")
+    print("Tiempo por etapa (s):")
+    for etapa, segundos in resumen["stage_seconds"].items():
+        print(f"  - {etapa}: {segundos}")
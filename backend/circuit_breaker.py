@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Llamadas fallidas seguidas (con todos los hosts caídos) para abrir el circuito
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# Tiempo abierto antes de dejar pasar una llamada de prueba
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El backend está marcado como caído; la llamada se rechaza sin intentarla"""
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"Circuito '{name}' abierto; próximo intento en {retry_in:.0f}s")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para un backend completo (todos los hosts de Ollama).
+
+    closed: las llamadas pasan; tras CIRCUIT_FAILURE_THRESHOLD fallos seguidos
+    se abre. open: allow() lanza CircuitOpenError al instante, así quien llama
+    pasa directo a su fallback en lugar de esperar un error de conexión.
+    Pasado CIRCUIT_RESET_SECONDS (o antes, si el chequeo de salud ve un host
+    vivo) queda half_open: se deja pasar una llamada de prueba; si funciona
+    el circuito se cierra y si falla vuelve a abrirse.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    def _retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        """True si una llamada ahora sería rechazada (no consume la llamada de prueba)"""
+        with self._lock:
+            return self.state == OPEN and self._retry_in() > 0
+
+    def allow(self):
+        """Lanza CircuitOpenError si el circuito está abierto"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and self._retry_in() <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                # Una sola llamada de prueba: mientras no se resuelva, el resto sigue rechazado
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                print(f"[INFO] Circuito '{self.name}': llamada de prueba")
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self._retry_in())
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.opened_at = None
+                print(f"[SUCCESS] Circuito '{self.name}' cerrado: el backend respondió")
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error)[:200]
+            if self.state != OPEN and self.consecutive_failures >= self.failure_threshold:
+                self.times_opened += 1
+                print(f"[WARNING] Circuito '{self.name}' abierto tras {self.consecutive_failures} fallos: {error}")
+            if self.consecutive_failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def probe_succeeded(self):
+        """El chequeo de salud vio el backend vivo: adelantar la llamada de prueba"""
+        with self._lock:
+            if self.state == OPEN:
+                self.state = HALF_OPEN
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in_seconds": round(self._retry_in(), 1) if self.state == OPEN else None,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
+
+
+# Circuito compartido por todas las llamadas a Ollama (ver ollama_pool)
+ollama_breaker = CircuitBreaker("ollama")
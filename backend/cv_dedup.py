@@ -0,0 +1,47 @@
+import hashlib
+import re
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from unidecode import unidecode
+
+from model import CV
+
+
+def sha256_bytes(content: bytes) -> str:
+    """Huella SHA-256 de los bytes crudos del archivo"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def normalize_text_for_hash(text: str) -> str:
+    """
+    Normaliza el texto extraído para que diferencias de formato
+    (mayúsculas, acentos, espacios, saltos de línea) no cambien la huella
+    """
+    text = unidecode(text or "").lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def sha256_text(text: str) -> str:
+    """Huella SHA-256 del texto extraído normalizado"""
+    return hashlib.sha256(normalize_text_for_hash(text).encode("utf-8")).hexdigest()
+
+
+def find_by_file_hash(db: Session, file_sha256: str) -> Optional[CV]:
+    """CV ya procesado con exactamente los mismos bytes"""
+    return db.query(CV).filter(
+        CV.file_sha256 == file_sha256,
+        CV.processed_status == "completed"
+    ).order_by(CV.id).first()
+
+
+def find_by_text_hash(db: Session, text_sha256: str, exclude_id: Optional[int] = None) -> Optional[CV]:
+    """CV ya procesado con el mismo texto y con análisis guardado"""
+    query = db.query(CV).filter(
+        CV.text_sha256 == text_sha256,
+        CV.processed_status == "completed",
+        CV.analysis_json.isnot(None)
+    )
+    if exclude_id is not None:
+        query = query.filter(CV.id != exclude_id)
+    return query.order_by(CV.id).first()
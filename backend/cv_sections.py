@@ -0,0 +1,73 @@
+import os
+import re
+from typing import Dict, List
+
+from unidecode import unidecode
+
+
+# CVs más largos que esto se analizan por secciones en paralelo
+CV_SECTION_SPLIT_CHARS = int(os.getenv("CV_SECTION_SPLIT_CHARS", "6000"))
+
+# Títulos de sección (normalizados: sin acentos y en minúsculas) que abren cada sección
+SECTION_HEADINGS: Dict[str, List[str]] = {
+    "perfil": ["perfil", "resumen", "sobre mi", "acerca de mi", "objetivo", "summary", "profile", "about me"],
+    "experiencia": ["experiencia", "historial laboral", "trayectoria", "antecedentes laborales",
+                    "experience", "work history", "employment"],
+    "educacion": ["educacion", "formacion", "estudios", "education", "academic"],
+    "certificaciones": ["certificaciones", "certificados", "cursos", "capacitaciones", "certifications", "courses"],
+    "habilidades": ["habilidades", "competencias", "conocimientos", "aptitudes", "herramientas",
+                    "tecnologias", "skills", "technical skills"],
+    "idiomas": ["idiomas", "lenguajes", "languages"],
+    "proyectos": ["proyectos", "projects", "portafolio", "portfolio"],
+    "referencias": ["referencias", "references"],
+}
+
+
+def _normalize_heading(line: str) -> str:
+    texto = unidecode(line).lower()
+    texto = re.sub(r"[^a-z0-9 ]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def detect_heading(line: str):
+    """Retorna la sección que abre la línea si parece un título, o None"""
+    limpia = line.strip()
+    if not limpia or len(limpia) > 50 or re.search(r"\d", limpia):
+        return None
+    normalizada = _normalize_heading(limpia)
+    if not normalizada or len(normalizada.split()) > 4:
+        return None
+    for seccion, titulos in SECTION_HEADINGS.items():
+        for titulo in titulos:
+            if normalizada == titulo or normalizada.startswith(titulo + " "):
+                return seccion
+    return None
+
+
+def split_cv_sections(text: str) -> Dict[str, str]:
+    """
+    Divide el texto del CV en secciones por sus títulos. Lo que aparece antes
+    del primer título (nombre, datos de contacto) queda en "contacto".
+    Si un título se repite, su contenido se concatena.
+    """
+    secciones: Dict[str, List[str]] = {"contacto": []}
+    actual = "contacto"
+    for line in text.splitlines():
+        seccion = detect_heading(line)
+        if seccion:
+            actual = seccion
+            secciones.setdefault(actual, [])
+            continue
+        secciones[actual].append(line)
+
+    return {
+        nombre: "\n".join(lineas).strip()
+        for nombre, lineas in secciones.items()
+        if "\n".join(lineas).strip()
+    }
+
+
+def should_split(text: str, sections: Dict[str, str]) -> bool:
+    """Solo conviene dividir CVs largos con al menos dos secciones reconocidas además del encabezado"""
+    reconocidas = [s for s in sections if s != "contacto"]
+    return len(text) > CV_SECTION_SPLIT_CHARS and len(reconocidas) >= 2
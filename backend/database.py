@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from model import Base
+from migrations import migrate
 from dotenv import load_dotenv
 import os
 load_dotenv()
@@ -12,3 +13,4 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Crear tablas
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate(engine)
@@ -0,0 +1,69 @@
+import os
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _seconds(name: str, default: str) -> Optional[float]:
+    """Segundos desde el entorno; 0 o negativo desactiva el plazo"""
+    valor = float(os.getenv(name, default))
+    return valor if valor > 0 else None
+
+
+# Plazo de cada llamada a Ollama según su tipo
+LLM_CALL_DEADLINE_SECONDS = _seconds("LLM_CALL_DEADLINE_SECONDS", "180")
+LLM_SECTION_DEADLINE_SECONDS = _seconds("LLM_SECTION_DEADLINE_SECONDS", "90")
+ASK_LLM_DEADLINE_SECONDS = _seconds("ASK_LLM_DEADLINE_SECONDS", "60")
+# Presupuesto total de una petición (incluye la espera en la cola del LLM)
+UPLOAD_BUDGET_SECONDS = _seconds("UPLOAD_BUDGET_SECONDS", "600")
+ASK_BUDGET_SECONDS = _seconds("ASK_BUDGET_SECONDS", "90")
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el plazo de una llamada o el presupuesto de la petición"""
+    # Secciones válidas recibidas antes del corte (las adjunta quien consume el stream)
+    partial = None
+
+    def __init__(self, name: str, seconds: Optional[float]):
+        self.name = name
+        self.seconds = seconds
+        super().__init__(f"Plazo agotado en '{name}' ({seconds:.1f}s)" if seconds else f"Plazo agotado en '{name}'")
+
+
+class Deadline:
+    """
+    Plazo absoluto (reloj monotónico). seconds=None no vence nunca.
+    child() deriva el plazo de una etapa: el menor entre el propio de la
+    etapa y lo que le queda a la petición.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, name: str = "request"):
+        self.name = name
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded(self.name, self.seconds)
+
+    def child(self, seconds: Optional[float], name: str) -> "Deadline":
+        restante = self.remaining()
+        if restante is None:
+            return Deadline(seconds, name)
+        if seconds is None or restante < seconds:
+            # Vence con la petición: se reporta con el nombre del presupuesto
+            hijo = Deadline(restante, name)
+            hijo.seconds = self.seconds
+            return hijo
+        return Deadline(seconds, name)
@@ -0,0 +1,64 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "1"))
+IO_THREADS = int(os.getenv("IO_THREADS", "4"))
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_embedding_pool: Optional[ThreadPoolExecutor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """
+    Pool de procesos para extracción con pdfplumber (CPU-bound).
+    Se usa "spawn" para no heredar el modelo de embeddings ni los hilos del servidor.
+    """
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _extraction_pool
+
+
+def get_embedding_executor() -> ThreadPoolExecutor:
+    """Hilos dedicados a SentenceTransformer.encode (torch libera el GIL)"""
+    global _embedding_pool
+    if _embedding_pool is None:
+        _embedding_pool = ThreadPoolExecutor(max_workers=EMBEDDING_THREADS, thread_name_prefix="embedding")
+    return _embedding_pool
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Hilos para I/O bloqueante: SQLAlchemy, ChromaDB y disco"""
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+    return _io_pool
+
+
+async def run_in(executor: Executor, fn: Callable, *args, **kwargs):
+    """Ejecuta fn en el executor indicado sin bloquear el event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_executors():
+    global _extraction_pool, _embedding_pool, _io_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+    if _embedding_pool is not None:
+        _embedding_pool.shutdown(wait=False, cancel_futures=True)
+        _embedding_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
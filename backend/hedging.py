@@ -0,0 +1,192 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Set
+
+from dotenv import load_dotenv
+
+from deadlines import Deadline
+from llm_scheduler import PriorityScheduler, llm_scheduler
+from ollama_pool import OllamaPool
+
+load_dotenv()
+
+# Hedging de /ask: si el primer host no da un token a tiempo, se repite la petición en otro
+ASK_HEDGE_ENABLED = os.getenv("ASK_HEDGE_ENABLED", "false").lower() == "true"
+# Percentil del tiempo al primer token que se espera antes de lanzar la segunda petición
+ASK_HEDGE_PERCENTILE = float(os.getenv("ASK_HEDGE_PERCENTILE", "0.95"))
+# Espera usada mientras no hay suficientes muestras, y piso de la espera calculada
+ASK_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("ASK_HEDGE_DEFAULT_DELAY_SECONDS", "5"))
+ASK_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("ASK_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+ASK_HEDGE_MIN_SAMPLES = int(os.getenv("ASK_HEDGE_MIN_SAMPLES", "20"))
+
+PRIMARY = 0
+HEDGE = 1
+
+
+class HedgeStats:
+    """
+    Tiempos al primer token (para calcular la espera del hedge), cuántas
+    peticiones se duplicaron, cuál ganó y cuánto se ahorró cuando ganó el hedge.
+    """
+
+    def __init__(self, percentile: float = ASK_HEDGE_PERCENTILE, max_samples: int = 500):
+        self.percentile = percentile
+        self._lock = threading.Lock()
+        self._first_token: Deque[float] = deque(maxlen=max_samples)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.saved_seconds = 0.0
+        self.saved_samples = 0
+
+    def delay(self) -> float:
+        """Espera antes de lanzar el hedge: percentil del tiempo al primer token observado"""
+        with self._lock:
+            if len(self._first_token) < ASK_HEDGE_MIN_SAMPLES:
+                return ASK_HEDGE_DEFAULT_DELAY_SECONDS
+            ordenados = sorted(self._first_token)
+            valor = ordenados[min(len(ordenados) - 1, int(len(ordenados) * self.percentile))]
+        return max(ASK_HEDGE_MIN_DELAY_SECONDS, valor)
+
+    def record(self, first_token_seconds: float, hedged: bool, winner: int):
+        with self._lock:
+            if winner == HEDGE:
+                # El primario se cancela antes de su primer token: lo que habría
+                # tardado se estima con los tiempos observados mayores a este
+                cola = [t for t in self._first_token if t > first_token_seconds]
+                if cola:
+                    self.saved_seconds += sum(cola) / len(cola) - first_token_seconds
+                    self.saved_samples += 1
+            self.requests += 1
+            self._first_token.append(first_token_seconds)
+            if hedged:
+                self.hedged += 1
+                if winner == HEDGE:
+                    self.hedge_wins += 1
+                else:
+                    self.primary_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.delay()
+        with self._lock:
+            return {
+                "enabled": ASK_HEDGE_ENABLED,
+                "percentile": self.percentile,
+                "current_delay_seconds": round(delay, 3),
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_rate": round(self.hedged / self.requests, 3) if self.requests else None,
+                "hedge_wins": self.hedge_wins,
+                "primary_wins_after_hedge": self.primary_wins,
+                # Estimado: el primario cancelado no llega a dar su primer token
+                "saved_seconds": round(self.saved_seconds, 2),
+                "avg_saved_seconds": round(self.saved_seconds / self.saved_samples, 2) if self.saved_samples else None,
+            }
+
+
+# Instancia compartida
+hedge_stats = HedgeStats()
+
+
+async def _race(pool: OllamaPool, method: str, kwargs: Dict[str, Any], salida: "queue.Queue",
+                espera: float, stats: HedgeStats, scheduler: PriorityScheduler):
+    """
+    Corre la petición (y su hedge) y deja en salida (fragmento, None) por cada
+    fragmento de la ganadora, (None, None) al terminar o (None, error) si falla.
+    """
+    inicio = time.perf_counter()
+    clients = pool.loop_clients()
+    hosts: Set[str] = set()
+    tareas: Dict[int, asyncio.Task] = {}
+    ganador: List[int] = []
+    hay_ganador = asyncio.Event()
+    errores: Dict[int, Exception] = {}
+
+    async def consumir(idx: int, exclude: Set[str]):
+        try:
+            async for part in pool.astream(method, dict(kwargs), exclude=exclude, on_host=hosts.add, clients=clients):
+                if not ganador:
+                    ganador.append(idx)
+                    hay_ganador.set()
+                    perdedora = tareas.get(1 - idx)
+                    if perdedora is not None:
+                        perdedora.cancel()
+                    stats.record(time.perf_counter() - inicio, hedged=HEDGE in tareas, winner=idx)
+                salida.put((part, None))
+            if ganador:
+                salida.put((None, None))
+        except Exception as e:
+            if ganador:
+                salida.put((None, e))
+            else:
+                # Terminó sin dar fragmentos: vale la otra si sigue en curso
+                errores[idx] = e
+
+    async def esperar(timeout=None) -> bool:
+        """Hasta que haya ganadora o terminen todas las lanzadas; False si venció el timeout"""
+        senal = asyncio.ensure_future(hay_ganador.wait())
+        try:
+            pendientes = {senal, *(t for t in tareas.values() if not t.done())}
+            while senal in pendientes and len(pendientes) > 1:
+                hechas, pendientes = await asyncio.wait(pendientes, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not hechas:
+                    return False
+            return True
+        finally:
+            senal.cancel()
+
+    tareas[PRIMARY] = asyncio.create_task(consumir(PRIMARY, set()))
+    try:
+        if not await esperar(espera):
+            # Sin primer token a tiempo: la misma petición en otro host, si hay
+            # capacidad en el scheduler (la petición original ya ocupa su slot)
+            with scheduler.try_slot("ask:hedge") as libre:
+                if libre:
+                    print(f"[INFO] /ask sin respuesta en {espera:.1f}s: petición duplicada en otro host")
+                    tareas[HEDGE] = asyncio.create_task(consumir(HEDGE, set(hosts)))
+                    # El slot extra cubre el tramo con dos peticiones en curso
+                    await esperar()
+                else:
+                    print(f"[INFO] /ask sin respuesta en {espera:.1f}s: sin capacidad para duplicar la petición")
+        await asyncio.gather(*tareas.values(), return_exceptions=True)
+        if not ganador:
+            salida.put((None, errores.get(PRIMARY) or errores.get(HEDGE)))
+    finally:
+        for tarea in tareas.values():
+            tarea.cancel()
+
+
+def hedged_stream(pool: OllamaPool, method: str, kwargs: Dict[str, Any], deadline: Deadline,
+                  stats: HedgeStats = hedge_stats, scheduler: PriorityScheduler = llm_scheduler) -> Iterator[Any]:
+    """
+    Fragmentos de una llamada en streaming con hedging. La petición va a un
+    host; si no llega ningún fragmento en stats.delay() segundos y el
+    scheduler tiene un slot libre, se manda la misma a otro host y gana la
+    primera que responda. La perdedora se cancela en cuanto hay ganadora:
+    se cierra su conexión y Ollama deja de generarla.
+    """
+    deadline.check()
+    salida: "queue.Queue" = queue.Queue()
+    # Corre en el event loop del pool: cancelar una tarea async cierra su conexión al instante
+    carrera = pool.run_in_loop(_race(pool, method, kwargs, salida, stats.delay(), stats, scheduler))
+    try:
+        while True:
+            try:
+                part, error = salida.get(timeout=deadline.remaining())
+            except queue.Empty:
+                deadline.check()
+                continue
+            if error is not None:
+                raise error
+            if part is None:
+                return
+            deadline.check()
+            yield part
+    finally:
+        # Cortar las peticiones que sigan en curso (incluye el corte por DeadlineExceeded)
+        carrera.cancel()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Etapas del procesamiento de un CV, en orden
+STAGES = ["extraccion", "analisis", "guardado", "embedding", "indexado"]
+TERMINAL_STATUSES = ("completed", "error")
+# Jobs terminados que se conservan en memoria (el estado queda igual en el registro del CV)
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "1000"))
+
+
+class IngestionJobManager:
+    """
+    Pool acotado de workers que procesa CVs fuera del request HTTP.
+    Los jobs son corrutinas que corren en el event loop; como máximo
+    max_workers se ejecutan a la vez y el resto espera su turno.
+    El id del job es el id del CV creado en estado "pending".
+
+    Los jobs terminados (completed / error) se descartan pasados
+    retention_seconds o cuando hay más de max_finished; después de eso el
+    estado se consulta en el registro del CV.
+    """
+
+    def __init__(self, max_workers: int = 2, retention_seconds: float = JOB_RETENTION_SECONDS,
+                 max_finished: int = JOB_MAX_FINISHED):
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        self.max_finished = max_finished
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._jobs: Dict[int, Dict[str, Any]] = {}
+        # job_id -> momento en que terminó, en orden de finalización
+        self._finished: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: int, fn: Callable[..., Awaitable], *args, **kwargs) -> asyncio.Task:
+        """Registra el job y lo agenda en el event loop (llamar desde código async)"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        with self._lock:
+            self._finished.pop(job_id, None)
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "pending",
+                "stage": None,
+                "progress": 0,
+                "error": None,
+                "result": None,
+                "queued_at": datetime.utcnow().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+            }
+
+        task = asyncio.get_running_loop().create_task(self._run(job_id, fn, *args, **kwargs))
+        # Mantener referencia para que el task no sea recolectado
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, job_id: int, fn: Callable[..., Awaitable], *args, **kwargs):
+        async with self._semaphore:
+            self.update(job_id, status="processing", started_at=datetime.utcnow().isoformat())
+            try:
+                result = await fn(job_id, *args, **kwargs)
+                self.update(
+                    job_id,
+                    status="completed",
+                    progress=100,
+                    result=result,
+                    finished_at=datetime.utcnow().isoformat()
+                )
+            except Exception as e:
+                print(f"[ERROR] Job {job_id} falló: {e}")
+                self.update(
+                    job_id,
+                    status="error",
+                    error=str(e),
+                    finished_at=datetime.utcnow().isoformat()
+                )
+
+    def update(self, job_id: int, stage: Optional[str] = None, **fields):
+        """Actualiza el estado del job; si se indica etapa, recalcula el progreso"""
+        with self._lock:
+            job = self._jobs.setdefault(job_id, {"job_id": job_id})
+            if stage is not None:
+                job["stage"] = stage
+                if stage in STAGES:
+                    job["progress"] = int(STAGES.index(stage) * 100 / len(STAGES))
+            job.update(fields)
+            if fields.get("status") in TERMINAL_STATUSES:
+                self._finished[job_id] = time.monotonic()
+                self._finished.move_to_end(job_id)
+            self._evict_finished()
+
+    def _evict_finished(self):
+        # Se llama con el lock tomado
+        limite = time.monotonic() - self.retention_seconds
+        while self._finished:
+            job_id, terminado = next(iter(self._finished.items()))
+            if terminado > limite and len(self._finished) <= self.max_finished:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.get("status") in ("pending", "processing"))
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
@@ -0,0 +1,196 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class JSONStreamError(Exception):
+    """La respuesta en streaming no es el JSON esperado"""
+    # Secciones que llegaron completas y válidas antes del error (las adjunta quien consume el stream)
+    partial: Optional[Dict[str, Any]] = None
+
+
+def _matches_type(value: Any, tipo: str) -> bool:
+    if tipo == "object":
+        return isinstance(value, dict)
+    if tipo == "array":
+        return isinstance(value, list)
+    if tipo == "string":
+        return isinstance(value, str)
+    if tipo == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if tipo == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if tipo == "boolean":
+        return isinstance(value, bool)
+    if tipo == "null":
+        return value is None
+    return True
+
+
+def validate_schema(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    Validación mínima de JSON Schema (type, properties, required, items).
+    Retorna la lista de errores; vacía si el valor es válido.
+    """
+    tipos = schema.get("type")
+    if tipos:
+        tipos = tipos if isinstance(tipos, list) else [tipos]
+        if not any(_matches_type(value, t) for t in tipos):
+            return [f"{path}: se esperaba {'/'.join(tipos)}, llegó {type(value).__name__}"]
+
+    errores = []
+    if isinstance(value, dict):
+        propiedades = schema.get("properties", {})
+        for requerido in schema.get("required", []):
+            if requerido not in value:
+                errores.append(f"{path}.{requerido}: falta")
+        for clave, sub_valor in value.items():
+            if clave in propiedades:
+                errores.extend(validate_schema(sub_valor, propiedades[clave], f"{path}.{clave}"))
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errores.extend(validate_schema(item, schema["items"], f"{path}[{i}]"))
+    return errores
+
+
+class IncrementalJSONObjectParser:
+    """
+    Parser incremental para un objeto JSON que llega en fragmentos (stream=True).
+
+    Cada vez que se completa una clave de primer nivel ("sección") se parsea y
+    se valida contra su sub-esquema, de modo que una respuesta mal formada se
+    detecta en cuanto termina la sección defectuosa y no al final del stream.
+    Las claves desconocidas se rechazan apenas termina de llegar su nombre.
+    """
+
+    def __init__(self, schema: Optional[Dict[str, Any]] = None, max_prefix_chars: int = 200):
+        self.schema = schema or {}
+        self.max_prefix_chars = max_prefix_chars
+        self.sections: Dict[str, Any] = {}
+        self.chars_received = 0
+        self.current_key: Optional[str] = None
+        # Fragmentos recibidos hasta que cerró el objeto raíz
+        self.chunks_received = 0
+        self.chunks_at_done: Optional[int] = None
+
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._done = False
+        self._skipped = 0
+        self._member_start: Optional[int] = None
+        self._key_start: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Agrega un fragmento y retorna las secciones que se completaron con él"""
+        self.chunks_received += 1
+        if not text or self._done:
+            return []
+        self.chars_received += len(text)
+        self._buf += text
+        nuevas: List[Tuple[str, Any]] = []
+
+        while self._pos < len(self._buf):
+            ch = self._buf[self._pos]
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._member_start = self._pos + 1
+                elif not ch.isspace():
+                    self._skipped += 1
+                    if self._skipped > self.max_prefix_chars:
+                        raise JSONStreamError("La respuesta no empieza con un objeto JSON")
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None and self.current_key is None:
+                        self._on_key(self._buf[self._key_start:self._pos + 1])
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self.current_key is None:
+                    self._key_start = self._pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_member(self._pos, nuevas, final=True)
+                    self._done = True
+                    self.chunks_at_done = self.chunks_received
+                    break
+            elif ch == "," and self._depth == 1:
+                self._close_member(self._pos, nuevas, final=False)
+                self._member_start = self._pos + 1
+
+            self._pos += 1
+
+        # Descartar lo ya procesado para no re-escanear el buffer completo
+        if self._started and not self._done and self._member_start:
+            self._buf = self._buf[self._member_start:]
+            self._pos -= self._member_start
+            if self._key_start is not None:
+                self._key_start -= self._member_start
+            self._member_start = 0
+
+        return nuevas
+
+    def _on_key(self, raw_key: str):
+        try:
+            key = json.loads(raw_key)
+        except json.JSONDecodeError:
+            raise JSONStreamError(f"Clave mal formada: {raw_key[:80]}")
+        propiedades = self.schema.get("properties")
+        if propiedades is not None and self.schema.get("additionalProperties") is False and key not in propiedades:
+            raise JSONStreamError(f"Sección inesperada: '{key}'")
+        self.current_key = key
+
+    def _close_member(self, end: int, nuevas: List[Tuple[str, Any]], final: bool):
+        texto = self._buf[self._member_start:end].strip()
+        self.current_key = None
+        self._key_start = None
+        if not texto:
+            # "{}" o coma final antes de "}" se toleran; ",," no
+            if final:
+                return
+            raise JSONStreamError("Sección vacía en la respuesta")
+
+        try:
+            miembro = json.loads("{" + texto + "}")
+        except json.JSONDecodeError as e:
+            raise JSONStreamError(f"Sección mal formada ({e.msg}): {texto[:80]}...")
+
+        propiedades = self.schema.get("properties", {})
+        for key, value in miembro.items():
+            if key in propiedades:
+                errores = validate_schema(value, propiedades[key], key)
+                if errores:
+                    raise JSONStreamError(f"Sección '{key}' inválida: {'; '.join(errores[:3])}")
+            self.sections[key] = value
+            nuevas.append((key, value))
+
+    def missing_sections(self) -> List[str]:
+        return [k for k in self.schema.get("required", []) if k not in self.sections]
+
+    def close(self) -> Dict[str, Any]:
+        """Termina el stream; falla si el objeto raíz quedó incompleto"""
+        if not self._started:
+            raise JSONStreamError("La respuesta no contiene un objeto JSON")
+        if not self._done:
+            pendiente = f" (sección '{self.current_key}' sin cerrar)" if self.current_key else ""
+            raise JSONStreamError(f"JSON incompleto tras {self.chars_received} caracteres{pendiente}")
+        return self.sections
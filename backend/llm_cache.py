@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.sqlite3")
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+
+
+def make_cache_key(model: str, messages: List[Dict[str, Any]], options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Clave de caché: SHA-256 del modelo, las opciones de generación y el hash
+    del prompt. Cualquier cambio en el prompt o en las opciones es otra clave.
+    """
+    prompt_sha256 = hashlib.sha256(
+        json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    payload = json.dumps(
+        {"model": model, "options": options or {}, "prompt_sha256": prompt_sha256},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Caché de respuestas de Ollama en dos niveles:
+    - memoria: LRU de hasta memory_items respuestas
+    - disco: SQLite con TTL y desalojo por tamaño (las menos usadas primero)
+
+    Guarda solo el texto de la respuesta (message.content).
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+        max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024),
+        ttl_seconds: float = LLM_CACHE_TTL_HOURS * 3600,
+        enabled: bool = LLM_CACHE_ENABLED
+    ):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        # Se llama con el lock tomado; la conexión se abre la primera vez que se usa
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            try:
+                db = self._db()
+                row = db.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self._stats["misses"] += 1
+                    return None
+                value, created_at = row
+                if self._expired(created_at):
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    db.commit()
+                    self._stats["expired"] += 1
+                    self._stats["misses"] += 1
+                    return None
+                db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"[WARNING] Error leyendo la caché LLM: {e}")
+                self._stats["misses"] += 1
+                return None
+
+            self._remember(key, value, created_at)
+            self._stats["disk_hits"] += 1
+            return value
+
+    def set(self, key: str, value: str, model: Optional[str] = None):
+        if not self.enabled or not value:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, value, now)
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, value, size, now, now)
+                )
+                self._evict(db)
+                db.commit()
+                self._stats["sets"] += 1
+            except sqlite3.Error as e:
+                print(f"[WARNING] Error guardando en la caché LLM: {e}")
+
+    def _evict(self, db: sqlite3.Connection):
+        """Borra entradas vencidas y, si se supera max_bytes, las menos usadas hasta quedar en el 90%"""
+        if self.ttl_seconds > 0:
+            cursor = db.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._stats["expired"] += cursor.rowcount
+
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        objetivo = int(self.max_bytes * 0.9)
+        for key, size in db.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall():
+            if total <= objetivo:
+                break
+            db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db().execute("DELETE FROM llm_cache")
+            self._db().commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            try:
+                entries, size = self._db().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+                ).fetchone()
+            except sqlite3.Error:
+                entries, size = None, None
+            return {
+                "enabled": self.enabled,
+                **self._stats,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": entries,
+                "disk_bytes": size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+# Instancia compartida por el procesador de CVs y /ask
+llm_cache = LLMResponseCache()
@@ -0,0 +1,265 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "2"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+# Duración estimada de una llamada mientras no haya mediciones (segundos)
+LLM_DEFAULT_SERVICE_SECONDS = float(os.getenv("LLM_DEFAULT_SERVICE_SECONDS", "20"))
+EMBEDDING_MAX_CONCURRENT = int(os.getenv("EMBEDDING_MAX_CONCURRENT", "1"))
+# Cada SCHEDULER_AGING_SECONDS de espera una llamada sube un nivel de prioridad,
+# así el trabajo en lote no queda postergado indefinidamente
+SCHEDULER_AGING_SECONDS = float(os.getenv("SCHEDULER_AGING_SECONDS", "30"))
+
+# Prioridades: menor valor = se atiende antes
+PRIORITY_INTERACTIVE = 0   # /search, /ask: consultas del reclutador
+PRIORITY_BATCH = 1         # uploads, lotes, /regenerate-embeddings
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+
+class SchedulerSaturated(Exception):
+    """La cola del scheduler está llena; retry_after es la espera sugerida en segundos"""
+
+    def __init__(self, retry_after: int, message: str = "El servidor LLM está saturado, reintentar más tarde"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """Llamada en espera de un slot: se despierta con un Event (sync) o un Future (async)"""
+
+    def __init__(self, call_site: str, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.call_site = call_site
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+        self.loop = loop
+        self.future: Optional[asyncio.Future] = loop.create_future() if loop else None
+        self.event: Optional[threading.Event] = None if loop else threading.Event()
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def effective_priority(self, now: float) -> float:
+        """Prioridad con envejecimiento: baja (mejora) a medida que pasa el tiempo en cola"""
+        return self.priority - (now - self.enqueued_at) / SCHEDULER_AGING_SECONDS
+
+
+class PriorityScheduler:
+    """
+    Control de admisión compartido para un recurso escaso (Ollama o el modelo
+    de embeddings). Como máximo max_concurrent llamadas se ejecutan a la vez;
+    el resto espera en una cola de hasta max_queue llamadas. Con la cola llena
+    se lanza SchedulerSaturated con un Retry-After estimado a partir de la
+    duración media de las llamadas.
+
+    Al liberarse un slot se atiende primero la prioridad interactiva y, dentro
+    de la misma prioridad, por orden de llegada. El envejecimiento
+    (SCHEDULER_AGING_SECONDS) evita que el trabajo en lote quede sin avanzar
+    mientras entran consultas interactivas.
+
+    Sirve tanto a código sync (endpoints en el threadpool de FastAPI) como
+    async (jobs de ingesta en el event loop).
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, default_service_seconds: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.default_service_seconds = default_service_seconds
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue: List[_Waiter] = []
+        self._admitted = 0
+        self._rejected = 0
+        self._wait_times: Deque[float] = deque(maxlen=500)
+        self._service_times: Deque[float] = deque(maxlen=500)
+        self._per_site: Dict[str, Dict[str, Any]] = {}
+
+    # ===== Admisión =====
+    def _estimate_retry_after(self, backlog: int = 0) -> int:
+        service = (sum(self._service_times) / len(self._service_times)) if self._service_times else self.default_service_seconds
+        pendientes = len(self._queue) + backlog + 1
+        return max(1, math.ceil(service * pendientes / self.max_concurrent))
+
+    def _reject(self, call_site: str, backlog: int = 0):
+        self._rejected += 1
+        self._site(call_site)["rejected"] += 1
+        raise SchedulerSaturated(self._estimate_retry_after(backlog))
+
+    def _enter(self, waiter: _Waiter, bounded: bool) -> bool:
+        """True si obtuvo slot de inmediato; si no, queda encolado (o se rechaza)"""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queue:
+                self._active += 1
+                self._record_admission(waiter)
+                return True
+            if bounded and len(self._queue) >= self.max_queue:
+                self._reject(waiter.call_site)
+            self._queue.append(waiter)
+            return False
+
+    def _pop_next(self) -> _Waiter:
+        # Se llama con el lock tomado
+        now = time.perf_counter()
+        waiter = min(self._queue, key=lambda w: (w.effective_priority(now), w.enqueued_at))
+        self._queue.remove(waiter)
+        return waiter
+
+    def _release(self):
+        with self._lock:
+            if self._queue:
+                # El slot pasa directamente al siguiente de la cola
+                waiter = self._pop_next()
+                self._record_admission(waiter)
+            else:
+                self._active -= 1
+                waiter = None
+        if waiter:
+            waiter.wake()
+
+    def _abandon(self, waiter: _Waiter):
+        """La espera se canceló: sale de la cola o devuelve el slot si ya se lo habían dado"""
+        with self._lock:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+                return
+        self._release()
+
+    def ensure_capacity(self, call_site: str, backlog: int = 0):
+        """
+        Chequeo en la puerta de endpoints que encolan trabajo para después
+        (ej: /upload). backlog es el trabajo ya aceptado que aún no pidió slot.
+        """
+        with self._lock:
+            if len(self._queue) + backlog >= self.max_queue:
+                self._reject(call_site, backlog)
+
+    # ===== Slots =====
+    @contextmanager
+    def slot(self, call_site: str, priority: int = PRIORITY_INTERACTIVE, bounded: bool = True):
+        """Slot para código sync; bounded=False espera aunque la cola esté llena (trabajo ya admitido)"""
+        waiter = _Waiter(call_site, priority)
+        if not self._enter(waiter, bounded):
+            try:
+                waiter.event.wait()
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record_service(call_site, time.perf_counter() - started)
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, call_site: str, priority: int = PRIORITY_INTERACTIVE, bounded: bool = True):
+        """Igual que slot() pero espera sin bloquear el event loop"""
+        waiter = _Waiter(call_site, priority, loop=asyncio.get_running_loop())
+        if not self._enter(waiter, bounded):
+            try:
+                await waiter.future
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record_service(call_site, time.perf_counter() - started)
+            self._release()
+
+    @contextmanager
+    def try_slot(self, call_site: str, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Slot solo si hay uno libre y nadie esperando (yield True); si no, yield
+        False sin encolarse. Para trabajo opcional, como el hedge de /ask.
+        """
+        waiter = _Waiter(call_site, priority)
+        with self._lock:
+            libre = self._active < self.max_concurrent and not self._queue
+            if libre:
+                self._active += 1
+                self._record_admission(waiter)
+        if not libre:
+            yield False
+            return
+        started = time.perf_counter()
+        try:
+            yield True
+        finally:
+            self._record_service(call_site, time.perf_counter() - started)
+            self._release()
+
+    # ===== Métricas =====
+    def _site(self, call_site: str) -> Dict[str, Any]:
+        return self._per_site.setdefault(call_site, {"admitted": 0, "rejected": 0, "wait_total": 0.0, "service_total": 0.0})
+
+    def _record_admission(self, waiter: _Waiter):
+        # Se llama con el lock tomado
+        wait = time.perf_counter() - waiter.enqueued_at
+        self._admitted += 1
+        self._wait_times.append(wait)
+        site = self._site(waiter.call_site)
+        site["admitted"] += 1
+        site["wait_total"] += wait
+
+    def _record_service(self, call_site: str, seconds: float):
+        with self._lock:
+            self._service_times.append(seconds)
+            self._site(call_site)["service_total"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._wait_times)
+            services = list(self._service_times)
+            now = time.perf_counter()
+            oldest = max((now - w.enqueued_at for w in self._queue), default=0.0)
+            queued_by_priority = {nombre: 0 for nombre in PRIORITY_NAMES.values()}
+            for w in self._queue:
+                nombre = PRIORITY_NAMES.get(w.priority, str(w.priority))
+                queued_by_priority[nombre] = queued_by_priority.get(nombre, 0) + 1
+            return {
+                "scheduler": self.name,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": len(self._queue),
+                "queued_by_priority": queued_by_priority,
+                "oldest_wait_seconds": round(oldest, 2),
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95_wait_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                "avg_service_seconds": round(sum(services) / len(services), 3) if services else None,
+                "per_call_site": {
+                    nombre: {
+                        "admitted": s["admitted"],
+                        "rejected": s["rejected"],
+                        "avg_wait_seconds": round(s["wait_total"] / s["admitted"], 3) if s["admitted"] else 0.0,
+                        "avg_service_seconds": round(s["service_total"] / s["admitted"], 3) if s["admitted"] else 0.0,
+                    }
+                    for nombre, s in self._per_site.items()
+                },
+            }
+
+
+# Instancias compartidas por todos los endpoints que llaman al LLM o al modelo de embeddings
+llm_scheduler = PriorityScheduler("llm", LLM_MAX_CONCURRENT, LLM_MAX_QUEUE, LLM_DEFAULT_SERVICE_SECONDS)
+embedding_scheduler = PriorityScheduler("embedding", EMBEDDING_MAX_CONCURRENT, LLM_MAX_QUEUE, 0.5)
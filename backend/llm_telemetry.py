@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Muestras que se conservan (las más recientes) para calcular percentiles
+LLM_TELEMETRY_SAMPLES = int(os.getenv("LLM_TELEMETRY_SAMPLES", "2000"))
+# load_duration por encima de esto indica que Ollama tuvo que (re)cargar el modelo
+LLM_RELOAD_SECONDS = float(os.getenv("LLM_RELOAD_SECONDS", "1.0"))
+
+_NS = 1_000_000_000
+_TIMING_FIELDS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+
+
+def _percentile(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))], 3)
+
+
+def _rate(tokens: int, segundos: float) -> Optional[float]:
+    return round(tokens / segundos, 1) if tokens and segundos > 0 else None
+
+
+class LLMTelemetry:
+    """
+    Registra los tiempos que Ollama devuelve en la respuesta final de cada
+    llamada (total/load/prompt_eval/eval en nanosegundos, más los conteos de
+    tokens) junto con el call site, el modelo y el CV. stats() resume por
+    call site y modelo: percentiles de latencia, tokens/s de prompt y de
+    generación, tiempos de carga y en qué fase se va el tiempo.
+    """
+
+    def __init__(self, max_samples: int = LLM_TELEMETRY_SAMPLES):
+        self._lock = threading.Lock()
+        self._samples: Deque[Dict[str, Any]] = deque(maxlen=max_samples)
+
+    def record(self, call_site: str, model: str, response: Any, cv_id: Optional[int] = None,
+               wall_seconds: Optional[float] = None):
+        """response es la respuesta final de Ollama (la que trae done=True)"""
+        if response is None:
+            return
+        sample: Dict[str, Any] = {
+            "timestamp": time.time(),
+            "call_site": call_site,
+            "model": model,
+            "cv_id": cv_id,
+            "wall_seconds": round(wall_seconds, 3) if wall_seconds is not None else None,
+            "prompt_eval_count": response.get("prompt_eval_count") or 0,
+            "eval_count": response.get("eval_count") or 0,
+        }
+        for campo in _TIMING_FIELDS:
+            sample[campo.replace("_duration", "_seconds")] = (response.get(campo) or 0) / _NS
+
+        if sample["load_seconds"] >= LLM_RELOAD_SECONDS:
+            print(f"[WARNING] {call_site}: Ollama cargó {model} durante la llamada ({sample['load_seconds']:.1f}s)")
+        with self._lock:
+            self._samples.append(sample)
+
+    def _summary(self, muestras: List[Dict[str, Any]]) -> Dict[str, Any]:
+        totales = [m["total_seconds"] for m in muestras]
+        cargas = [m["load_seconds"] for m in muestras]
+        prompt_tokens = sum(m["prompt_eval_count"] for m in muestras)
+        prompt_segundos = sum(m["prompt_eval_seconds"] for m in muestras)
+        salida_tokens = sum(m["eval_count"] for m in muestras)
+        salida_segundos = sum(m["eval_seconds"] for m in muestras)
+        tiempo_total = sum(totales)
+        return {
+            "calls": len(muestras),
+            "latency_seconds": {
+                "p50": _percentile(totales, 0.50),
+                "p90": _percentile(totales, 0.90),
+                "p95": _percentile(totales, 0.95),
+                "p99": _percentile(totales, 0.99),
+                "max": round(max(totales), 3),
+            },
+            "prompt_tokens_per_second": _rate(prompt_tokens, prompt_segundos),
+            "eval_tokens_per_second": _rate(salida_tokens, salida_segundos),
+            "avg_prompt_eval_count": round(prompt_tokens / len(muestras), 1),
+            "avg_eval_count": round(salida_tokens / len(muestras), 1),
+            "load": {
+                "reloads": sum(1 for c in cargas if c >= LLM_RELOAD_SECONDS),
+                "p95_seconds": _percentile(cargas, 0.95),
+                "max_seconds": round(max(cargas), 3),
+            },
+            # Fracción del tiempo de Ollama en cada fase (el resto es cola/overhead del servidor)
+            "time_share": {
+                "load": round(sum(cargas) / tiempo_total, 3) if tiempo_total else None,
+                "prompt_eval": round(prompt_segundos / tiempo_total, 3) if tiempo_total else None,
+                "eval": round(salida_segundos / tiempo_total, 3) if tiempo_total else None,
+            },
+        }
+
+    def stats(self, call_site: Optional[str] = None, model: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            muestras = [
+                m for m in self._samples
+                if (call_site is None or m["call_site"] == call_site) and (model is None or m["model"] == model)
+            ]
+        grupos: Dict[str, List[Dict[str, Any]]] = {}
+        for m in muestras:
+            grupos.setdefault(f"{m['call_site']}|{m['model']}", []).append(m)
+        return {
+            "samples": len(muestras),
+            "overall": self._summary(muestras) if muestras else None,
+            "per_call_site": {
+                clave: {"call_site": g[0]["call_site"], "model": g[0]["model"], **self._summary(g)}
+                for clave, g in sorted(grupos.items())
+            },
+        }
+
+    def for_cv(self, cv_id: int) -> List[Dict[str, Any]]:
+        """Llamadas registradas para un CV (las que siguen en la ventana de muestras)"""
+        with self._lock:
+            return [dict(m) for m in self._samples if m["cv_id"] == cv_id]
+
+
+# Instancia compartida
+llm_telemetry = LLMTelemetry()
@@ -1,15 +1,237 @@
-import requests
-from dotenv import load_dotenv
+import asyncio
+import hashlib
 import os
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from deadlines import Deadline, DeadlineExceeded
+from ollama_pool import OllamaPool, ollama_pool
+
 load_dotenv()
-API_URL = os.getenv("API_URL")
-
-def ask_ollama(prompt: str, model: str = "llama3"):
-    response = requests.post(API_URL, json={
-        "model": model,
-        "prompt": prompt,
-        "stream": False
-    })
-    response.raise_for_status()
-    result = response.json()
-    return result["response"]
+
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# Reutilizar el `context` de los prefijos de instrucciones compartidos (false para medir sin él)
+LLM_PREFIX_CONTEXT_ENABLED = os.getenv("LLM_PREFIX_CONTEXT_ENABLED", "true").lower() == "true"
+# Prefijos de prompt cuyo `context` se guarda para no re-enviarlos en cada llamada
+LLM_CONTEXT_CACHE_ITEMS = int(os.getenv("LLM_CONTEXT_CACHE_ITEMS", "32"))
+# Respuesta que se pide al cebar un prefijo: queda en el context como turno del asistente
+PREFIX_ACK = "\n\nPor ahora responde solo \"Listo\": el texto a analizar llega en el próximo mensaje."
+PREFIX_ACK_TOKENS = 8
+
+_NS = 1_000_000_000
+
+
+def _as_chat_part(part: Any) -> Dict[str, Any]:
+    """Fragmento de /api/generate con la forma de /api/chat (message.content)"""
+    datos = dict(part)
+    datos["message"] = {"role": "assistant", "content": datos.pop("response", None) or ""}
+    datos.pop("context", None)
+    return datos
+
+
+class OllamaLLM:
+    """
+    Cliente reutilizable para Ollama, compartido por main.py y
+    ollama_cv_processor.py. Va sobre el pool de hosts, así que hereda sus
+    conexiones keep-alive, el reparto de carga y el circuit breaker.
+
+    - client / async_client: interfaz de ollama.Client / AsyncClient (chat, generate).
+    - chat_stream / achat_stream: fragmentos de una llamada de chat; cada
+      espera (también la del primer fragmento) se corta al vencer el deadline.
+    - prefix: comienzo fijo del único mensaje de usuario (instrucciones). La
+      primera vez se envía solo, con la plantilla del modelo aplicada, y se
+      guarda el `context` que devuelve /api/generate por modelo y prefijo; las
+      siguientes llamadas van a /api/generate con ese context y solo el resto
+      del mensaje como turno nuevo del usuario.
+    """
+
+    def __init__(self, pool: OllamaPool, model: str = DEFAULT_MODEL, context_items: int = LLM_CONTEXT_CACHE_ITEMS):
+        self.pool = pool
+        self.model = model
+        self.client = pool.client()
+        self.async_client = pool.async_client()
+        self.context_items = context_items
+        self._contexts: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.context_hits = 0
+        self.context_misses = 0
+        # Llamadas con prefijo según si usaron el context: conteo y prompt_eval
+        self._prompt_eval: Dict[str, Dict[str, float]] = {}
+
+    # ===== Context de prefijos compartidos =====
+    def _prefix_key(self, model: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model}\x00{prefix}".encode("utf-8")).hexdigest()
+
+    def _get_context(self, key: str) -> Optional[List[int]]:
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is None:
+                self.context_misses += 1
+                return None
+            self._contexts.move_to_end(key)
+            self.context_hits += 1
+            return context
+
+    def _store_context(self, key: str, context: List[int]):
+        # Se guarda aunque venga vacío: así no se vuelve a cebar un prefijo que no da context
+        with self._lock:
+            self._contexts[key] = context
+            self._contexts.move_to_end(key)
+            while len(self._contexts) > self.context_items:
+                self._contexts.popitem(last=False)
+
+    def _prime_request(self, model: str, prefix: str, options: Optional[Dict]) -> Dict[str, Any]:
+        # Sin raw: Ollama aplica la plantilla del modelo y devuelve el context
+        # (prompt + la respuesta corta, un turno completo del asistente). Mismo
+        # num_ctx que la llamada para no truncar el prefijo ni recargar el modelo
+        opciones: Dict[str, Any] = {"temperature": 0, "num_predict": PREFIX_ACK_TOKENS}
+        if options and "num_ctx" in options:
+            opciones["num_ctx"] = options["num_ctx"]
+        return {"model": model, "prompt": prefix + PREFIX_ACK, "options": opciones}
+
+    def _primed(self, key: str, model: str, context: Optional[List[int]]) -> List[int]:
+        context = list(context or [])
+        if not context:
+            print(f"[WARNING] Ollama no devolvió context para el prefijo de {model}; se envía el prompt completo")
+        self._store_context(key, context)
+        return context
+
+    def _prefix_context(self, model: str, prefix: str, options: Optional[Dict], deadline: Deadline) -> List[int]:
+        key = self._prefix_key(model, prefix)
+        context = self._get_context(key)
+        if context is None:
+            final = None
+            for part in self.pool.stream("generate", self._prime_request(model, prefix, options), deadline):
+                if part.get("done"):
+                    final = part
+            context = self._primed(key, model, final.get("context") if final else None)
+        return context
+
+    async def _aprefix_context(self, model: str, prefix: str, options: Optional[Dict], deadline: Deadline) -> List[int]:
+        key = self._prefix_key(model, prefix)
+        context = self._get_context(key)
+        if context is None:
+            try:
+                result = await asyncio.wait_for(
+                    self.async_client.generate(**self._prime_request(model, prefix, options), stream=False),
+                    timeout=deadline.remaining()
+                )
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(deadline.name, deadline.seconds)
+            context = self._primed(key, model, result.get("context"))
+        return context
+
+    def _prefix_rest(self, messages: List[Dict], prefix: Optional[str]) -> Optional[str]:
+        """Resto del mensaje si la llamada puede usar el context del prefijo; None si no"""
+        if not prefix or len(messages) != 1 or messages[0].get("role") != "user":
+            return None
+        content = messages[0].get("content", "")
+        if not content.startswith(prefix) or len(content) == len(prefix):
+            return None
+        return content[len(prefix):]
+
+    def _request(self, model: str, messages: List[Dict], options: Optional[Dict], format: Optional[Any],
+                 rest: Optional[str], context: Optional[List[int]]) -> Tuple[str, Dict[str, Any]]:
+        """(método, kwargs): /api/generate con el context del prefijo, o /api/chat con el mensaje completo"""
+        if context:
+            kwargs: Dict[str, Any] = {"model": model, "prompt": rest, "context": context}
+            method = "generate"
+        else:
+            kwargs = {"model": model, "messages": messages}
+            method = "chat"
+        if options:
+            kwargs["options"] = options
+        if format is not None:
+            kwargs["format"] = format
+        return method, kwargs
+
+    def _chat_part(self, part: Any, modo: Optional[str]) -> Any:
+        if modo == "prefix_context":
+            part = _as_chat_part(part)
+        if modo and part.get("done"):
+            with self._lock:
+                s = self._prompt_eval.setdefault(modo, {"calls": 0, "prompt_eval_count": 0, "prompt_eval_seconds": 0.0})
+                s["calls"] += 1
+                s["prompt_eval_count"] += part.get("prompt_eval_count") or 0
+                s["prompt_eval_seconds"] += (part.get("prompt_eval_duration") or 0) / _NS
+        return part
+
+    # ===== Llamadas =====
+    def chat_stream(self, messages: List[Dict], model: Optional[str] = None, options: Optional[Dict] = None,
+                    format: Optional[Any] = None, deadline: Optional[Deadline] = None,
+                    prefix: Optional[str] = None) -> Iterator[Any]:
+        """
+        Fragmentos de una llamada de chat en streaming (forma de /api/chat). Corre
+        con OllamaPool.stream: la espera de cada fragmento se corta con
+        DeadlineExceeded al vencer deadline y la petición se cancela en Ollama.
+        """
+        deadline = deadline or Deadline(None)
+        model = model or self.model
+        rest = self._prefix_rest(messages, prefix)
+        context = None
+        if rest is not None and LLM_PREFIX_CONTEXT_ENABLED:
+            context = self._prefix_context(model, prefix, options, deadline)
+        modo = None if rest is None else ("prefix_context" if context else "full_prompt")
+        method, kwargs = self._request(model, messages, options, format, rest, context)
+        stream = self.pool.stream(method, kwargs, deadline)
+        try:
+            for part in stream:
+                yield self._chat_part(part, modo)
+        finally:
+            stream.close()
+
+    async def achat_stream(self, messages: List[Dict], model: Optional[str] = None, options: Optional[Dict] = None,
+                           format: Optional[Any] = None, deadline: Optional[Deadline] = None,
+                           prefix: Optional[str] = None) -> AsyncIterator[Any]:
+        """Versión asíncrona de chat_stream(); el plazo de cada espera se aplica con asyncio.wait_for"""
+        deadline = deadline or Deadline(None)
+        model = model or self.model
+        rest = self._prefix_rest(messages, prefix)
+        context = None
+        if rest is not None and LLM_PREFIX_CONTEXT_ENABLED:
+            context = await self._aprefix_context(model, prefix, options, deadline)
+        modo = None if rest is None else ("prefix_context" if context else "full_prompt")
+        method, kwargs = self._request(model, messages, options, format, rest, context)
+        try:
+            stream = await asyncio.wait_for(
+                getattr(self.async_client, method)(**kwargs, stream=True), timeout=deadline.remaining()
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(deadline.name, deadline.seconds)
+        try:
+            while True:
+                try:
+                    part = await asyncio.wait_for(stream.__anext__(), timeout=deadline.remaining())
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(deadline.name, deadline.seconds)
+                yield self._chat_part(part, modo)
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model,
+                "prefix_context_enabled": LLM_PREFIX_CONTEXT_ENABLED,
+                "cached_prefix_contexts": len(self._contexts),
+                "context_hits": self.context_hits,
+                "context_misses": self.context_misses,
+                # Llamadas con prefijo compartido, con y sin context reutilizado
+                "prompt_eval": {
+                    modo: {
+                        "calls": int(s["calls"]),
+                        "avg_prompt_eval_tokens": round(s["prompt_eval_count"] / s["calls"], 1),
+                        "avg_prompt_eval_seconds": round(s["prompt_eval_seconds"] / s["calls"], 3),
+                    }
+                    for modo, s in self._prompt_eval.items()
+                },
+            }
+
+
+# Cliente compartido (main.py, ollama_cv_processor.py)
+llm = OllamaLLM(ollama_pool)
@@ -1,24 +1,53 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from database import engine, SessionLocal
+from migrations import migrate
 import chromadb
 from chromadb.config import Settings
 import pdfplumber
 import uuid
 import os
+import io
+import json
+import time
+import zipfile
+import asyncio
 from dotenv import load_dotenv
-from ollama import Client as OllamaClient
+from ollama_pool import ollama_pool
+from llm_utils import llm
 from chromadb.config import Settings
 from model import Base, CV
 import chromadb
 from UniversalCVClassifier import UniversalCVClassifier
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import unidecode
 import requests
 from sentence_transformers import SentenceTransformer
 # Importar el nuevo procesador con Ollama
-from ollama_cv_processor import OllamaCVProcessor, create_cv_embedding_text_enhanced
+from ollama_cv_processor import (
+    OllamaCVProcessor, create_cv_embedding_text_enhanced, analysis_from_dict, analysis_to_dict,
+    insights_pending, INSIGHT_FIELDS
+)
+from ingestion_jobs import IngestionJobManager, STAGES
+from pdf_utils import (
+    extract_pdf_text, extract_pdf_text_safe, count_pdf_pages, read_upload_limited,
+    PDFLimitError, MAX_UPLOAD_BYTES, MAX_PDF_PAGES
+)
+from cv_dedup import sha256_bytes, sha256_text, find_by_file_hash, find_by_text_hash
+from executors import get_extraction_pool, get_embedding_executor, get_io_executor, run_in, shutdown_executors
+from llm_cache import llm_cache, make_cache_key
+from token_budget import token_budget, messages_chars
+from llm_telemetry import llm_telemetry
+from model_cascade import cascade_stats
+from llm_scheduler import llm_scheduler, embedding_scheduler, SchedulerSaturated, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from warmup import ModelWarmup, WARMUP_ON_STARTUP
+from deadlines import Deadline, DeadlineExceeded, UPLOAD_BUDGET_SECONDS, ASK_BUDGET_SECONDS, ASK_LLM_DEADLINE_SECONDS
+from circuit_breaker import ollama_breaker, CircuitOpenError
+from text_normalizer import text_normalization_stats
+from hedging import hedged_stream, hedge_stats, ASK_HEDGE_ENABLED
 
 model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
 
@@ -38,11 +67,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Base de datos con SQLAlchemy
+# Base de datos con SQLAlchemy (migrate agrega las columnas nuevas a tablas existentes)
 Base.metadata.create_all(bind=engine)
-
-# Cliente Ollama
-ollama_client = OllamaClient(host='http://localhost:11434')
+migrate(engine)
 
 # Inyectamos las dependencias
 def get_db():
@@ -57,15 +84,17 @@ def get_classifier(db: Session = Depends(get_db)):
 
 def get_ollama_processor(db: Session = Depends(get_db)):
     """Retorna el procesador de CVs con Ollama"""
-    return OllamaCVProcessor(ollama_client, model="llama3", db_session=db)
+    return OllamaCVProcessor(model="llama3", db_session=db)
 
 
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
 import ollama
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 # Funciones embedding
-def generate_embedding(text: str) -> list[float]:
+def generate_embedding(text: str, priority: int = PRIORITY_INTERACTIVE) -> list[float]:
     if not text or not text.strip():
         print("⚠️ Texto vacío para embedding")
         return None
@@ -76,8 +105,9 @@ def generate_embedding(text: str) -> list[float]:
         text = text[:8000]
         print("⚠️ Texto truncado a 8000 caracteres")
 
-    # Generar el embedding
-    embedding = model.encode(text).tolist()
+    # Generar el embedding (las consultas interactivas pasan antes que el trabajo en lote)
+    with embedding_scheduler.slot("encode", priority=priority, bounded=False):
+        embedding = model.encode(text).tolist()
 
     # Validar
     if embedding and len(embedding) > 0:
@@ -86,6 +116,29 @@ def generate_embedding(text: str) -> list[float]:
     else:
         print("❌ Embedding vacío generado")
         return None
+
+
+def generate_embeddings_batch(texts: List[str], priority: int = PRIORITY_BATCH) -> List[Optional[list[float]]]:
+    """
+    Genera embeddings de varios textos en lotes de EMBED_BATCH_SIZE. Cada lote
+    pide su turno al scheduler, así una búsqueda interactiva no espera a que
+    termine el chunk completo.
+    """
+    cleaned = [(t or "").strip()[:8000] for t in texts]
+    validos = [i for i, t in enumerate(cleaned) if t]
+    embeddings: List[Optional[list[float]]] = [None] * len(texts)
+    if not validos:
+        return embeddings
+
+    for inicio in range(0, len(validos), EMBED_BATCH_SIZE):
+        lote = validos[inicio:inicio + EMBED_BATCH_SIZE]
+        with embedding_scheduler.slot("encode_batch", priority=priority, bounded=False):
+            vectores = model.encode([cleaned[i] for i in lote], batch_size=EMBED_BATCH_SIZE)
+        for i, vector in zip(lote, vectores):
+            embeddings[i] = vector.tolist()
+
+    print(f"✅ {len(validos)} embeddings generados en lote")
+    return embeddings
     
 # ========== CHROMA DB ==========
 settings = Settings(
@@ -120,173 +173,1037 @@ else:
 
 # ========== UTILIDAD PARA EXTRAER TEXTO DE PDF ==========
 def extract_text_from_pdf(file) -> str:
-    for doc in collection.get(include=["documents"])["documents"]:
-        print(doc)
     try:
-        with pdfplumber.open(file) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-            print(f"[INFO] Texto extraído del PDF: {(text)}")
-        return text.strip()
+        text = extract_pdf_text(file)
+        print(f"[INFO] Texto extraído del PDF: {len(text)} caracteres")
+        return text
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error al procesar PDF: {str(e)}") 
 
-# ========== ENDPOINT PRINCIPAL de subida ==========
-@app.post("/upload")
-async def upload_cv_with_ollama(
-        file: UploadFile = File(...),
-        ollama_processor: OllamaCVProcessor = Depends(get_ollama_processor)
-    ):
-        """
-        Sube y procesa un CV PDF usando Ollama
-        """
-        if not file.filename.endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
+# ========== INGESTA ASÍNCRONA (JOBS) ==========
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+job_manager = IngestionJobManager(max_workers=INGEST_WORKERS)
+# PDFs subidos que aún no pasaron la extracción, para poder reanudar el job tras un reinicio
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", "ingest_spool")
+# Horas que se conserva el PDF de un job fallido en la extracción (para /jobs/{id}/retry)
+INGEST_SPOOL_RETENTION_HOURS = float(os.getenv("INGEST_SPOOL_RETENTION_HOURS", "72"))
 
-        temp_file = f"temp_{uuid.uuid4()}.pdf"
-        try:
-            print(f"[INFO] Procesando archivo: {file.filename}")
-            
-            # Guardar archivo temporalmente
-            with open(temp_file, "wb") as f:
-                content = await file.read()
-                f.write(content)
 
-            # Extraer texto del PDF
-            text_content = extract_text_from_pdf(temp_file)
-            
-            if not text_content.strip():
-                raise HTTPException(status_code=400, detail="No se pudo extraer texto del PDF")
+def _spool_path(cv_id: int) -> str:
+    return os.path.join(INGEST_SPOOL_DIR, f"{cv_id}.pdf")
 
-            print(f"[INFO] Iniciando análisis con Ollama...")
-            
-            # ===== Procesar con Ollama =====
-            analysis = ollama_processor.process_cv_with_ollama(text_content)
-            
-            print(f"[SUCCESS] Análisis de Ollama completado:")
-            print(f"  - Candidato: {analysis.nombre}")
-            print(f"  - Rol sugerido: {analysis.rol_sugerido}")
-            print(f"  - Seniority: {analysis.seniority}")
-            print(f"  - Sector: {analysis.sector}")
-            print(f"  - Score: {analysis.overall_score}")
+
+def _spool_upload(cv_id: int, content: bytes):
+    os.makedirs(INGEST_SPOOL_DIR, exist_ok=True)
+    with open(_spool_path(cv_id), "wb") as f:
+        f.write(content)
+
+
+def _load_spooled_upload(cv_id: int) -> Optional[bytes]:
+    try:
+        with open(_spool_path(cv_id), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _discard_spooled_upload(cv_id: int):
+    try:
+        os.remove(_spool_path(cv_id))
+    except FileNotFoundError:
+        pass
+
+
+def _sweep_ingest_spool() -> int:
+    """
+    Borra los PDFs guardados que ya no sirven para reanudar: CV inexistente,
+    extracción ya hecha o CV completado, y los de jobs con error más viejos
+    que INGEST_SPOOL_RETENTION_HOURS. Retorna cuántos borró
+    """
+    if not os.path.isdir(INGEST_SPOOL_DIR):
+        return 0
+    limite = time.time() - INGEST_SPOOL_RETENTION_HOURS * 3600
+    db = SessionLocal()
+    borrados = 0
+    try:
+        for nombre in os.listdir(INGEST_SPOOL_DIR):
+            cv_id, ext = os.path.splitext(nombre)
+            if ext != ".pdf" or not cv_id.isdigit():
+                continue
+            cv = db.query(CV).filter(CV.id == int(cv_id)).first()
+            vencido = cv is not None and cv.processed_status == "error" and os.path.getmtime(_spool_path(cv.id)) < limite
+            if cv is None or cv.ingest_stage is not None or cv.processed_status == "completed" or vencido:
+                _discard_spooled_upload(int(cv_id))
+                borrados += 1
+    finally:
+        db.close()
+    return borrados
+
+
+def _saturated_http_error(e: SchedulerSaturated) -> HTTPException:
+    """429 con Retry-After cuando el scheduler del LLM no admite más trabajo"""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+# Precarga de llama3 y del modelo de embeddings; /health da 503 hasta que termina
+model_warmup = ModelWarmup(ollama_pool, model.encode)
+
+
+@app.on_event("startup")
+def start_ollama_health_checks():
+    ollama_pool.start_health_checks()
+
+
+@app.on_event("startup")
+def start_model_warmup():
+    if WARMUP_ON_STARTUP:
+        model_warmup.start()
+
+
+@app.on_event("shutdown")
+def shutdown_ingestion_workers():
+    model_warmup.stop()
+    ollama_pool.stop_health_checks()
+    job_manager.shutdown()
+    shutdown_executors()
+
+
+def build_chroma_metadata(cv, analysis, filename: str, processing_method: str) -> Dict:
+    """Metadata enriquecida que se guarda junto al embedding en ChromaDB"""
+    return {
+        "cv_id": cv.id,
+        "nombre": analysis.nombre,
+        "filename": filename,
+        "role": analysis.rol_sugerido,
+        "seniority": analysis.seniority,
+        "experience": f"{analysis.anos_experiencia} años",
+        "industry": analysis.sector,
+        "score": analysis.overall_score,
+        "skills_count": len(analysis.habilidades_tecnicas),
+        "languages_count": len(analysis.idiomas),
+        "soft_skills_count": len(analysis.soft_skills),
+        "calidad_cv": analysis.calidad_cv,
+        "processing_method": processing_method
+    }
+
+
+def build_upload_response(cv, analysis, filename: str, processing_method: str) -> Dict:
+    """Respuesta enriquecida con el análisis de Ollama y la clasificación final en BD"""
+    return {
+        "status": "success",
+        "cv_id": cv.id,
+        "filename": filename,
+        "processing_method": processing_method,
+        
+        # Análisis de Ollama
+        "ollama_analysis": {
+            "nombre": analysis.nombre,
+            "email": analysis.email,
+            "telefono": analysis.telefono,
+            "linkedin": analysis.linkedin,
             
-            # ===== Guardar en base de datos =====
-            try:
-                cv = ollama_processor.save_cv_from_analysis_corrected(analysis, file.filename)
-                processing_method = "ollama_enhanced"
-                
-            except Exception as e:
-                print(f"[ERROR] Error guardando CV: {e}")
-                raise HTTPException(status_code=500, detail=f"Error guardando CV: {str(e)}")
+            "perfil_profesional": {
+                "rol_sugerido": analysis.rol_sugerido,
+                "seniority": analysis.seniority,
+                "sector": analysis.sector,
+                "anos_experiencia": analysis.anos_experiencia,
+                "resumen_profesional": analysis.resumen_profesional
+            },
             
-            # ===== CREAR EMBEDDING MEJORADO =====
-            embedding_text = create_cv_embedding_text_enhanced(analysis)
+            "competencias": {
+                "habilidades_tecnicas": analysis.habilidades_tecnicas,
+                "soft_skills": analysis.soft_skills,
+                "idiomas": analysis.idiomas
+            },
             
-            # Crear metadata enriquecida para ChromaDB
-            metadata = {
-                "cv_id": cv.id,
-                "nombre": analysis.nombre,
-                "filename": file.filename,
-                "role": analysis.rol_sugerido,
-                "seniority": analysis.seniority,
-                "experience": f"{analysis.anos_experiencia} años",
-                "industry": analysis.sector,
-                "score": analysis.overall_score,
-                "skills_count": len(analysis.habilidades_tecnicas),
-                "languages_count": len(analysis.idiomas),
-                "soft_skills_count": len(analysis.soft_skills),
+            "evaluacion": {
+                "overall_score": analysis.overall_score,
                 "calidad_cv": analysis.calidad_cv,
-                "processing_method": processing_method
+                "fortalezas": analysis.fortalezas,
+                "areas_mejora": analysis.areas_mejora
             }
-            
-            print(f"[INFO] Generando embedding...")
-            embedding = generate_embedding(embedding_text)
-            
+        },
+        
+        # Clasificación final en BD
+        "clasificacion_bd": {
+            "rol": {
+                "nombre": cv.rol.nombre if cv.rol else None,
+                "descripcion": cv.rol.descripcion if cv.rol else None
+            },
+            "seniority": {
+                "nombre": cv.puesto.nombre if cv.puesto else None,
+                "rango_años": f"{cv.puesto.min_anhos}-{cv.puesto.max_anhos or '+'}" if cv.puesto else None
+            },
+            "industria_principal": {
+                "nombre": cv.industria.nombre if cv.industria else None,
+                "descripcion": cv.industria.descripcion if cv.industria else None
+            },
+            "score_final": cv.overall_score,
+            "años_experiencia": cv.anhos_experiencia
+        }
+    }
+
+
+def _create_pending_cvs(db: Session, filenames: List[str], file_hashes: Optional[List[str]] = None) -> List[CV]:
+    """Crea los registros en estado pending; sus ids son los ids de los jobs"""
+    file_hashes = file_hashes or [None] * len(filenames)
+    cvs = [
+        CV(filename=nombre, contenido="", processed_status="pending", file_sha256=file_sha256)
+        for nombre, file_sha256 in zip(filenames, file_hashes)
+    ]
+    db.add_all(cvs)
+    db.commit()
+    for cv in cvs:
+        db.refresh(cv)
+    return cvs
+
+
+def _set_cv_status(db: Session, cv_id: int, status: str, rollback: bool = False):
+    if rollback:
+        db.rollback()
+    cv = db.query(CV).filter(CV.id == cv_id).first()
+    if cv:
+        cv.processed_status = status
+        db.commit()
+    return cv
+
+
+def _load_cached_analysis(db: Session, text_sha256: str, exclude_id: Optional[int] = None):
+    """
+    Busca un CV ya procesado con el mismo texto normalizado y retorna
+    (cv_original, análisis, embedding) para no volver a llamar al LLM
+    """
+    original = find_by_text_hash(db, text_sha256, exclude_id=exclude_id)
+    if not original:
+        return None
+
+    analysis = analysis_from_dict(original.analysis_json)
+    embedding = None
+    try:
+        stored = collection.get(ids=[str(original.id)], include=["embeddings"])
+        if stored["ids"] and stored["embeddings"] is not None and len(stored["embeddings"]) > 0:
+            embedding = [float(x) for x in stored["embeddings"][0]]
+    except Exception as e:
+        print(f"[WARNING] No se pudo recuperar el embedding del CV {original.id}: {e}")
+
+    return original, analysis, embedding
+
+
+def _commit_checkpoint(db: Session, cv: CV, stage: str, **fields):
+    """Persiste la salida de una etapa y la marca como completada"""
+    for campo, valor in fields.items():
+        setattr(cv, campo, valor)
+    cv.ingest_stage = stage
+    db.commit()
+
+
+def _next_stage_index(cv: CV) -> int:
+    """Índice de la primera etapa pendiente según el último checkpoint"""
+    if cv.ingest_stage in STAGES:
+        return STAGES.index(cv.ingest_stage) + 1
+    return 0
+
+
+async def _run_extraction_stage(db: Session, cv: CV, content: Optional[bytes]):
+    """
+    Extrae el texto del PDF en el pool de procesos y guarda el checkpoint.
+    Sin content (job reanudado) se usa el PDF guardado en INGEST_SPOOL_DIR
+    """
+    if content is None:
+        content = await run_in(get_io_executor(), _load_spooled_upload, cv.id)
+    if content is None:
+        raise Exception(f"No se encontró el PDF guardado ({_spool_path(cv.id)}); es necesario volver a subir el archivo")
+    text_content, error, report = await run_in(get_extraction_pool(), extract_pdf_text_safe, content)
+    if error:
+        raise Exception(error)
+    if not text_content:
+        raise Exception("No se pudo extraer texto del PDF")
+    text_normalization_stats.record(report, cv.id)
+
+    await run_in(
+        get_io_executor(), _commit_checkpoint, db, cv, "extraccion",
+        contenido=text_content, text_sha256=sha256_text(text_content)
+    )
+    await run_in(get_io_executor(), _discard_spooled_upload, cv.id)
+
+
+async def process_cv_job(job_id: int, content: Optional[bytes], filename: str, force_reprocess: bool = False) -> Dict:
+    """
+    Ejecuta las etapas de ingesta de un CV sin bloquear el event loop:
+    extracción en el pool de procesos, análisis con ollama.AsyncClient,
+    embedding en su hilo dedicado y SQL/ChromaDB en el pool de I/O.
+
+    Cada etapa guarda su salida en el registro del CV (contenido, analysis_json,
+    embedding_json) y actualiza ingest_stage, de modo que un reintento retoma
+    desde la última etapa completada. content puede ser None al reanudar un
+    job que ya pasó la extracción.
+
+    Si el texto coincide con un CV ya procesado se reutilizan su análisis y
+    su embedding (salvo force_reprocess).
+    Mueve el registro por processing -> completed / error.
+    """
+    db = SessionLocal()
+    io_pool = get_io_executor()
+    # Presupuesto del job completo: si se agota (ej: mucha espera en la cola del LLM)
+    # el análisis pasa al fallback en lugar de dejar el upload colgado
+    budget = Deadline(UPLOAD_BUDGET_SECONDS, f"upload:{job_id}")
+    try:
+        cv = await run_in(io_pool, _set_cv_status, db, job_id, "processing")
+        if not cv:
+            raise Exception(f"CV {job_id} no encontrado")
+
+        next_stage = _next_stage_index(cv)
+        if next_stage > 0:
+            print(f"[INFO] Job {job_id}: reanudando desde la etapa '{STAGES[next_stage] if next_stage < len(STAGES) else 'fin'}'")
+
+        ollama_processor = OllamaCVProcessor(model="llama3", db_session=db)
+
+        # ===== Extraer texto del PDF =====
+        if next_stage <= STAGES.index("extraccion"):
+            job_manager.update(job_id, stage="extraccion")
+            await _run_extraction_stage(db, cv, content)
+
+        # ===== Procesar con Ollama (o reutilizar un análisis idéntico) =====
+        if next_stage <= STAGES.index("analisis"):
+            job_manager.update(job_id, stage="analisis")
+            cached = None
+            if not force_reprocess:
+                cached = await run_in(io_pool, _load_cached_analysis, db, cv.text_sha256, job_id)
+
+            if cached:
+                original, analysis, cached_embedding = cached
+                processing_method = "dedup_cache"
+                print(f"[INFO] Texto idéntico al CV {original.id}: se reutiliza su análisis (job {job_id})")
+            elif ollama_breaker.is_open():
+                # Ollama caído: no esperar turno en la cola; el procesador falla
+                # rápido y usa el análisis por regex (o la caché si la hay)
+                print(f"[WARNING] Circuito de Ollama abierto: análisis de fallback (job {job_id})")
+                analysis = await ollama_processor.aprocess_cv_with_ollama(
+                    cv.contenido, use_cache=not force_reprocess, deadline=budget, cv_id=job_id
+                )
+                cached_embedding = None
+                processing_method = "fallback_regex"
+            else:
+                print(f"[INFO] Iniciando análisis con Ollama (job {job_id})...")
+                # El upload ya fue admitido: espera su turno aunque la cola esté llena
+                async with llm_scheduler.aslot("upload", priority=PRIORITY_BATCH, bounded=False):
+                    analysis = await ollama_processor.aprocess_cv_with_ollama(
+                        cv.contenido, use_cache=not force_reprocess, deadline=budget, cv_id=job_id
+                    )
+                cached_embedding = None
+                processing_method = "ollama_enhanced"
+
+                print(f"[SUCCESS] Análisis de Ollama completado:")
+                print(f"  - Candidato: {analysis.nombre}")
+                print(f"  - Rol sugerido: {analysis.rol_sugerido}")
+                print(f"  - Seniority: {analysis.seniority}")
+                print(f"  - Sector: {analysis.sector}")
+                print(f"  - Score: {analysis.overall_score}")
+
+            await run_in(
+                io_pool, _commit_checkpoint, db, cv, "analisis",
+                analysis_json=analysis_to_dict(analysis),
+                processing_method=processing_method,
+                embedding_json=cached_embedding
+            )
+        else:
+            analysis = analysis_from_dict(cv.analysis_json)
+            processing_method = cv.processing_method or "ollama_enhanced"
+
+        # ===== Guardar en base de datos =====
+        if next_stage <= STAGES.index("guardado"):
+            job_manager.update(job_id, stage="guardado")
+            # El checkpoint se confirma en el mismo commit que las tablas relacionadas
+            cv.ingest_stage = "guardado"
+            cv = await run_in(
+                io_pool, ollama_processor.save_cv_from_analysis_corrected,
+                analysis, filename, cv=cv, processed_status="processing"
+            )
+
+        # ===== CREAR EMBEDDING MEJORADO =====
+        embedding_text = create_cv_embedding_text_enhanced(analysis)
+        if next_stage <= STAGES.index("embedding"):
+            job_manager.update(job_id, stage="embedding")
+            embedding = cv.embedding_json
+            if not embedding:
+                print(f"[INFO] Generando embedding...")
+                embedding = await run_in(get_embedding_executor(), generate_embedding, embedding_text, PRIORITY_BATCH)
+            await run_in(io_pool, _commit_checkpoint, db, cv, "embedding", embedding_json=embedding)
+
+        # ===== Indexar en ChromaDB =====
+        if next_stage <= STAGES.index("indexado"):
+            job_manager.update(job_id, stage="indexado")
+            if cv.embedding_json:
+                # upsert: un reintento no falla si el id ya estaba indexado
+                await run_in(
+                    io_pool,
+                    collection.upsert,
+                    documents=[embedding_text],
+                    embeddings=[cv.embedding_json],
+                    metadatas=[build_chroma_metadata(cv, analysis, filename, processing_method)],
+                    ids=[str(cv.id)]
+                )
+                print(f"[SUCCESS] Embedding guardado en ChromaDB")
+            await run_in(io_pool, _commit_checkpoint, db, cv, "indexado", processed_status="completed")
+
+        # La respuesta lee relaciones (rol, puesto, industria) de la BD
+        return await run_in(io_pool, build_upload_response, cv, analysis, filename, processing_method)
+
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"[ERROR] Error procesando CV (job {job_id}): {detail}")
+        await run_in(io_pool, _set_cv_status, db, job_id, "error", rollback=True)
+        raise Exception(detail)
+    finally:
+        await run_in(io_pool, db.close)
+
+
+# ========== MODO TIERED: REGEX PRIMERO, LLM DESPUÉS ==========
+UPLOAD_MODES = ("llm", "tiered")
+UPLOAD_MODE = os.getenv("UPLOAD_MODE", "llm")
+
+
+def _classify_fast(db: Session, cv: CV, filename: str) -> Tuple[str, Dict]:
+    """
+    Clasifica el CV con UniversalCVClassifier y arma el texto y la metadata
+    para indexarlo en ChromaDB con las mismas claves que el análisis de Ollama
+    """
+    cv = UniversalCVClassifier(db).classify_existing_cv(cv)
+
+    rol = cv.rol.nombre if cv.rol else ""
+    seniority = cv.puesto.nombre if cv.puesto else ""
+    industria = cv.industria.nombre if cv.industria else ""
+    habilidades = [h.nombre for h in cv.habilidades]
+    idiomas = [l.nombre for l in cv.lenguajes]
+
+    embedding_text = "\n".join(filter(None, [
+        cv.nombre_completo,
+        f"Rol: {rol}" if rol else None,
+        f"Seniority: {seniority}" if seniority else None,
+        f"Industria: {industria}" if industria else None,
+        f"Experiencia: {cv.anhos_experiencia} años",
+        f"Habilidades: {', '.join(habilidades)}" if habilidades else None,
+        f"Idiomas: {', '.join(idiomas)}" if idiomas else None,
+        cv.contenido[:4000]
+    ]))
+
+    metadata = {
+        "cv_id": cv.id,
+        "nombre": cv.nombre_completo or "",
+        "filename": filename,
+        "role": rol,
+        "seniority": seniority,
+        "experience": f"{cv.anhos_experiencia or 0} años",
+        "industry": industria,
+        "score": cv.overall_score or 0.0,
+        "skills_count": len(habilidades),
+        "languages_count": len(idiomas),
+        "soft_skills_count": 0,
+        "calidad_cv": "",
+        "processing_method": "regex_fast"
+    }
+    return embedding_text, metadata
+
+
+async def process_cv_job_tiered(job_id: int, content: Optional[bytes], filename: str, force_reprocess: bool = False) -> Dict:
+    """
+    Modo tiered: extrae el texto, clasifica con regex e indexa en ChromaDB en
+    segundos para que el CV sea buscable de inmediato (processing_method
+    "regex_fast"). Después sigue con el análisis de Ollama desde el checkpoint
+    de extracción, que reemplaza la fila en SQL y la metadata en ChromaDB.
+    """
+    db = SessionLocal()
+    io_pool = get_io_executor()
+    try:
+        cv = await run_in(io_pool, _set_cv_status, db, job_id, "processing")
+        if not cv:
+            raise Exception(f"CV {job_id} no encontrado")
+
+        if _next_stage_index(cv) <= STAGES.index("extraccion"):
+            job_manager.update(job_id, stage="extraccion")
+            await _run_extraction_stage(db, cv, content)
+
+        # La vía rápida solo tiene sentido mientras no exista el análisis del LLM
+        if _next_stage_index(cv) <= STAGES.index("analisis"):
+            job_manager.update(job_id, stage="clasificacion_rapida")
+            embedding_text, metadata = await run_in(io_pool, _classify_fast, db, cv, filename)
+            embedding = await run_in(get_embedding_executor(), generate_embedding, embedding_text, PRIORITY_BATCH)
             if embedding:
-                collection.add(
-                    documents=[embedding_text], 
-                    embeddings=[embedding],      
+                await run_in(
+                    io_pool,
+                    collection.upsert,
+                    documents=[embedding_text],
+                    embeddings=[embedding],
                     metadatas=[metadata],
                     ids=[str(cv.id)]
                 )
-                print(f"[SUCCESS] Embedding guardado en ChromaDB")
+                print(f"[SUCCESS] CV {job_id} indexado por la vía rápida; queda pendiente el análisis con Ollama")
+
+    except Exception as e:
+        print(f"[ERROR] Error en la vía rápida (job {job_id}): {e}")
+        await run_in(io_pool, _set_cv_status, db, job_id, "error", rollback=True)
+        raise
+    finally:
+        await run_in(io_pool, db.close)
+
+    # Enriquecimiento con Ollama: retoma desde el checkpoint de extracción
+    return await process_cv_job(job_id, None, filename, force_reprocess)
+
+
+# ========== ENDPOINT PRINCIPAL de subida ==========
+@app.post("/upload", status_code=202)
+async def upload_cv_with_ollama(
+        response: Response,
+        file: UploadFile = File(...),
+        force_reprocess: bool = False,
+        mode: str = UPLOAD_MODE
+    ):
+        """
+        Recibe un CV PDF, lo deja en cola para procesarlo con Ollama y retorna el id del job.
+        El progreso se consulta en GET /jobs/{job_id}.
+        Si el mismo archivo ya fue procesado se retorna ese CV (force_reprocess=true lo evita).
+        Con mode=tiered el CV se clasifica por regex y queda buscable antes del análisis de Ollama.
+        """
+        if not file.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
+        if mode not in UPLOAD_MODES:
+            raise HTTPException(status_code=400, detail=f"mode debe ser uno de {', '.join(UPLOAD_MODES)}")
+        try:
+            # Los jobs encolados que aún no llegaron al LLM cuentan como cola
+            llm_scheduler.ensure_capacity("upload", backlog=job_manager.active_count())
+        except SchedulerSaturated as e:
+            print(f"[WARNING] Upload rechazado, LLM saturado (Retry-After {e.retry_after}s)")
+            raise _saturated_http_error(e)
+
+        io_pool = get_io_executor()
+        db = SessionLocal()
+        try:
+            print(f"[INFO] Recibiendo archivo: {file.filename}")
             
-            # ===== RESPUESTA ENRIQUECIDA =====
-            response_data = {
-                "status": "success",
+            # Lectura por partes del stream del upload, cortando si supera el máximo
+            content, file_sha256 = await read_upload_limited(file, MAX_UPLOAD_BYTES)
+            try:
+                pages = await run_in(get_extraction_pool(), count_pdf_pages, content)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Error al procesar PDF: {str(e)}")
+            if pages > MAX_PDF_PAGES:
+                raise PDFLimitError(f"El PDF tiene {pages} páginas (máximo {MAX_PDF_PAGES})")
+
+            # ===== Deduplicación por huella del archivo =====
+            if not force_reprocess:
+                duplicate = await run_in(io_pool, find_by_file_hash, db, file_sha256)
+                if duplicate:
+                    print(f"[INFO] {file.filename} ya fue procesado como CV {duplicate.id}")
+                    response.status_code = 200
+                    return {
+                        "status": "duplicate",
+                        "job_id": duplicate.id,
+                        "cv_id": duplicate.id,
+                        "duplicate_of": duplicate.id,
+                        "filename": file.filename,
+                        "processed_status": duplicate.processed_status,
+                        "job_url": f"/jobs/{duplicate.id}"
+                    }
+
+            # Registro en estado pending; su id es el id del job
+            cv = (await run_in(io_pool, _create_pending_cvs, db, [file.filename], [file_sha256]))[0]
+
+            # El worker recibe el buffer en memoria; la copia en disco solo sirve
+            # para reanudar el job si el servidor se reinicia antes de la extracción
+            await run_in(io_pool, _spool_upload, cv.id, content)
+            job_fn = process_cv_job_tiered if mode == "tiered" else process_cv_job
+            job_manager.submit(cv.id, job_fn, content, file.filename, force_reprocess)
+            print(f"[INFO] Job {cv.id} encolado para {file.filename} (modo {mode})")
+
+            return {
+                "status": "accepted",
+                "job_id": cv.id,
                 "cv_id": cv.id,
                 "filename": file.filename,
-                "processing_method": processing_method,
-                
-                # Análisis de Ollama
-                "ollama_analysis": {
-                    "nombre": analysis.nombre,
-                    "email": analysis.email,
-                    "telefono": analysis.telefono,
-                    "linkedin": analysis.linkedin,
-                    
-                    "perfil_profesional": {
-                        "rol_sugerido": analysis.rol_sugerido,
-                        "seniority": analysis.seniority,
-                        "sector": analysis.sector,
-                        "anos_experiencia": analysis.anos_experiencia,
-                        "resumen_profesional": analysis.resumen_profesional
-                    },
-                    
-                    "competencias": {
-                        "habilidades_tecnicas": analysis.habilidades_tecnicas,
-                        "soft_skills": analysis.soft_skills,
-                        "idiomas": analysis.idiomas
-                    },
-                    
-                    "evaluacion": {
-                        "overall_score": analysis.overall_score,
-                        "calidad_cv": analysis.calidad_cv,
-                        "fortalezas": analysis.fortalezas,
-                        "areas_mejora": analysis.areas_mejora
-                    }
-                },
-                
-                # Clasificación final en BD
-                "clasificacion_bd": {
-                    "rol": {
-                        "nombre": cv.rol.nombre if cv.rol else None,
-                        "descripcion": cv.rol.descripcion if cv.rol else None
-                    },
-                    "seniority": {
-                        "nombre": cv.puesto.nombre if cv.puesto else None,
-                        "rango_años": f"{cv.puesto.min_anhos}-{cv.puesto.max_anhos or '+'}" if cv.puesto else None
-                    },
-                    "industria_principal": {
-                        "nombre": cv.industria.nombre if cv.industria else None,
-                        "descripcion": cv.industria.descripcion if cv.industria else None
-                    },
-                    "score_final": cv.overall_score,
-                    "años_experiencia": cv.anhos_experiencia
-                }
+                "processed_status": cv.processed_status,
+                "mode": mode,
+                "job_url": f"/jobs/{cv.id}"
             }
-            
-            return response_data
-            
+
+        except HTTPException:
+            raise
+        except PDFLimitError as e:
+            print(f"[WARNING] Archivo rechazado: {str(e)}")
+            raise HTTPException(status_code=413, detail=str(e))
         except Exception as e:
-            print(f"[ERROR] Error procesando CV: {str(e)}")
+            print(f"[ERROR] Error encolando CV: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error procesando CV: {str(e)}")
         finally:
-            # Limpiar archivo temporal
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+            await run_in(io_pool, db.close)
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: int, db: Session = Depends(get_db)):
+    """
+    Estado y progreso de un job de ingesta
+    """
+    cv = db.query(CV).filter(CV.id == job_id).first()
+    job = job_manager.get(job_id)
+
+    if not cv and not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+
+    # El estado persistido en BD manda; el registro en memoria aporta etapa y progreso.
+    # Los jobs terminados salen de memoria al rato: ahí se usa la última etapa guardada
+    processed_status = cv.processed_status if cv else job.get("status")
+    if processed_status == "completed":
+        progress = 100
+    elif job:
+        progress = job.get("progress", 0)
+    elif cv and cv.ingest_stage in STAGES:
+        progress = int((STAGES.index(cv.ingest_stage) + 1) * 100 / len(STAGES))
+    else:
+        progress = 0
+
+    return {
+        "job_id": job_id,
+        "cv_id": cv.id if cv else None,
+        "filename": cv.filename if cv else None,
+        "processed_status": processed_status,
+        "stage": job.get("stage") if job else (cv.ingest_stage if cv else None),
+        "last_completed_stage": cv.ingest_stage if cv else None,
+        "processing_method": cv.processing_method if cv else None,
+        "progress": progress,
+        "stages": STAGES,
+        "error": job.get("error") if job else None,
+        "queued_at": job.get("queued_at") if job else None,
+        "started_at": job.get("started_at") if job else None,
+        "finished_at": job.get("finished_at") if job else None,
+        "result": job.get("result") if job else None
+    }
+
+def _get_cv(cv_id: int) -> Optional[CV]:
+    db = SessionLocal()
+    try:
+        return db.query(CV).filter(CV.id == cv_id).first()
+    finally:
+        db.close()
+
+
+@app.post("/jobs/{job_id}/retry", status_code=202)
+async def retry_job(job_id: int):
+    """
+    Reintenta un job fallido o interrumpido retomando desde la última etapa completada
+    """
+    cv = await run_in(get_io_executor(), _get_cv, job_id)
+    if not cv:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+
+    job = job_manager.get(job_id)
+    if job and job.get("status") in ("pending", "processing"):
+        raise HTTPException(status_code=409, detail="El job ya está en ejecución")
+    if cv.processed_status == "completed" and cv.ingest_stage in (None, STAGES[-1]):
+        raise HTTPException(status_code=409, detail="El job ya está completado")
+    if _next_stage_index(cv) == 0 and not await run_in(get_io_executor(), os.path.exists, _spool_path(job_id)):
+        # Sin checkpoint de extracción solo se puede reanudar desde el PDF guardado al subirlo
+        raise HTTPException(
+            status_code=409,
+            detail="No hay texto extraído ni PDF guardado; es necesario volver a subir el archivo"
+        )
+
+    job_manager.submit(job_id, process_cv_job, None, cv.filename)
+    return {
+        "status": "accepted",
+        "job_id": job_id,
+        "resume_from": STAGES[_next_stage_index(cv)] if _next_stage_index(cv) < len(STAGES) else None,
+        "job_url": f"/jobs/{job_id}"
+    }
+
+
+RESUME_JOBS_ON_STARTUP = os.getenv("RESUME_JOBS_ON_STARTUP", "true").lower() == "true"
+
+
+def _interrupted_job_ids() -> List[Tuple[int, str]]:
+    """
+    CVs que quedaron a mitad de la ingesta (ej: reinicio del servidor). Los que
+    no llegaron a ningún checkpoint (ingest_stage NULL) se reanudan desde la extracción
+    """
+    db = SessionLocal()
+    try:
+        cvs = db.query(CV).filter(
+            CV.processed_status.in_(["pending", "processing"]),
+            or_(CV.ingest_stage.is_(None), CV.ingest_stage != STAGES[-1])
+        ).all()
+        return [(cv.id, cv.filename) for cv in cvs]
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def sweep_ingest_spool():
+    # Antes de reanudar jobs: solo se borran PDFs de CVs que ya no los necesitan
+    borrados = await run_in(get_io_executor(), _sweep_ingest_spool)
+    if borrados:
+        print(f"[INFO] {borrados} PDFs sin uso borrados de {INGEST_SPOOL_DIR}")
+
+
+@app.on_event("startup")
+async def resume_interrupted_jobs():
+    if not RESUME_JOBS_ON_STARTUP:
+        return
+    interrumpidos = await run_in(get_io_executor(), _interrupted_job_ids)
+    for cv_id, filename in interrumpidos:
+        job_manager.submit(cv_id, process_cv_job, None, filename)
+    if interrumpidos:
+        print(f"[INFO] Reanudando {len(interrumpidos)} jobs interrumpidos")
+
+
+# ========== SUBIDA POR LOTES ==========
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "2"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "16"))
+MAX_BATCH_BYTES = int(float(os.getenv("MAX_BATCH_MB", "500")) * 1024 * 1024)
+
+
+def _read_batch_files(uploads: List[Tuple[str, bytes]]) -> Tuple[List[Tuple[str, bytes]], List[Dict]]:
+    """
+    Expande un zip (si lo hay) y retorna solo los PDFs como (nombre, bytes),
+    junto con los archivos rechazados por superar el tamaño máximo
+    """
+    items = []
+    rechazados = []
+    for filename, content in uploads:
+        lower = filename.lower()
+        if lower.endswith(".zip"):
+            try:
+                with zipfile.ZipFile(io.BytesIO(content)) as zf:
+                    for info in zf.infolist():
+                        nombre = os.path.basename(info.filename)
+                        if info.is_dir() or info.filename.startswith("__MACOSX") or not nombre.lower().endswith(".pdf"):
+                            continue
+                        # Se valida con el tamaño declarado antes de descomprimir
+                        if info.file_size > MAX_UPLOAD_BYTES:
+                            rechazados.append({
+                                "filename": nombre, "cv_id": None, "status": "error",
+                                "error": f"{nombre} pesa {info.file_size} bytes (máximo {MAX_UPLOAD_BYTES})"
+                            })
+                            continue
+                        items.append((nombre, zf.read(info)))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"Archivo zip inválido: {filename}")
+        elif lower.endswith(".pdf"):
+            items.append((filename, content))
+    return items, rechazados
+
+
+def _find_batch_duplicates(db: Session, filenames: List[str], file_hashes: List[str]) -> Dict[int, Dict]:
+    """Detecta archivos repetidos dentro del lote o ya procesados en la BD"""
+    duplicados = {}
+    vistos = {}
+    for idx, (nombre, file_sha256) in enumerate(zip(filenames, file_hashes)):
+        if file_sha256 in vistos:
+            duplicados[idx] = {"filename": nombre, "cv_id": None, "status": "duplicate", "duplicate_of_filename": vistos[file_sha256]}
+            continue
+        vistos[file_sha256] = nombre
+        original = find_by_file_hash(db, file_sha256)
+        if original:
+            duplicados[idx] = {"filename": nombre, "cv_id": original.id, "status": "duplicate", "duplicate_of": original.id}
+    return duplicados
+
+
+def _store_batch_extraction(db: Session, cvs: List[CV], extracted: List[Tuple[str, Optional[str], Optional[Dict]]], chunk_results: List[Dict], force_reprocess: bool) -> Tuple[List[int], Dict[int, Tuple]]:
+    """
+    Guarda el texto extraído y su huella. Retorna los índices que siguen en el
+    pipeline y los análisis reutilizables por texto idéntico {idx: (análisis, embedding)}
+    """
+    pendientes = []
+    for idx, (text, error, report) in enumerate(extracted):
+        if error or not text:
+            chunk_results[idx].update(status="error", error=error or "No se pudo extraer texto del PDF")
+            cvs[idx].processed_status = "error"
+        else:
+            text_normalization_stats.record(report, cvs[idx].id)
+            cvs[idx].contenido = text
+            cvs[idx].text_sha256 = sha256_text(text)
+            cvs[idx].processed_status = "processing"
+            cvs[idx].ingest_stage = "extraccion"
+            pendientes.append(idx)
+    db.commit()
+
+    reutilizables = {}
+    if not force_reprocess:
+        for idx in pendientes:
+            cached = _load_cached_analysis(db, cvs[idx].text_sha256, exclude_id=cvs[idx].id)
+            if cached:
+                original, analysis, embedding = cached
+                chunk_results[idx]["reused_from"] = original.id
+                reutilizables[idx] = (analysis, embedding)
+    return pendientes, reutilizables
+
+
+def _checkpoint_many(db: Session, cvs: List[CV], stage: str, campos_por_idx: Dict[int, Dict]):
+    """Checkpoint de una etapa para varios CVs del lote en un solo commit"""
+    for idx, campos in campos_por_idx.items():
+        for campo, valor in campos.items():
+            setattr(cvs[idx], campo, valor)
+        cvs[idx].ingest_stage = stage
+    db.commit()
+
+
+def _store_batch_analyses(saver: OllamaCVProcessor, cvs: List[CV], filenames: List[str], analyses: Dict, pendientes: List[int], chunk_results: List[Dict]) -> List[int]:
+    """
+    Guarda los análisis del chunk en BD con un solo commit y retorna los índices
+    guardados correctamente. Cada CV va en un savepoint: si uno falla se
+    deshace solo ese y el resto del chunk se confirma igual.
+    """
+    guardados = []
+    for idx in pendientes:
+        try:
+            with saver.session.begin_nested():
+                cvs[idx].ingest_stage = "guardado"
+                cv = saver.save_cv_from_analysis_corrected(
+                    analyses[idx], filenames[idx], cv=cvs[idx], processed_status="processing", commit=False
+                )
+            guardados.append(idx)
+            chunk_results[idx].update(
+                status="completed",
+                nombre=analyses[idx].nombre,
+                rol=analyses[idx].rol_sugerido,
+                score=cv.overall_score
+            )
+        except Exception as e:
+            chunk_results[idx].update(status="error", error=str(e))
+            cvs[idx].processed_status = "error"
+    saver.session.commit()
+    return guardados
+
+
+async def process_cv_batch(items: List[Tuple[str, bytes]], llm_concurrency: int, chunk_size: int, force_reprocess: bool = False) -> Dict:
+    """
+    Pipeline por lotes: extracción en pool de procesos, análisis con Ollama con
+    concurrencia acotada, guardado en BD y un solo encode + collection.upsert por chunk.
+    Los archivos o textos ya procesados reutilizan su análisis (salvo force_reprocess).
+    Cada etapa deja checkpoint en BD, así un CV fallido se reintenta con /jobs/{id}/retry.
+    """
+    db = SessionLocal()
+    io_pool = get_io_executor()
+    extraction_pool = get_extraction_pool()
+    started = time.perf_counter()
+    results = []
+    timings = {"extraccion": 0.0, "analisis": 0.0, "guardado": 0.0, "embedding": 0.0, "indexado": 0.0}
+    analysis_processor = OllamaCVProcessor(model="llama3")
+    saver = OllamaCVProcessor(model="llama3", db_session=db)
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+
+    async def analizar(text: str, cv_id: int):
+        async with llm_slots:
+            async with llm_scheduler.aslot("batch", priority=PRIORITY_BATCH, bounded=False):
+                return await analysis_processor.aprocess_cv_with_ollama(text, use_cache=not force_reprocess, cv_id=cv_id)
+
+    try:
+        # ===== Deduplicación por huella del archivo =====
+        file_hashes = [sha256_bytes(content) for _, content in items]
+        duplicados = {}
+        if not force_reprocess:
+            duplicados = await run_in(io_pool, _find_batch_duplicates, db, [nombre for nombre, _ in items], file_hashes)
+            results.extend(duplicados.values())
+        a_procesar = [
+            (nombre, content, file_sha256)
+            for idx, ((nombre, content), file_sha256) in enumerate(zip(items, file_hashes))
+            if idx not in duplicados
+        ]
+
+        for chunk_start in range(0, len(a_procesar), chunk_size):
+            chunk = a_procesar[chunk_start:chunk_start + chunk_size]
+            filenames = [nombre for nombre, _, _ in chunk]
+            print(f"[INFO] Lote: procesando archivos {chunk_start + 1}-{chunk_start + len(chunk)} de {len(a_procesar)}")
+
+            # ===== Registros pending =====
+            cvs = await run_in(io_pool, _create_pending_cvs, db, filenames, [h for _, _, h in chunk])
+            chunk_results = [{"filename": nombre, "cv_id": cv.id, "status": "pending"} for nombre, cv in zip(filenames, cvs)]
+
+            # ===== Extracción (pool de procesos) =====
+            t0 = time.perf_counter()
+            extracted = await asyncio.gather(*[
+                run_in(extraction_pool, extract_pdf_text_safe, content) for _, content, _ in chunk
+            ])
+            timings["extraccion"] += time.perf_counter() - t0
+            pendientes, reutilizables = await run_in(
+                io_pool, _store_batch_extraction, db, cvs, extracted, chunk_results, force_reprocess
+            )
+
+            # ===== Análisis con Ollama (concurrencia acotada) =====
+            t0 = time.perf_counter()
+            a_analizar = [i for i in pendientes if i not in reutilizables]
+            analyses = {i: reutilizables[i][0] for i in reutilizables}
+            analyses.update(zip(
+                a_analizar,
+                await asyncio.gather(*[analizar(extracted[i][0], cvs[i].id) for i in a_analizar])
+            ))
+            timings["analisis"] += time.perf_counter() - t0
+            await run_in(io_pool, _checkpoint_many, db, cvs, "analisis", {
+                i: {
+                    "analysis_json": analysis_to_dict(analyses[i]),
+                    "processing_method": "dedup_cache" if i in reutilizables else "ollama_batch",
+                    "embedding_json": reutilizables[i][1] if i in reutilizables else None
+                }
+                for i in pendientes
+            })
+
+            # ===== Guardado en BD =====
+            t0 = time.perf_counter()
+            guardados = await run_in(io_pool, _store_batch_analyses, saver, cvs, filenames, analyses, pendientes, chunk_results)
+            timings["guardado"] += time.perf_counter() - t0
+
+            # ===== Embeddings en lote =====
+            if guardados:
+                t0 = time.perf_counter()
+                embedding_texts = [create_cv_embedding_text_enhanced(analyses[i]) for i in guardados]
+                # Solo se codifican los que no tienen un embedding reutilizable
+                embeddings = [reutilizables[i][1] if i in reutilizables else None for i in guardados]
+                por_codificar = [pos for pos, embedding in enumerate(embeddings) if not embedding]
+                if por_codificar:
+                    nuevos = await run_in(
+                        get_embedding_executor(), generate_embeddings_batch, [embedding_texts[pos] for pos in por_codificar]
+                    )
+                    for pos, embedding in zip(por_codificar, nuevos):
+                        embeddings[pos] = embedding
+                await run_in(io_pool, _checkpoint_many, db, cvs, "embedding", {
+                    idx: {"embedding_json": embedding} for idx, embedding in zip(guardados, embeddings)
+                })
+                timings["embedding"] += time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                docs, vectors, metadatas, ids = [], [], [], []
+                for idx, text, embedding in zip(guardados, embedding_texts, embeddings):
+                    if not embedding:
+                        continue
+                    docs.append(text)
+                    vectors.append(embedding)
+                    method = "dedup_cache" if idx in reutilizables else "ollama_batch"
+                    metadatas.append(build_chroma_metadata(cvs[idx], analyses[idx], filenames[idx], method))
+                    ids.append(str(cvs[idx].id))
+                if ids:
+                    await run_in(io_pool, collection.upsert, documents=docs, embeddings=vectors, metadatas=metadatas, ids=ids)
+                    print(f"[SUCCESS] {len(ids)} embeddings guardados en ChromaDB")
+                await run_in(io_pool, _checkpoint_many, db, cvs, "indexado", {
+                    idx: {"processed_status": "completed"} for idx in guardados
+                })
+                timings["indexado"] += time.perf_counter() - t0
+
+            results.extend(chunk_results)
+    finally:
+        await run_in(io_pool, db.close)
+
+    elapsed = time.perf_counter() - started
+    completados = sum(1 for r in results if r["status"] == "completed")
+    duplicados_count = sum(1 for r in results if r["status"] == "duplicate")
+    reutilizados = sum(1 for r in results if r.get("reused_from"))
+    return {
+        "status": "completed",
+        "total_files": len(items),
+        "completed": completados,
+        "duplicates": duplicados_count,
+        "reused_analyses": reutilizados,
+        "errors": len(items) - completados - duplicados_count,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_cvs_per_minute": round(completados * 60 / elapsed, 2) if elapsed > 0 else 0,
+        "stage_seconds": {k: round(v, 2) for k, v in timings.items()},
+        "llm_concurrency": llm_concurrency,
+        "chunk_size": chunk_size,
+        "results": results
+    }
+
+
+@app.post("/upload/batch")
+async def upload_cv_batch(
+    files: List[UploadFile] = File(...),
+    llm_concurrency: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    force_reprocess: bool = False
+):
+    """
+    Sube muchos PDFs (o un zip con PDFs) y los procesa con un pipeline por lotes.
+    Retorna el resultado por archivo y el throughput total.
+    """
+    try:
+        llm_scheduler.ensure_capacity("batch", backlog=job_manager.active_count())
+    except SchedulerSaturated as e:
+        raise _saturated_http_error(e)
+
+    uploads = []
+    rechazados = []
+    for f in files:
+        lower = f.filename.lower()
+        if not (lower.endswith(".pdf") or lower.endswith(".zip")):
+            continue
+        try:
+            limite = MAX_BATCH_BYTES if lower.endswith(".zip") else MAX_UPLOAD_BYTES
+            content, _ = await read_upload_limited(f, limite)
+            uploads.append((f.filename, content))
+        except PDFLimitError as e:
+            rechazados.append({"filename": f.filename, "cv_id": None, "status": "error", "error": str(e)})
+
+    items, rechazados_zip = await run_in(get_io_executor(), _read_batch_files, uploads)
+    rechazados.extend(rechazados_zip)
+    if not items:
+        if rechazados:
+            raise HTTPException(status_code=413, detail=[r["error"] for r in rechazados])
+        raise HTTPException(status_code=400, detail="No se encontraron archivos PDF en la subida")
+
+    llm_concurrency = max(1, llm_concurrency or BATCH_LLM_CONCURRENCY)
+    chunk_size = max(1, chunk_size or BATCH_CHUNK_SIZE)
+    print(f"[INFO] Lote recibido: {len(items)} PDFs (concurrencia LLM={llm_concurrency}, chunk={chunk_size})")
+
+    try:
+        report = await process_cv_batch(items, llm_concurrency, chunk_size, force_reprocess)
+        if rechazados:
+            report["results"].extend(rechazados)
+            report["total_files"] += len(rechazados)
+            report["errors"] += len(rechazados)
+        return report
+    except Exception as e:
+        print(f"[ERROR] Error procesando lote: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error procesando lote: {str(e)}")
 
 # ========== ENDPOINT DE ANÁLISIS DETALLADO ==========
+def _ensure_cv_insights(db: Session, cv: CV, ollama_processor: OllamaCVProcessor) -> Tuple[Optional[Dict], str]:
+    """
+    Insights del CV (resumen, fortalezas, áreas de mejora, industrias). El upload
+    solo extrae el análisis núcleo; la primera consulta los genera y los guarda
+    en analysis_json. Retorna (insights, estado): "ready", "pending" (Ollama
+    no disponible, se reintenta en la próxima consulta) o "unavailable".
+    """
+    if not cv.analysis_json:
+        return None, "unavailable"
+    if not insights_pending(cv.analysis_json):
+        return {campo: cv.analysis_json.get(campo) for campo in INSIGHT_FIELDS}, "ready"
+    if ollama_breaker.is_open():
+        return None, "pending"
+
+    try:
+        analysis = analysis_from_dict(cv.analysis_json)
+        with llm_scheduler.slot("insights", priority=PRIORITY_INTERACTIVE):
+            ollama_processor.generate_insights(analysis, deadline=Deadline(ASK_BUDGET_SECONDS, "insights"), cv_id=cv.id)
+    except Exception as e:
+        print(f"[WARNING] Insights del CV {cv.id} no generados: {e}")
+        return None, "pending"
+
+    cv.analysis_json = analysis_to_dict(analysis)
+    db.commit()
+    print(f"[SUCCESS] Insights generados y guardados para el CV {cv.id}")
+    return {campo: getattr(analysis, campo) for campo in INSIGHT_FIELDS}, "ready"
+
+
 @app.get("/cv/{cv_id}/analisis-completo")
 def get_complete_cv_analysis(
     cv_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ollama_processor: OllamaCVProcessor = Depends(get_ollama_processor)
 ):
     """
-    Obtiene análisis completo del CV incluyendo datos de Ollama si están disponibles
+    Obtiene análisis completo del CV incluyendo datos de Ollama si están disponibles.
+    La primera consulta genera los insights del CV (ver _ensure_cv_insights)
     """
     cv = db.query(CV).filter(CV.id == cv_id).first()
     if not cv:
         raise HTTPException(status_code=404, detail="CV no encontrado")
+
+    insights, insights_status = _ensure_cv_insights(db, cv, ollama_processor)
     
     # Buscar en ChromaDB para obtener metadata enriquecida
     try:
@@ -303,6 +1220,8 @@ def get_complete_cv_analysis(
                 },
                 "enhanced_metadata": metadata,
                 "embedding_text": document,
+                "insights": insights,
+                "insights_status": insights_status,
                 "classic_data": {
                     "nombre": cv.nombre_completo,
                     "email": cv.email,
@@ -328,7 +1247,9 @@ def get_complete_cv_analysis(
             "email": cv.email,
             "score": cv.overall_score,
             "habilidades": [h.nombre for h in cv.habilidades]
-        }
+        },
+        "insights": insights,
+        "insights_status": insights_status
     }
 
 # ========== BÚSQUEDA MEJORADA ==========
@@ -585,106 +1506,107 @@ def search_cvs_enhanced_fixed(
 
 import traceback
 import time
-def query_with_llm_enhanced(question: str, context_filter: Optional[Dict] = None):
+def _retrieve_ask_candidates(question: str, context_filter: Optional[Dict] = None) -> Tuple[List, List, List, Optional[str]]:
     """
-    Consulta mejorada con diagnóstico completo para debugging
+    Recupera de ChromaDB los candidatos para una consulta al reclutador.
+    Retorna (docs, metadatas, distances, aviso); si no hay candidatos, aviso
+    trae el mensaje (colección vacía, diagnóstico o error) para el usuario.
     """
+    logger.info(f"🔍 INICIANDO CONSULTA: {question}")
+    logger.info(f"🔧 Filtros aplicados: {context_filter}")
+    
+    # 1. VERIFICAR ESTADO DE LA COLECCIÓN
     try:
-        logger.info(f"🔍 INICIANDO CONSULTA: {question}")
-        logger.info(f"🔧 Filtros aplicados: {context_filter}")
+        collection_count = collection.count()
+        logger.info(f"📊 Documentos en colección ChromaDB: {collection_count}")
         
-        # 1. VERIFICAR ESTADO DE LA COLECCIÓN
-        try:
-            collection_count = collection.count()
-            logger.info(f"📊 Documentos en colección ChromaDB: {collection_count}")
-            
-            if collection_count == 0:
-                logger.error("❌ LA COLECCIÓN ESTÁ VACÍA - No hay CVs indexados")
-                return """
-                *COLECCIÓN VACÍA**
+        if collection_count == 0:
+            logger.error("❌ LA COLECCIÓN ESTÁ VACÍA - No hay CVs indexados")
+            return [], [], [], """
+            *COLECCIÓN VACÍA**
 
-                """
-        except Exception as e:
-            logger.error(f"❌ Error verificando colección: {e}")
-            return f"❌ Error accediendo a la base de datos de CVs: {str(e)}"
-        
-        # 2. GENERAR EMBEDDING PARA LA PREGUNTA
-        logger.info("🧠 Generando embedding para la pregunta...")
-        question_embedding = generate_embedding(question)
-        
-        if not question_embedding:
-            logger.error("❌ No se pudo generar embedding para la pregunta")
-            # Fallback a búsqueda por texto
-            logger.info("🔄 Fallback: usando búsqueda por texto")
+            """
+    except Exception as e:
+        logger.error(f"❌ Error verificando colección: {e}")
+        return [], [], [], f"❌ Error accediendo a la base de datos de CVs: {str(e)}"
+    
+    # 2. GENERAR EMBEDDING PARA LA PREGUNTA
+    logger.info("🧠 Generando embedding para la pregunta...")
+    question_embedding = generate_embedding(question)
+    
+    if not question_embedding:
+        logger.error("❌ No se pudo generar embedding para la pregunta")
+        # Fallback a búsqueda por texto
+        logger.info("🔄 Fallback: usando búsqueda por texto")
+    
+    # 3. CONFIGURAR PARÁMETROS DE BÚSQUEDA
+    search_params = {
+        "n_results": 5, 
+        "include": ["metadatas", "documents", "distances"]
+    }
+    
+    if context_filter:
+        search_params["where"] = context_filter
+    
+    # Usar embedding si está disponible, sino usar texto
+    if question_embedding:
+        search_params["query_embeddings"] = [question_embedding]
+        search_method = "embeddings"
+    else:
+        search_params["query_texts"] = [question]
+        search_method = "text"
         
-        # 3. CONFIGURAR PARÁMETROS DE BÚSQUEDA
-        search_params = {
-            "n_results": 5, 
-            "include": ["metadatas", "documents", "distances"]
-        }
+    logger.info(f"🔍 Método de búsqueda: {search_method}")
+    logger.info(f"📋 Parámetros de búsqueda: {search_params}")
+    
+    # 4. EJECUTAR BÚSQUEDA CON DIAGNÓSTICO
+    try:
+        logger.info("🔍 Ejecutando consulta en ChromaDB...")
+        results = collection.query(**search_params)
+        logger.info(f"✅ Consulta ejecutada. Estructura de respuesta: {list(results.keys())}")
         
-        if context_filter:
-            search_params["where"] = context_filter
+    except Exception as e:
+        logger.error(f"❌ Error en consulta ChromaDB: {e}")
         
-        # Usar embedding si está disponible, sino usar texto
-        if question_embedding:
-            search_params["query_embeddings"] = [question_embedding]
-            search_method = "embeddings"
-        else:
-            search_params["query_texts"] = [question]
-            search_method = "text"
+        # Intentar consulta básica para diagnóstico
+        try:
+            logger.info("🔄 Intentando consulta básica para diagnóstico...")
+            basic_results = collection.query(
+                query_texts=[question],
+                n_results=3,
+                include=["documents", "metadatas"]
+            )
+            logger.info(f"✅ Consulta básica exitosa: {len(basic_results.get('documents', [[]])[0])} resultados")
+            results = basic_results
             
-        logger.info(f"🔍 Método de búsqueda: {search_method}")
-        logger.info(f"📋 Parámetros de búsqueda: {search_params}")
-        
-        # 4. EJECUTAR BÚSQUEDA CON DIAGNÓSTICO
+        except Exception as basic_error:
+            logger.error(f"❌ Error en consulta básica: {basic_error}")
+            return [], [], [], f"❌ Error ejecutando búsqueda: {str(e)}"
+    
+    # 5. PROCESAR Y ANALIZAR RESULTADOS
+    docs = results.get("documents", [[]])[0]
+    metadatas = results.get("metadatas", [[]])[0]
+    distances = results.get("distances", [[]])[0]
+    
+    logger.info(f"📊 RESULTADOS OBTENIDOS:")
+    logger.info(f"   - Documentos: {len(docs)}")
+    logger.info(f"   - Metadatos: {len(metadatas)}")
+    logger.info(f"   - Distancias: {len(distances)}")
+    
+    # DIAGNÓSTICO DETALLADO
+    if not docs:
+        # Intentar obtener algunos documentos para ver qué hay en la colección
         try:
-            logger.info("🔍 Ejecutando consulta en ChromaDB...")
-            results = collection.query(**search_params)
-            logger.info(f"✅ Consulta ejecutada. Estructura de respuesta: {list(results.keys())}")
+            sample_results = collection.get(limit=3, include=["metadatas", "documents"])
+            sample_docs = sample_results.get("documents", [])
+            sample_metas = sample_results.get("metadatas", [])
             
-        except Exception as e:
-            logger.error(f"❌ Error en consulta ChromaDB: {e}")
+            logger.info(f"📋 MUESTRA DE DOCUMENTOS EN COLECCIÓN ({len(sample_docs)} ejemplos):")
+            for i, (doc, meta) in enumerate(zip(sample_docs[:3], sample_metas[:3])):
+                logger.info(f"   Doc {i+1}: {doc[:100]}...")
+                logger.info(f"   Meta {i+1}: {meta}")
             
-            # Intentar consulta básica para diagnóstico
-            try:
-                logger.info("🔄 Intentando consulta básica para diagnóstico...")
-                basic_results = collection.query(
-                    query_texts=[question],
-                    n_results=3,
-                    include=["documents", "metadatas"]
-                )
-                logger.info(f"✅ Consulta básica exitosa: {len(basic_results.get('documents', [[]])[0])} resultados")
-                results = basic_results
-                
-            except Exception as basic_error:
-                logger.error(f"❌ Error en consulta básica: {basic_error}")
-                return f"❌ Error ejecutando búsqueda: {str(e)}"
-        
-        # 5. PROCESAR Y ANALIZAR RESULTADOS
-        docs = results.get("documents", [[]])[0]
-        metadatas = results.get("metadatas", [[]])[0]
-        distances = results.get("distances", [[]])[0]
-        
-        logger.info(f"📊 RESULTADOS OBTENIDOS:")
-        logger.info(f"   - Documentos: {len(docs)}")
-        logger.info(f"   - Metadatos: {len(metadatas)}")
-        logger.info(f"   - Distancias: {len(distances)}")
-        
-        # DIAGNÓSTICO DETALLADO
-        if not docs:
-            # Intentar obtener algunos documentos para ver qué hay en la colección
-            try:
-                sample_results = collection.get(limit=3, include=["metadatas", "documents"])
-                sample_docs = sample_results.get("documents", [])
-                sample_metas = sample_results.get("metadatas", [])
-                
-                logger.info(f"📋 MUESTRA DE DOCUMENTOS EN COLECCIÓN ({len(sample_docs)} ejemplos):")
-                for i, (doc, meta) in enumerate(zip(sample_docs[:3], sample_metas[:3])):
-                    logger.info(f"   Doc {i+1}: {doc[:100]}...")
-                    logger.info(f"   Meta {i+1}: {meta}")
-                
-                diagnosis = f"""
+            diagnosis = f"""
 SIN MATCHES PARA TU CONSULTA**
 
 **Tu consulta:** "{question}"
@@ -708,22 +1630,26 @@ SIN MATCHES PARA TU CONSULTA**
 3. **Usa filtros**: agrega industry_filter o role_filter
 4. **Revisa los CVs disponibles**: usa `/cvs` para ver qué perfiles tienes
 
-                """
-                
-                return diagnosis
-                
-            except Exception as sample_error:
-                logger.error(f"❌ Error obteniendo muestra: {sample_error}")
-                return f"❌ No se encontraron CVs relevantes y no se pudo obtener diagnóstico: {str(sample_error)}"
-
-        # 6. Si hay resultados, continuar con el análisis normal
-        context_parts = []
-        for i, (doc, meta, distance) in enumerate(zip(docs, metadatas, distances), 1):
-            similarity = round(1 - distance, 3) if distance is not None else "N/A"
+            """
             
-            logger.info(f"   Resultado {i}: Similitud={similarity}, ID={meta.get('cv_id', 'N/A')}")
+            return [], [], [], diagnosis
             
-            context_parts.append(f"""
+        except Exception as sample_error:
+            logger.error(f"❌ Error obteniendo muestra: {sample_error}")
+            return [], [], [], f"❌ No se encontraron CVs relevantes y no se pudo obtener diagnóstico: {str(sample_error)}"
+
+    return docs, metadatas, distances, None
+
+
+def _build_ask_request(question: str, docs: List, metadatas: List, distances: List) -> Tuple[List[Dict], Dict, Dict, str]:
+    """Arma el prompt del reclutador con los candidatos; retorna (messages, plan, options, cache_key)"""
+    context_parts = []
+    for i, (doc, meta, distance) in enumerate(zip(docs, metadatas, distances), 1):
+        similarity = round(1 - distance, 3) if distance is not None else "N/A"
+        
+        logger.info(f"   Resultado {i}: Similitud={similarity}, ID={meta.get('cv_id', 'N/A')}")
+        
+        context_parts.append(f"""
 CANDIDATO #{i} (Relevancia semántica: {similarity}):
 ═══════════════════════════════════════════════════════════════════════
 • ID: {meta.get('cv_id', 'N/A')}
@@ -748,10 +1674,10 @@ CONTENIDO RELEVANTE:
 ═══════════════════════════════════════════════════════════════════════
 """)
 
-        context = "\n".join(context_parts)
+    context = "\n".join(context_parts)
 
-        # Prompt optimizado para el análisis
-        prompt = f"""
+    # Prompt optimizado para el análisis
+    prompt = f"""
 Eres un reclutador senior experto con más de 15 años de experiencia en selección de personal tecnológico y empresarial. 
 
 CONTEXTO - CANDIDATOS MÁS RELEVANTES:
@@ -765,55 +1691,153 @@ Analiza los candidatos encontrados y proporciona una recomendación estructurada
 Si la relevancia semántica es baja (<0.4), menciona que los matches no son ideales.
 
 RESPUESTA (máximo 400 palabras):
-        """
-        logger.info("🤖 Enviando contexto a LLM para análisis...")
-        
+    """
+    logger.info("🤖 Enviando contexto a LLM para análisis...")
+    
+    messages = [{"role": "user", "content": prompt}]
+    generation = {
+        "temperature": 0.2,
+        "top_p": 0.9,
+    }
+    # num_ctx según el tamaño real del contexto recuperado
+    plan = token_budget.plan(messages, num_predict=600)
+    options = {**generation, "num_ctx": plan["num_ctx"], "num_predict": plan["num_predict"]}
+    cache_key = make_cache_key("llama3", messages, generation)
+    return messages, plan, options, cache_key
+
+
+def _basic_ask_analysis(docs: List, metadatas: List) -> str:
+    """Respuesta mínima con los candidatos cuando falla el análisis del LLM"""
+    return f"""
+✅ **CANDIDATOS ENCONTRADOS: {len(docs)}**
+
+**RESULTADOS:**
+{chr(10).join([f"• {meta.get('nombre', 'N/A')} - {meta.get('role', 'N/A')} (ID: {meta.get('cv_id', 'N/A')})" for meta in metadatas[:3]])}
+
+**NOTA:** Error en análisis avanzado, pero los candidatos están disponibles para revisión manual.
+            """
+
+
+def _ask_chat_stream(messages: List[Dict], options: Dict, deadline: Deadline, hedge: bool = False):
+    """
+    Fragmentos de la respuesta del LLM para /ask. Se pide en streaming aunque
+    se devuelva completa para poder cortar con DeadlineExceeded al vencer el plazo.
+    Con hedge=True (y más de un host sano) la petición se duplica en otro host
+    si el primero tarda en dar el primer token (ver hedging.py).
+    """
+    deadline.check()
+    if hedge and len(ollama_pool.healthy_hosts()) > 1:
+        yield from hedged_stream(
+            ollama_pool, "chat", {"model": "llama3", "messages": messages, "options": options}, deadline
+        )
+        return
+    # El plazo corta también la espera del primer fragmento (ver OllamaLLM.chat_stream)
+    stream = llm.chat_stream(messages, model="llama3", options=options, deadline=deadline)
+    try:
+        yield from stream
+    finally:
+        # Si se corta antes de terminar se cancela también la generación en Ollama
+        stream.close()
+
+
+def query_with_llm_enhanced(question: str, context_filter: Optional[Dict] = None, use_cache: bool = True):
+    """
+    Consulta mejorada con diagnóstico completo para debugging.
+    La respuesta se cachea por prompt (pregunta + candidatos recuperados);
+    use_cache=False fuerza una llamada nueva al LLM.
+    Si Ollama está caído (circuito abierto) o se agota el plazo, se responde
+    con el listado básico de candidatos.
+    """
+    budget = Deadline(ASK_BUDGET_SECONDS, "ask")
+    try:
+        docs, metadatas, distances, aviso = _retrieve_ask_candidates(question, context_filter)
+        if aviso is not None:
+            return aviso
+
+        messages, plan, options, cache_key = _build_ask_request(question, docs, metadatas, distances)
+        if use_cache:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                logger.info("⚡ Respuesta del LLM tomada de la caché")
+                return cached
+
+        if ollama_breaker.is_open():
+            logger.warning("⚡ Circuito de Ollama abierto: respuesta básica sin LLM")
+            return _basic_ask_analysis(docs, metadatas)
+
         try:
-            response = ollama_client.chat(
-                model="llama3",
-                messages=[{"role": "user", "content": prompt}],
-                options={
-                    "temperature": 0.2,
-                    "top_p": 0.9,
-                    "num_ctx": 4096,
-                    "num_predict": 600,
-                },
-                stream=False
-            )
+            partes = []
+            final = None
+            with llm_scheduler.slot("ask", priority=PRIORITY_INTERACTIVE):
+                inicio = time.perf_counter()
+                for part in _ask_chat_stream(
+                    messages, options, budget.child(ASK_LLM_DEADLINE_SECONDS, "ask:llm"), hedge=ASK_HEDGE_ENABLED
+                ):
+                    partes.append(part.get("message", {}).get("content", ""))
+                    if part.get("done"):
+                        final = part
+            
+            llm_telemetry.record("ask", "llama3", final, wall_seconds=time.perf_counter() - inicio)
+            token_budget.record("ask", plan, messages_chars(messages), final)
             
-            if response and 'message' in response and 'content' in response['message']:
-                content = response['message']['content'].strip()
+            content = "".join(partes).strip()
+            if content:
                 logger.info(f"✅ Análisis LLM completado: {len(content)} caracteres")
+                llm_cache.set(cache_key, content, model="llama3")
                 return content
             else:
                 logger.error("❌ Respuesta inválida del LLM")
                 return f"✅ Encontrados {len(docs)} candidatos, pero error en análisis LLM."
                 
+        except SchedulerSaturated:
+            raise
+        except (DeadlineExceeded, CircuitOpenError) as llm_error:
+            logger.warning(f"⏱️ {llm_error}; respuesta básica sin LLM")
+            return _basic_ask_analysis(docs, metadatas)
         except Exception as llm_error:
             logger.error(f"❌ Error en LLM: {llm_error}")
             # Retornar análisis básico
-            basic_analysis = f"""
-✅ **CANDIDATOS ENCONTRADOS: {len(docs)}**
-
-**RESULTADOS:**
-{chr(10).join([f"• {meta.get('nombre', 'N/A')} - {meta.get('role', 'N/A')} (ID: {meta.get('cv_id', 'N/A')})" for meta in metadatas[:3]])}
-
-**NOTA:** Error en análisis avanzado, pero los candidatos están disponibles para revisión manual.
-            """
-            return basic_analysis
+            return _basic_ask_analysis(docs, metadatas)
         
+    except SchedulerSaturated:
+        raise
     except Exception as e:
         logger.error(f"❌ Error general en query_with_llm_enhanced_debug: {e}")
         traceback.print_exc()
         return f"Error al procesar consulta: {str(e)}"
 
+def _ask_context_filter(
+    industry_filter: Optional[str],
+    min_score: Optional[float],
+    role_filter: Optional[str],
+    seniority_filter: Optional[str]
+) -> Optional[Dict]:
+    """Filtro de ChromaDB para /ask y /ask/stream a partir de los parámetros opcionales"""
+    context_filter = {}
+    if industry_filter:
+        context_filter["industry"] = {"$eq": industry_filter}
+    if min_score is not None:
+        context_filter["score"] = {"$gte": min_score}
+    if role_filter:
+        context_filter["role"] = {"$contains": role_filter}
+    if seniority_filter:
+        context_filter["seniority"] = {"$eq": seniority_filter}
+    
+    # Combinar filtros si hay múltiples
+    if len(context_filter) > 1:
+        return {"$and": list(context_filter.values())}
+    elif len(context_filter) == 1:
+        return list(context_filter.values())[0]
+    return None
+
 @app.get("/ask")
 def ask_llm_enhanced(
     query: str,
     industry_filter: Optional[str] = None,
     min_score: Optional[float] = None,
     role_filter: Optional[str] = None,
-    seniority_filter: Optional[str] = None
+    seniority_filter: Optional[str] = None,
+    use_cache: bool = True
 ):
     """
     Consulta inteligente mejorada con datos de Ollama - ERROR JSON CORREGIDO
@@ -822,28 +1846,11 @@ def ask_llm_enhanced(
         logger.info(f"🔍 Procesando consulta: {query}")
         logger.info(f"🎯 Filtros: industry={industry_filter}, min_score={min_score}, role={role_filter}, seniority={seniority_filter}")
         
-        # Construir filtros opcionales
-        context_filter = {}
-        if industry_filter:
-            context_filter["industry"] = {"$eq": industry_filter}
-        if min_score is not None:
-            context_filter["score"] = {"$gte": min_score}
-        if role_filter:
-            context_filter["role"] = {"$contains": role_filter}
-        if seniority_filter:
-            context_filter["seniority"] = {"$eq": seniority_filter}
-        
-        # Combinar filtros si hay múltiples
-        if len(context_filter) > 1:
-            context_filter = {"$and": list(context_filter.values())}
-        elif len(context_filter) == 1:
-            context_filter = list(context_filter.values())[0]
-        else:
-            context_filter = None
+        context_filter = _ask_context_filter(industry_filter, min_score, role_filter, seniority_filter)
         
         logger.info(f"🔧 Filtros procesados: {context_filter}")
         
-        answer = query_with_llm_enhanced(query, context_filter)
+        answer = query_with_llm_enhanced(query, context_filter, use_cache=use_cache)
         
         return {
             "query": query,
@@ -858,11 +1865,136 @@ def ask_llm_enhanced(
             "status": "success"
         }
         
+    except SchedulerSaturated as e:
+        logger.warning(f"⏳ Consulta rechazada, LLM saturado (Retry-After {e.retry_after}s)")
+        raise _saturated_http_error(e)
     except Exception as e:
         logger.error(f"❌ Error en ask_llm_enhanced: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error procesando consulta: {str(e)}")
 
+# ========== CONSULTA CON LLM EN STREAMING (SSE) ==========
+
+def _sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _candidate_summary(meta: Dict, distance: Optional[float]) -> Dict:
+    return {
+        "cv_id": meta.get("cv_id"),
+        "nombre": meta.get("nombre"),
+        "filename": meta.get("filename"),
+        "role": meta.get("role"),
+        "seniority": meta.get("seniority"),
+        "experience": meta.get("experience"),
+        "industry": meta.get("industry"),
+        "score": meta.get("score"),
+        "similarity": round(1 - distance, 3) if distance is not None else None,
+    }
+
+
+def stream_query_with_llm(question: str, context_filter: Optional[Dict] = None, use_cache: bool = True):
+    """
+    Igual que query_with_llm_enhanced pero como eventos SSE: primero
+    "candidates" con los CVs recuperados, luego un "token" por fragmento que
+    genera el LLM y al final "done" (o "error"). La respuesta completa se
+    guarda en la misma caché que /ask.
+    """
+    inicio = time.perf_counter()
+    budget = Deadline(ASK_BUDGET_SECONDS, "ask")
+    try:
+        docs, metadatas, distances, aviso = _retrieve_ask_candidates(question, context_filter)
+        yield _sse_event("candidates", {
+            "candidates": [_candidate_summary(m, d) for m, d in zip(metadatas, distances or [None] * len(metadatas))]
+        })
+        if aviso is not None:
+            yield _sse_event("token", {"text": aviso})
+            yield _sse_event("done", {"cached": False, "elapsed_seconds": round(time.perf_counter() - inicio, 3)})
+            return
+
+        messages, plan, options, cache_key = _build_ask_request(question, docs, metadatas, distances)
+        if use_cache:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                logger.info("⚡ Respuesta del LLM tomada de la caché")
+                yield _sse_event("token", {"text": cached})
+                yield _sse_event("done", {"cached": True, "elapsed_seconds": round(time.perf_counter() - inicio, 3)})
+                return
+
+        if ollama_breaker.is_open():
+            logger.warning("⚡ Circuito de Ollama abierto: respuesta básica sin LLM")
+            yield _sse_event("token", {"text": _basic_ask_analysis(docs, metadatas)})
+            yield _sse_event("done", {"cached": False, "fallback": True, "elapsed_seconds": round(time.perf_counter() - inicio, 3)})
+            return
+
+        partes = []
+        final = None
+        primer_token = None
+        with llm_scheduler.slot("ask", priority=PRIORITY_INTERACTIVE):
+            inicio_llm = time.perf_counter()
+            # Si el cliente se desconecta, cerrar este generador corta también la generación en Ollama
+            for part in _ask_chat_stream(messages, options, budget.child(ASK_LLM_DEADLINE_SECONDS, "ask:llm")):
+                texto = part.get("message", {}).get("content", "")
+                if texto:
+                    if primer_token is None:
+                        primer_token = time.perf_counter() - inicio
+                    partes.append(texto)
+                    yield _sse_event("token", {"text": texto})
+                if part.get("done"):
+                    final = part
+
+        llm_telemetry.record("ask:stream", "llama3", final, wall_seconds=time.perf_counter() - inicio_llm)
+        token_budget.record("ask", plan, messages_chars(messages), final)
+        content = "".join(partes).strip()
+        if content:
+            llm_cache.set(cache_key, content, model="llama3")
+        logger.info(f"✅ Análisis LLM en streaming completado: {len(content)} caracteres, primer token en {primer_token or 0:.2f}s")
+        yield _sse_event("done", {
+            "cached": False,
+            "time_to_first_token": round(primer_token, 3) if primer_token is not None else None,
+            "elapsed_seconds": round(time.perf_counter() - inicio, 3),
+        })
+
+    except SchedulerSaturated as e:
+        logger.warning(f"⏳ Consulta en streaming rechazada, LLM saturado (Retry-After {e.retry_after}s)")
+        yield _sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+    except (DeadlineExceeded, CircuitOpenError) as e:
+        logger.warning(f"⏱️ {e}")
+        yield _sse_event("error", {"detail": str(e)})
+    except Exception as e:
+        logger.error(f"❌ Error en stream_query_with_llm: {e}")
+        traceback.print_exc()
+        yield _sse_event("error", {"detail": f"Error procesando consulta: {str(e)}"})
+
+
+@app.get("/ask/stream")
+def ask_llm_stream(
+    query: str,
+    industry_filter: Optional[str] = None,
+    min_score: Optional[float] = None,
+    role_filter: Optional[str] = None,
+    seniority_filter: Optional[str] = None,
+    use_cache: bool = True
+):
+    """
+    Variante de /ask con Server-Sent Events: envía la lista de candidatos en
+    cuanto sale de ChromaDB y luego la respuesta del LLM token a token.
+    """
+    logger.info(f"🔍 Procesando consulta en streaming: {query}")
+    try:
+        # Rechazar antes de abrir el stream: una vez enviado el 200 ya no se puede responder 429
+        llm_scheduler.ensure_capacity("ask")
+    except SchedulerSaturated as e:
+        logger.warning(f"⏳ Consulta rechazada, LLM saturado (Retry-After {e.retry_after}s)")
+        raise _saturated_http_error(e)
+
+    context_filter = _ask_context_filter(industry_filter, min_score, role_filter, seniority_filter)
+    return StreamingResponse(
+        stream_query_with_llm(query, context_filter, use_cache=use_cache),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ========== ENDPOINTS ADICIONALES ==========
 
 @app.get("/cvs")
@@ -936,9 +2068,20 @@ def list_cvs_enhanced(
 
 @app.post("/regenerate-embeddings")
 def regenerate_all_embeddings_enhanced(
+    reanalyze: bool = False,
     db: Session = Depends(get_db),
     ollama_processor: OllamaCVProcessor = Depends(get_ollama_processor)
 ):
+    """
+    Regenera los embeddings de todos los CVs. Reutiliza el análisis guardado en
+    analysis_json; solo vuelve a llamar al LLM si no existe o si reanalyze=true
+    """
+    if reanalyze:
+        try:
+            llm_scheduler.ensure_capacity("regenerate")
+        except SchedulerSaturated as e:
+            raise _saturated_http_error(e)
+
     try:
         cvs = db.query(CV).all()
         updated_count = 0
@@ -949,23 +2092,22 @@ def regenerate_all_embeddings_enhanced(
                 print(f"[INFO] Regenerando embedding para CV {cv.id}: {cv.filename}")
                 
                 contenido_original = getattr(cv, 'contenido', None)
-                if contenido_original:
-                    analysis = ollama_processor.process_cv_with_ollama(contenido_original)
+                if cv.analysis_json and not reanalyze:
+                    analysis = analysis_from_dict(cv.analysis_json)
+                elif contenido_original:
+                    with llm_scheduler.slot("regenerate", priority=PRIORITY_BATCH, bounded=False):
+                        analysis = ollama_processor.process_cv_with_ollama(
+                            contenido_original, use_cache=not reanalyze, cv_id=cv.id
+                        )
+                else:
+                    analysis = None
+
+                if analysis:
                     embedding_text = create_cv_embedding_text_enhanced(analysis)
-                    metadata = {
-                        "cv_id": cv.id,
-                        "nombre": analysis.nombre,
-                        "filename": cv.filename,
-                        "role": analysis.rol_sugerido,
-                        "seniority": analysis.seniority,
-                        "experience": f"{analysis.anos_experiencia} años",
-                        "industry": analysis.sector,
-                        "score": analysis.overall_score,
-                        "skills_count": len(analysis.habilidades_tecnicas),
-                        "soft_skills_count": len(analysis.soft_skills),
-                        "languages_count": len(analysis.idiomas),
-                        "calidad_cv": analysis.calidad_cv,
-                    }
+                    metadata = build_chroma_metadata(
+                        cv, analysis, cv.filename,
+                        "ollama_enhanced" if reanalyze else (cv.processing_method or "ollama_enhanced")
+                    )
                 else:
                     embedding_text = f"""
 Nombre: {cv.nombre_completo or 'N/A'}
@@ -988,9 +2130,10 @@ Idiomas: {', '.join([l.nombre for l in cv.lenguajes])}
                         "skills_count": len(cv.habilidades),
                         "languages_count": len(cv.lenguajes),
                         "calidad_cv": "N/A",
+                        "processing_method": cv.processing_method or "N/A",
                     }
                 
-                embedding = generate_embedding(embedding_text)
+                embedding = generate_embedding(embedding_text, priority=PRIORITY_BATCH)
                 
                 if embedding:
                     try:
@@ -1063,6 +2206,100 @@ def get_stats_enhanced(db: Session = Depends(get_db)):
         "processing_method": "ollama_enhanced"
     }
 
+
+@app.get("/health")
+def health():
+    """
+    Listo solo cuando los modelos están calientes y hay al menos un host de
+    Ollama sano; si no, 503 para que el balanceador no envíe tráfico todavía.
+    """
+    warm = model_warmup.is_ready() or not WARMUP_ON_STARTUP
+    hosts_sanos = ollama_pool.healthy_hosts()
+    ready = warm and bool(hosts_sanos)
+    body = {
+        "status": "ready" if ready else "warming_up" if not warm else "degraded",
+        "warmup": model_warmup.status(),
+        "healthy_ollama_hosts": hosts_sanos,
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+
+@app.get("/stats/llm")
+def get_llm_scheduler_stats():
+    """Estado del control de admisión del LLM: slots activos, cola y tiempos de espera"""
+    return {
+        **llm_scheduler.stats(),
+        "ingestion_backlog": job_manager.active_count()
+    }
+
+
+@app.get("/stats/llm-cache")
+def get_llm_cache_stats():
+    """Aciertos y fallos de la caché de respuestas del LLM (memoria y SQLite)"""
+    return llm_cache.stats()
+
+
+@app.get("/stats/ollama")
+def get_ollama_pool_stats():
+    """Hosts de Ollama del pool: salud, peticiones en curso y fallos"""
+    return ollama_pool.stats()
+
+
+@app.get("/stats/llm-client")
+def llm_client_stats():
+    """Reutilización del context de los prefijos de instrucciones y su efecto en prompt_eval"""
+    return llm.stats()
+
+
+@app.get("/stats/llm-telemetry")
+def llm_telemetry_stats(call_site: Optional[str] = None, model: Optional[str] = None):
+    """
+    Tiempos reportados por Ollama en cada llamada: percentiles de latencia,
+    tokens/s de prompt y generación, recargas del modelo y reparto del tiempo
+    por fase. Filtrable por call site (analisis, seccion:*, resumen, ask...) y modelo.
+    """
+    return llm_telemetry.stats(call_site=call_site, model=model)
+
+
+@app.get("/stats/llm-telemetry/cv/{cv_id}")
+def llm_telemetry_for_cv(cv_id: int):
+    """Llamadas al LLM registradas para un CV"""
+    return {"cv_id": cv_id, "calls": llm_telemetry.for_cv(cv_id)}
+
+
+@app.get("/stats/cascade")
+def cascade_statistics():
+    """Cuántos CVs resuelve el modelo chico y cuántos se escalan a llama3 (y por qué)"""
+    return cascade_stats.stats()
+
+
+@app.get("/stats/tokens")
+def get_token_budget_stats():
+    """Tokens estimados vs reales (prompt_eval_count / eval_count) por tipo de llamada"""
+    return token_budget.stats()
+
+
+@app.get("/stats/hedging")
+def get_hedging_stats():
+    """Hedging de /ask: espera actual, tasa de peticiones duplicadas, cuál ganó y tiempo ahorrado"""
+    return hedge_stats.stats()
+
+
+@app.get("/stats/text-normalization")
+def get_text_normalization_stats():
+    """
+    Reducción del texto de los CVs antes del LLM (encabezados, números de página,
+    espacios). El ahorro de prompt-eval se estima con los tokens/s medidos de Ollama
+    """
+    overall = llm_telemetry.stats()["overall"] or {}
+    return text_normalization_stats.stats(overall.get("prompt_tokens_per_second"))
+
+
+@app.get("/stats/embeddings")
+def get_embedding_scheduler_stats():
+    """Estado del scheduler del modelo de embeddings (consultas interactivas vs lotes)"""
+    return embedding_scheduler.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,38 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from model import CV
+
+# create_all() solo crea tablas nuevas: las columnas agregadas a tablas que ya
+# existen se agregan acá con ALTER TABLE. Cada entrada es (modelo, columnas);
+# el tipo y los índices salen de la definición del modelo.
+ADDED_COLUMNS = [
+    # Deduplicación y análisis serializado
+    (CV, ["file_sha256", "text_sha256", "analysis_json"]),
+    # Checkpoints de la ingesta
+    (CV, ["ingest_stage", "embedding_json", "processing_method"]),
+]
+
+
+def migrate(engine: Engine):
+    """Agrega las columnas (y sus índices) que falten. Se puede correr en cada arranque"""
+    inspector = inspect(engine)
+    for modelo, columnas in ADDED_COLUMNS:
+        tabla = modelo.__table__
+        if not inspector.has_table(tabla.name):
+            # La crea create_all() con todas sus columnas
+            continue
+        existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for nombre in columnas:
+            if nombre in existentes:
+                continue
+            columna = tabla.c[nombre]
+            tipo = columna.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {nombre} {tipo}"))
+            print(f"[INFO] Migración: columna {tabla.name}.{nombre} agregada")
+
+        indices = {i["name"] for i in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in indices and any(c.name in columnas for c in indice.columns):
+                indice.create(bind=engine)
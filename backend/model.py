@@ -203,6 +203,18 @@ class CV(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     processed_status = Column(String(20), default="pending", nullable=False)  # pending, processing, completed, error
 
+    # Deduplicación: huellas SHA-256 de los bytes y del texto normalizado
+    file_sha256 = Column(String(64), nullable=True, index=True)
+    text_sha256 = Column(String(64), nullable=True, index=True)
+    # Análisis de Ollama serializado, para reutilizarlo sin volver a llamar al LLM
+    analysis_json = Column(JSON, nullable=True)
+
+    # Checkpoints de la ingesta: última etapa completada (extraccion, analisis,
+    # guardado, embedding, indexado) y salidas intermedias para poder reanudar
+    ingest_stage = Column(String(20), nullable=True)
+    embedding_json = Column(JSON, nullable=True)
+    processing_method = Column(String(50), nullable=True)
+
     # Relationships
     rol = relationship("Rol", backref="cvs")
     puesto = relationship("Puesto", backref="cvs")
@@ -0,0 +1,115 @@
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "true").lower() == "true"
+# Modelo chico para la primera pasada; el grande es el del procesador (llama3)
+CASCADE_SMALL_MODEL = os.getenv("CASCADE_SMALL_MODEL", "llama3.2:3b")
+# CVs más largos que esto van directo al modelo grande
+CASCADE_MAX_CHARS = int(os.getenv("CASCADE_MAX_CHARS", "6000"))
+# Plazo de la primera pasada: si el chico tarda más, se escala
+CASCADE_SMALL_DEADLINE_SECONDS = float(os.getenv("CASCADE_SMALL_DEADLINE_SECONDS", "60"))
+# Desde este largo, un CV sin experiencias ni habilidades extraídas se considera mal leído
+CASCADE_MIN_CHARS_FOR_CONTENT = int(os.getenv("CASCADE_MIN_CHARS_FOR_CONTENT", "1500"))
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+_VALORES_VACIOS = {"", "por definir", "n/a", "no especificado", "nombre no detectado", "desconocido"}
+
+
+def _vacio(valor: Any) -> bool:
+    return valor is None or (isinstance(valor, str) and valor.strip().lower() in _VALORES_VACIOS)
+
+
+def escalation_reason(data: Dict[str, Any], cv_text: str) -> Optional[str]:
+    """
+    Heurísticas de confianza sobre la salida del modelo chico (ya validada
+    contra el esquema). Retorna el motivo para escalar al modelo grande, o
+    None si el resultado es aceptable.
+    """
+    info = data.get("informacion_personal") or {}
+    perfil = data.get("perfil_profesional") or {}
+    competencias = data.get("competencias") or {}
+    experiencia = data.get("experiencia") or {}
+    evaluacion = data.get("evaluacion") or {}
+
+    if _vacio(info.get("nombre")):
+        return "nombre_vacio"
+    if _vacio(perfil.get("rol_sugerido")):
+        return "rol_por_definir"
+    if _vacio(perfil.get("seniority")):
+        return "seniority_vacio"
+    if not evaluacion.get("overall_score"):
+        return "sin_score"
+    if len(cv_text) >= CASCADE_MIN_CHARS_FOR_CONTENT and not competencias.get("habilidades_tecnicas") \
+            and not experiencia.get("experiencias"):
+        return "sin_contenido_extraido"
+    # Un email en el CV que el modelo no extrajo indica una lectura pobre
+    if re.search(r"[\w.+-]+@[\w-]+\.[\w.]+", cv_text) and _vacio(info.get("email")):
+        return "email_no_extraido"
+    return None
+
+
+class CascadeStats:
+    """Qué nivel resuelve cada CV, cuánto tarda y por qué se escala"""
+
+    def __init__(self, enabled: bool = CASCADE_ENABLED):
+        self.enabled = enabled
+        self.disabled_reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._tiers = {tier: {"handled": 0, "seconds": 0.0} for tier in (TIER_SMALL, TIER_LARGE)}
+        self._escalations: Dict[str, int] = {}
+        self._escalated_small_seconds = 0.0
+        self._direct_large = 0
+
+    def disable(self, motivo: str):
+        """Apaga la cascada (ej: el modelo chico no está instalado en Ollama)"""
+        if self.enabled:
+            self.enabled = False
+            self.disabled_reason = motivo
+            print(f"[WARNING] Cascada de modelos desactivada: {motivo}")
+
+    def record(self, tier: str, seconds: float, escalated_reason: Optional[str] = None,
+               small_seconds: float = 0.0):
+        """tier es el nivel que resolvió el CV; small_seconds, lo gastado en el chico antes de escalar"""
+        with self._lock:
+            self._tiers[tier]["handled"] += 1
+            self._tiers[tier]["seconds"] += seconds
+            if escalated_reason:
+                self._escalations[escalated_reason] = self._escalations.get(escalated_reason, 0) + 1
+                self._escalated_small_seconds += small_seconds
+            elif tier == TIER_LARGE:
+                self._direct_large += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(t["handled"] for t in self._tiers.values())
+            return {
+                "enabled": self.enabled,
+                "disabled_reason": self.disabled_reason,
+                "small_model": CASCADE_SMALL_MODEL,
+                "cvs": total,
+                "tiers": {
+                    tier: {
+                        "handled": t["handled"],
+                        "share": round(t["handled"] / total, 3) if total else None,
+                        "avg_seconds": round(t["seconds"] / t["handled"], 2) if t["handled"] else None,
+                        "cvs_per_minute": round(t["handled"] * 60 / t["seconds"], 2) if t["seconds"] else None,
+                    }
+                    for tier, t in self._tiers.items()
+                },
+                "direct_to_large": self._direct_large,
+                "escalations": sum(self._escalations.values()),
+                "escalation_reasons": dict(self._escalations),
+                "small_seconds_spent_on_escalated": round(self._escalated_small_seconds, 2),
+            }
+
+
+# Instancia compartida
+cascade_stats = CascadeStats()
@@ -1,9 +1,26 @@
+import asyncio
 import json
+import os
 import re
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, asdict, fields
+from ollama import ResponseError
 from sqlalchemy.orm import sessionmaker, Session
 from datetime import datetime
+from llm_cache import llm_cache, make_cache_key, LLMResponseCache
+from json_stream import IncrementalJSONObjectParser, JSONStreamError
+from cv_sections import split_cv_sections, should_split
+from token_budget import token_budget, messages_chars, MAX_NUM_CTX
+from deadlines import Deadline, DeadlineExceeded, LLM_CALL_DEADLINE_SECONDS, LLM_SECTION_DEADLINE_SECONDS
+from circuit_breaker import CircuitOpenError
+from llm_utils import llm, OllamaLLM
+from llm_telemetry import llm_telemetry
+from model_cascade import (
+    cascade_stats, escalation_reason, CASCADE_SMALL_MODEL, CASCADE_MAX_CHARS,
+    CASCADE_SMALL_DEADLINE_SECONDS, TIER_SMALL, TIER_LARGE
+)
 from model import (
     CV, Experiencia, Educacion, Proyecto, Habilidad, CategoriaHabilidad,
     Lenguaje, Industria, Rol, Puesto
@@ -52,24 +69,171 @@ class CVAnalysis:
     # Texto para embedding
     embedding_text: str
 
+    # Los insights (resumen y fortalezas/áreas/industrias) se generan al abrir el CV, no en el upload
+    insights_generated: bool = False
+
+
+# ========== ESQUEMA JSON DE LA RESPUESTA ==========
+# Se pasa a Ollama en format= para que la salida quede restringida a este
+# esquema, y se usa para validar cada sección mientras llega el stream.
+# Es el análisis "núcleo" del upload; los insights tienen su propio esquema
+# (INSIGHTS_SCHEMA) y se generan la primera vez que se consulta el CV.
+def _obj(propiedades: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "object", "properties": propiedades, "required": list(propiedades)}
+
+
+def _arr(items: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "array", "items": items}
+
+
+_STR = {"type": "string"}
+_FECHA = {"type": ["string", "null"]}
+
+CV_ANALYSIS_SCHEMA: Dict[str, Any] = {
+    **_obj({
+        "informacion_personal": _obj({
+            "nombre": _STR, "email": _STR, "telefono": _STR,
+            "linkedin": _STR, "github": _STR, "portafolio": _STR,
+        }),
+        "perfil_profesional": _obj({
+            "rol_sugerido": _STR, "seniority": _STR, "sector": _STR,
+            "anos_experiencia": {"type": "number"},
+        }),
+        "competencias": _obj({
+            "habilidades_tecnicas": _arr(_STR),
+            "soft_skills": _arr(_STR),
+            "idiomas": _arr(_obj({"idioma": _STR, "nivel": _STR})),
+        }),
+        "formacion": _obj({
+            "educacion": _arr(_obj({"titulo": _STR, "institucion": _STR, "en_curso": {"type": "boolean"}})),
+            "certificaciones": _arr(_STR),
+        }),
+        "experiencia": _obj({
+            "experiencias": _arr(_obj({
+                "empresa": _STR, "puesto": _STR, "fecha_inicio": _FECHA, "fecha_fin": _FECHA,
+                "descripcion": _STR, "duracion": _STR, "actual": {"type": "boolean"},
+            })),
+            "proyectos_destacados": _arr(_obj({"nombre": _STR, "descripcion": _STR, "tecnologias": _arr(_STR)})),
+        }),
+        "evaluacion": _obj({
+            "overall_score": {"type": "number"}, "calidad_cv": _STR, "comentarios": _STR,
+        }),
+        "embedding_optimizado": _obj({"texto_embedding": _STR}),
+    }),
+    "additionalProperties": False,
+}
+
+
+INSIGHTS_SCHEMA: Dict[str, Any] = {
+    **_obj({
+        "resumen_profesional": _STR,
+        "fortalezas": _arr(_STR),
+        "areas_mejora": _arr(_STR),
+        "industrias_relacionadas": _arr(_STR),
+    }),
+    "additionalProperties": False,
+}
+INSIGHT_FIELDS = list(INSIGHTS_SCHEMA["properties"])
+
+
+def subschema(*claves: str) -> Dict[str, Any]:
+    """Esquema restringido a algunas secciones de CV_ANALYSIS_SCHEMA"""
+    return {
+        **_obj({clave: CV_ANALYSIS_SCHEMA["properties"][clave] for clave in claves}),
+        "additionalProperties": False,
+    }
+
+
+# ========== ANÁLISIS POR SECCIONES ==========
+# Tope de num_ctx para las llamadas por sección (se dimensiona según el fragmento)
+SECTION_NUM_CTX = int(os.getenv("SECTION_NUM_CTX", "4096"))
+# Salida del análisis completo: tokens del CV + base, acotado a [mín, máx]
+ANALYSIS_MIN_PREDICT = int(os.getenv("ANALYSIS_MIN_PREDICT", "1024"))
+ANALYSIS_MAX_PREDICT = int(os.getenv("ANALYSIS_MAX_PREDICT", "4096"))
+
+# (clave del esquema, secciones del CV que recibe, secciones alternativas si faltan, num_predict)
+SECTION_TASKS = [
+    ("informacion_personal", ["contacto", "perfil"], [], 512),
+    ("experiencia", ["experiencia", "proyectos"], [], 2048),
+    ("formacion", ["educacion", "certificaciones"], [], 1024),
+    # Sin sección de habilidades, se extraen de la experiencia
+    ("competencias", ["habilidades", "idiomas"], ["experiencia", "proyectos"], 1024),
+]
+
+# Errores que descartan solo la sección que los produjo: el resto del análisis se conserva
+SECTION_ERRORS = (JSONStreamError, DeadlineExceeded, CircuitOpenError)
+
+# Fragmentos que se siguen leyendo tras cerrar el JSON para obtener los contadores de tokens
+STREAM_TAIL_CHUNKS = 32
+
+# Secciones que resume la llamada final a partir de lo extraído
+SUMMARY_KEYS = ["perfil_profesional", "evaluacion", "embedding_optimizado"]
+
+SECTION_INSTRUCTIONS = {
+    "informacion_personal": "Datos de contacto del candidato: nombre, email, teléfono, linkedin, github y portafolio.",
+    "experiencia": (
+        "Todas las experiencias laborales (empresa, puesto, fechas en formato YYYY-MM-DD, fecha_fin null si es el "
+        "trabajo actual, descripción con TODAS las herramientas y metodologías mencionadas) y los proyectos destacados."
+    ),
+    "formacion": "Educación (título, institución, si está en curso) y certificaciones o cursos.",
+    "competencias": (
+        "Habilidades técnicas (software, herramientas, metodologías, según el área profesional), "
+        "habilidades blandas explícitas e idiomas con su nivel."
+    ),
+}
+
+# Valores vacíos para las secciones que no se pudieron extraer
+SECTION_DEFAULTS = {
+    "informacion_personal": {},
+    "competencias": {"habilidades_tecnicas": [], "soft_skills": [], "idiomas": []},
+    "formacion": {"educacion": [], "certificaciones": []},
+    "experiencia": {"experiencias": [], "proyectos_destacados": []},
+}
+
+
+def analysis_to_dict(analysis: CVAnalysis) -> Dict[str, Any]:
+    """Serializa el análisis para guardarlo en la columna CV.analysis_json"""
+    return asdict(analysis)
+
+
+def insights_pending(data: Dict[str, Any]) -> bool:
+    """True si el análisis guardado aún no tiene insights (los análisis previos al cambio ya los traen)"""
+    return not data.get("insights_generated") and not data.get("fortalezas")
+
+
+def analysis_from_dict(data: Dict[str, Any]) -> CVAnalysis:
+    """Reconstruye un CVAnalysis guardado, ignorando claves desconocidas"""
+    campos = {f.name for f in fields(CVAnalysis)}
+    return CVAnalysis(**{k: v for k, v in data.items() if k in campos})
+
 
 class OllamaCVProcessor:
     """Procesador de CVs usando Ollama para análisis inteligente"""
     
-    def __init__(self, ollama_client, model: str = "llama3", db_session: Session = None):
-        self.ollama_client = ollama_client
+    def __init__(self, llm_client: Optional[OllamaLLM] = None, model: str = "llama3", db_session: Session = None,
+                 cache: Optional[LLMResponseCache] = None):
+        # Sin cliente explícito se usa el compartido de llm_utils
+        self.llm = llm_client or llm
         self.model = model
         self.session = db_session
+        self.cache = cache or llm_cache
         
     def create_analysis_prompt(self, cv_text: str) -> str:
-        prompt = f"""
+        # Instrucciones primero y el CV al final: el prefijo es igual para todos los CVs
+        return self.analysis_prompt_prefix() + f"""
+        TEXTO DEL CV:
+        {cv_text}
+
+        JSON RESPONSE:
+        """
+
+    def analysis_prompt_prefix(self) -> str:
+        """Instrucciones del análisis completo (prefijo compartido, ver llm_utils)"""
+        return f"""
         Eres un reclutador senior especializado en análisis de talento con más de 15 años de experiencia en múltiples industrias.
 
         TAREA CRÍTICA:
-        Analiza este CV y extrae TODA la información relevante, priorizando la EXPERIENCIA LABORAL sobre la educación para determinar el perfil profesional del candidato.
-
-        TEXTO DEL CV:
-        {cv_text}
+        Analiza el CV que se incluye al final y extrae TODA la información relevante, priorizando la EXPERIENCIA LABORAL sobre la educación para determinar el perfil profesional del candidato.
 
         INSTRUCCIONES ESPECÍFICAS:
 
@@ -217,8 +381,7 @@ class OllamaCVProcessor:
             "rol_sugerido": "...",
             "seniority": "...",
             "sector": "...",
-            "anos_experiencia": ...,
-            "resumen_profesional": "..."
+            "anos_experiencia": ...
         }},
         "competencias": {{
             "habilidades_tecnicas": [
@@ -255,13 +418,6 @@ class OllamaCVProcessor:
                 }}
             ]
         }},
-        "insights": {{
-            "fortalezas": [
-                "SOLO mencionar fortalezas basadas en información REAL del CV"
-            ],
-            "areas_mejora": [...],
-            "industrias_relacionadas": ["Basadas en la experiencia real del candidato"]
-        }},
         "evaluacion": {{
             "overall_score": ...,
             "calidad_cv": "...",
@@ -293,91 +449,673 @@ class OllamaCVProcessor:
         6. Extrae TODAS las herramientas, metodologías, software y competencias mencionadas según el área profesional
         7. ⚠️ CRÍTICO: NO inventes ni supongas habilidades que no estén explícitamente mencionadas en el CV
         8. ⚠️ CRÍTICO: NO menciones tecnologías avanzadas (ML, IA, LLM) a menos que estén EXPLÍCITAMENTE en el CV
-        9. ⚠️ CRÍTICO: Las fortalezas deben basarse ÚNICAMENTE en información real del CV
-        10. ⚠️ CRÍTICO: El texto de embedding debe incluir SOLO información verificable del CV
-        11. ⚠️ CRÍTICO: Las habilidades técnicas incluyen cualquier competencia profesional específica del área (no solo programación)
+        9. ⚠️ CRÍTICO: El texto de embedding debe incluir SOLO información verificable del CV
+        10. ⚠️ CRÍTICO: Las habilidades técnicas incluyen cualquier competencia profesional específica del área (no solo programación)
+        """
+
+    def create_section_prompt(self, clave: str, texto: str) -> str:
+        """Prompt "map": extrae una sola parte del esquema a partir de un fragmento del CV"""
+        return self.section_prompt_prefix(clave) + f"""
+        FRAGMENTO DEL CV:
+        {texto}
 
         JSON RESPONSE:
+        """
 
+    def section_prompt_prefix(self, clave: str) -> str:
+        """Instrucciones de una sección (prefijo compartido por todos los CVs, ver llm_utils)"""
+        return f"""
+        Eres un reclutador senior especializado en análisis de talento.
+
+        TAREA:
+        Del fragmento de un CV que se incluye al final extrae SOLO la sección "{clave}".
+        {SECTION_INSTRUCTIONS[clave]}
+
+        REGLAS CRÍTICAS:
+        1. Responde SOLO con un JSON de la forma {{"{clave}": {{...}}}}, sin texto adicional
+        2. ⚠️ CRÍTICO: NO inventes ni supongas información que no esté explícitamente en el fragmento
+        3. Si no encuentras información, usa "" para strings y [] para arrays
+        """
+
+    def create_summary_prompt(self, parcial: Dict, claves: List[str] = SUMMARY_KEYS) -> str:
+        """Prompt "reduce": perfil y evaluación a partir de las secciones ya extraídas"""
+        datos = json.dumps(parcial, ensure_ascii=False)
+        return f"""
+        Eres un reclutador senior especializado en análisis de talento con más de 15 años de experiencia en múltiples industrias.
+
+        TAREA:
+        A partir de los datos ya extraídos de un CV completa {", ".join(claves)}.
+
+        DATOS EXTRAÍDOS DEL CV:
+        {datos}
+
+        INSTRUCCIONES:
+        - rol_sugerido: PRIORIZA la experiencia laboral reciente sobre la educación
+        - seniority según experiencia laboral real: 0-6 meses "Trainee/Practicante", 6 meses - 2 años "Junior",
+          2-5 años "Semi-Senior", 5-8 años "Senior", 8+ años "Expert/Líder"
+        - anos_experiencia: suma de la experiencia profesional relevante
+        - overall_score (0-100): experiencia relevante +30, diversidad de competencias +20, logros +20,
+          certificaciones +15, educación relevante +10, CV claro +5
+        - calidad_cv: "Excelente", "Buena", "Regular" o "Deficiente"
+        - texto_embedding: resumen profesional completo para búsqueda semántica (formación, experiencia,
+          habilidades técnicas y blandas, idiomas, certificaciones)
+
+        REGLAS CRÍTICAS:
+        1. Responde SOLO con el JSON, sin texto adicional
+        2. ⚠️ CRÍTICO: El texto de embedding debe basarse ÚNICAMENTE en los datos extraídos
+        3. ⚠️ CRÍTICO: NO menciones tecnologías que no aparezcan en los datos
+
+        JSON RESPONSE:
         """
 
-        return prompt
+    def create_insights_prompt(self, datos: Dict) -> str:
+        """Prompt de insights: resumen, fortalezas, áreas de mejora e industrias a partir del análisis guardado"""
+        return f"""
+        Eres un reclutador senior especializado en análisis de talento con más de 15 años de experiencia en múltiples industrias.
+
+        TAREA:
+        A partir del análisis ya extraído de un CV redacta los insights del candidato.
+
+        DATOS DEL CANDIDATO:
+        {json.dumps(datos, ensure_ascii=False)}
+
+        INSTRUCCIONES:
+        - resumen_profesional: 2-4 oraciones sobre el perfil, priorizando la experiencia laboral reciente
+        - fortalezas: puntos fuertes concretos que se desprendan de los datos
+        - areas_mejora: aspectos que el candidato podría reforzar
+        - industrias_relacionadas: industrias donde encaja según su experiencia real
+
+        REGLAS CRÍTICAS:
+        1. Responde SOLO con el JSON, sin texto adicional
+        2. ⚠️ CRÍTICO: Las fortalezas deben basarse ÚNICAMENTE en información real del CV
+        3. ⚠️ CRÍTICO: NO menciones tecnologías que no aparezcan en los datos
+
+        JSON RESPONSE:
+        """
 
 
     
-    def process_cv_with_ollama(self, cv_text: str) -> CVAnalysis:
-        """Procesa un CV usando Ollama y retorna análisis estructurado"""
-        
+    def _analysis_options(self) -> Dict:
+        """Opciones de generación para el análisis de CVs"""
+        return {
+            "temperature": 0.1,  # Más determinístico
+            "top_p": 0.9,
+            "top_k": 40,
+            "num_ctx": 8192,
+            "num_predict": 4096,
+            "repeat_penalty": 1.1,  
+            "stop": ["Human:", "Assistant:"]
+        }
+
+    # ========== LLAMADAS CON SALIDA JSON ==========
+    def _sized_options(self, messages: List[Dict], num_predict: int, max_ctx: int = MAX_NUM_CTX) -> Dict:
+        """Opciones de análisis con num_ctx / num_predict dimensionados al prompt real"""
+        plan = token_budget.plan(messages, num_predict, max_ctx)
+        return {**self._analysis_options(), "num_ctx": plan["num_ctx"], "num_predict": plan["num_predict"]}
+
+    def _analysis_request(self, cv_text: str):
+        """(messages, options) de la llamada de análisis del CV completo"""
+        messages = [{"role": "user", "content": self.create_analysis_prompt(cv_text)}]
+        # La salida crece con el CV (experiencias, descripciones, texto de embedding)
+        num_predict = token_budget.estimate_tokens(cv_text) + 768
+        num_predict = max(ANALYSIS_MIN_PREDICT, min(ANALYSIS_MAX_PREDICT, num_predict))
+        return messages, self._sized_options(messages, num_predict)
+
+    def _cache_key(self, messages: List[Dict], options: Dict, schema: Dict, model: Optional[str] = None) -> str:
+        # El esquema forma parte de la clave: si cambia, las respuestas viejas no sirven.
+        # num_ctx / num_predict no: dependen de la estimación de tokens, no del contenido
+        opciones = {k: v for k, v in options.items() if k not in ("num_ctx", "num_predict")}
+        return make_cache_key(model or self.model, messages, {**opciones, "format": schema})
+
+    def _record_usage(self, call_site: str, messages: List[Dict], options: Dict, final_part,
+                      cv_id: Optional[int] = None, wall_seconds: Optional[float] = None,
+                      model: Optional[str] = None):
+        llm_telemetry.record(call_site, model or self.model, final_part, cv_id=cv_id, wall_seconds=wall_seconds)
+        plan = {
+            "num_ctx": options["num_ctx"],
+            "num_predict": options["num_predict"],
+            "estimated_prompt_tokens": token_budget.estimate_messages(messages),
+        }
+        token_budget.record(call_site, plan, messages_chars(messages), final_part)
+
+    def _cached_json(self, cache_key: str, schema: Dict) -> Optional[Dict]:
+        """Respuesta cacheada ya validada contra el esquema; None si no hay o es inválida"""
+        content = self.cache.get(cache_key)
+        if content is None:
+            return None
         try:
-            print(f"[INFO] Procesando CV con Ollama modelo: {self.model}")
-            
-            # Crear prompt
-            prompt = self.create_analysis_prompt(cv_text)
-            
-            # Llamar a Ollama
-            response = self.ollama_client.chat(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                options={
-                    "temperature": 0.1,  # Más determinístico
-                    "top_p": 0.9,
-                    "top_k": 40,
-                    "num_ctx": 8192,
-                    "num_predict": 4096,
-                    "repeat_penalty": 1.1,  
-                    "stop": ["Human:", "Assistant:"]
-                }
+            parser = IncrementalJSONObjectParser(schema)
+            parser.feed(content)
+            data = parser.close()
+            print(f"[INFO] Respuesta de Ollama tomada de la caché")
+            return data
+        except JSONStreamError as e:
+            print(f"[WARNING] Respuesta cacheada inválida, se vuelve a llamar a Ollama: {e}")
+            return None
+
+    def _feed_stream_part(self, parser: IncrementalJSONObjectParser, part, partes: List[str]):
+        """Pasa un fragmento del stream al parser; lanza JSONStreamError si la respuesta se desvía"""
+        text = part['message']['content']
+        partes.append(text)
+        for seccion, _ in parser.feed(text):
+            print(f"[DEBUG] Sección '{seccion}' recibida y validada ({parser.chars_received} caracteres)")
+
+    def _finish_stream(self, parser: IncrementalJSONObjectParser) -> Dict:
+        data = parser.close()
+        faltantes = parser.missing_sections()
+        if faltantes:
+            print(f"[WARNING] Secciones ausentes en la respuesta: {', '.join(faltantes)}")
+        return data
+
+    def _prompt_prefix(self, messages: List[Dict]) -> Optional[str]:
+        """Prefijo de instrucciones compartido (análisis o sección) con que empieza el prompt, si lo hay"""
+        if not hasattr(self, "_prefixes"):
+            self._prefixes = [self.analysis_prompt_prefix()] + [self.section_prompt_prefix(c) for c in SECTION_INSTRUCTIONS]
+        content = messages[0].get("content", "") if len(messages) == 1 else ""
+        return next((p for p in self._prefixes if content.startswith(p)), None)
+
+    def _chat_json(self, messages: List[Dict], options: Dict, schema: Dict, use_cache: bool = True,
+                   call_site: str = "analisis", deadline: Optional[Deadline] = None,
+                   cv_id: Optional[int] = None, model: Optional[str] = None) -> Dict:
+        """
+        Llamada a Ollama con salida restringida al esquema, consumida en streaming
+        y validada sección por sección. Lanza JSONStreamError si la respuesta se desvía
+        y DeadlineExceeded si no termina dentro del plazo (cada espera de fragmento,
+        también la del primero, se corta con lo que le queda al plazo).
+        """
+        model = model or self.model
+        cache_key = self._cache_key(messages, options, schema, model)
+        if use_cache:
+            cached = self._cached_json(cache_key, schema)
+            if cached is not None:
+                return cached
+
+        deadline = deadline or Deadline(LLM_CALL_DEADLINE_SECONDS, call_site)
+        deadline.check()
+        inicio = time.perf_counter()
+        stream = self.llm.chat_stream(
+            messages, model=model, options=options, format=schema, deadline=deadline,
+            prefix=self._prompt_prefix(messages)
+        )
+        parser = IncrementalJSONObjectParser(schema)
+        partes: List[str] = []
+        final_part = None
+        try:
+            for part in stream:
+                self._feed_stream_part(parser, part, partes)
+                # El último fragmento trae prompt_eval_count / eval_count
+                if part.get("done"):
+                    final_part = part
+                    break
+                if parser.done and len(partes) > parser.chunks_at_done + STREAM_TAIL_CHUNKS:
+                    break
+            data = self._finish_stream(parser)
+        except (JSONStreamError, DeadlineExceeded) as e:
+            # Lo que sí llegó válido se conserva para re-pedir solo el resto
+            e.partial = dict(parser.sections)
+            raise
+        finally:
+            # Cortar la generación si se abortó antes de terminar
+            stream.close()
+
+        self._record_usage(call_site, messages, options, final_part, cv_id, time.perf_counter() - inicio, model)
+        # Solo se cachean respuestas que se pudieron parsear
+        self.cache.set(cache_key, "".join(partes), model=model)
+        return data
+
+    async def _achat_json(self, messages: List[Dict], options: Dict, schema: Dict, use_cache: bool = True,
+                          call_site: str = "analisis", deadline: Optional[Deadline] = None,
+                          cv_id: Optional[int] = None, model: Optional[str] = None) -> Dict:
+        """Versión asíncrona de _chat_json (el plazo de cada espera se aplica con asyncio.wait_for)"""
+        model = model or self.model
+        cache_key = self._cache_key(messages, options, schema, model)
+        if use_cache:
+            cached = self._cached_json(cache_key, schema)
+            if cached is not None:
+                return cached
+
+        deadline = deadline or Deadline(LLM_CALL_DEADLINE_SECONDS, call_site)
+        deadline.check()
+        inicio = time.perf_counter()
+        parser = IncrementalJSONObjectParser(schema)
+        partes: List[str] = []
+
+        stream = self.llm.achat_stream(
+            messages, model=model, options=options, format=schema, deadline=deadline,
+            prefix=self._prompt_prefix(messages)
+        )
+        final_part = None
+        try:
+            async for part in stream:
+                self._feed_stream_part(parser, part, partes)
+                if part.get("done"):
+                    final_part = part
+                    break
+                if parser.done and len(partes) > parser.chunks_at_done + STREAM_TAIL_CHUNKS:
+                    break
+            data = self._finish_stream(parser)
+        except (JSONStreamError, DeadlineExceeded) as e:
+            e.partial = dict(parser.sections)
+            raise
+        finally:
+            await stream.aclose()
+        self._record_usage(call_site, messages, options, final_part, cv_id, time.perf_counter() - inicio, model)
+        self.cache.set(cache_key, "".join(partes), model=model)
+        return data
+
+    # ========== ANÁLISIS POR SECCIONES (MAP/REDUCE) ==========
+    def _section_requests(self, sections: Dict[str, str]) -> List[Tuple[str, List[Dict], Dict, Dict]]:
+        """
+        Llamadas "map": una por clave del esquema, cada una solo con las
+        secciones del CV que necesita y un contexto chico.
+        Retorna [(clave, messages, options, schema)]
+        """
+        requests_ = []
+        for clave, fuentes, alternativas, num_predict in SECTION_TASKS:
+            texto = self._section_text(sections, fuentes, alternativas)
+            if not texto:
+                continue
+            messages = [{"role": "user", "content": self.create_section_prompt(clave, texto)}]
+            options = self._sized_options(messages, num_predict, max_ctx=SECTION_NUM_CTX)
+            requests_.append((clave, messages, options, subschema(clave)))
+        return requests_
+
+    def _section_text(self, sections: Dict[str, str], fuentes: List[str], alternativas: List[str]) -> str:
+        texto = "\n\n".join(sections[s] for s in fuentes if sections.get(s))
+        if not texto:
+            texto = "\n\n".join(sections[s] for s in alternativas if sections.get(s))
+        return texto
+
+    def _summary_request(self, parcial: Dict, claves: List[str] = SUMMARY_KEYS) -> Tuple[List[Dict], Dict, Dict]:
+        """Llamada "reduce": perfil y evaluación a partir de lo ya extraído"""
+        messages = [{"role": "user", "content": self.create_summary_prompt(parcial, claves)}]
+        options = self._sized_options(messages, 1536)
+        return messages, options, subschema(*claves)
+
+    def _merge_sections(self, resultados: List[Dict], pedidas: List[str]) -> Dict:
+        """
+        Une las secciones extraídas. Las que no se pidieron (el CV no tiene ese
+        texto) quedan vacías; las pedidas que fallaron quedan ausentes para re-pedirlas.
+        """
+        data = {clave: vacio for clave, vacio in SECTION_DEFAULTS.items() if clave not in pedidas}
+        for resultado in resultados:
+            data.update(resultado)
+        return data
+
+    def _process_sections(self, sections: Dict[str, str], use_cache: bool, budget: Deadline,
+                          cv_id: Optional[int] = None) -> Dict:
+        requests_ = self._section_requests(sections)
+        print(f"[INFO] CV largo: análisis en {len(requests_)} llamadas por sección ({', '.join(r[0] for r in requests_)})")
+        with ThreadPoolExecutor(max_workers=max(1, len(requests_))) as pool:
+            futuros = [
+                pool.submit(
+                    self._chat_json, m, o, sch, use_cache, f"seccion:{clave}",
+                    budget.child(LLM_SECTION_DEADLINE_SECONDS, f"seccion:{clave}"), cv_id
+                )
+                for clave, m, o, sch in requests_
+            ]
+            resultados = []
+            for (clave, _, _, _), futuro in zip(requests_, futuros):
+                try:
+                    resultados.append(futuro.result())
+                except SECTION_ERRORS as e:
+                    # La sección queda pendiente y se re-pide después
+                    print(f"[WARNING] Sección '{clave}' descartada: {e}")
+            parcial = self._merge_sections(resultados, [r[0] for r in requests_])
+        messages, options, schema = self._summary_request(parcial)
+        try:
+            parcial.update(self._chat_json(
+                messages, options, schema, use_cache, "resumen", budget.child(LLM_CALL_DEADLINE_SECONDS, "resumen"), cv_id
+            ))
+        except SECTION_ERRORS as e:
+            print(f"[WARNING] Resumen descartado: {e}")
+            parcial.update(getattr(e, "partial", None) or {})
+        return parcial
+
+    async def _aprocess_sections(self, sections: Dict[str, str], use_cache: bool, budget: Deadline,
+                                 cv_id: Optional[int] = None) -> Dict:
+        requests_ = self._section_requests(sections)
+        print(f"[INFO] CV largo: análisis en {len(requests_)} llamadas por sección ({', '.join(r[0] for r in requests_)})")
+        resultados = await asyncio.gather(*[
+            self._achat_json(
+                m, o, sch, use_cache, f"seccion:{clave}",
+                budget.child(LLM_SECTION_DEADLINE_SECONDS, f"seccion:{clave}"), cv_id
             )
-            
-            response_content = response['message']['content']
-            print(f"[DEBUG] Respuesta de Ollama recibida: {len(response_content)} caracteres")
-            
-            # Parsear respuesta JSON
-            analysis_data = self._parse_ollama_response(response_content)
-            
-            # Convertir a objeto CVAnalysis
-            cv_analysis = self._create_cv_analysis_object(analysis_data)
-            
-            print(f"[SUCCESS] Análisis completado para: {cv_analysis.nombre}")
-            
-            return cv_analysis
+            for clave, m, o, sch in requests_
+        ], return_exceptions=True)
+        validos = []
+        for (clave, _, _, _), resultado in zip(requests_, resultados):
+            if isinstance(resultado, SECTION_ERRORS):
+                print(f"[WARNING] Sección '{clave}' descartada: {resultado}")
+            elif isinstance(resultado, BaseException):
+                raise resultado
+            else:
+                validos.append(resultado)
+        parcial = self._merge_sections(validos, [r[0] for r in requests_])
+        messages, options, schema = self._summary_request(parcial)
+        try:
+            parcial.update(await self._achat_json(
+                messages, options, schema, use_cache, "resumen", budget.child(LLM_CALL_DEADLINE_SECONDS, "resumen"), cv_id
+            ))
+        except SECTION_ERRORS as e:
+            print(f"[WARNING] Resumen descartado: {e}")
+            parcial.update(getattr(e, "partial", None) or {})
+        return parcial
+
+    # ========== CASCADA: MODELO CHICO -> LLAMA3 ==========
+    def _use_cascade(self, cv_text: str) -> bool:
+        return cascade_stats.enabled and CASCADE_SMALL_MODEL != self.model and len(cv_text) <= CASCADE_MAX_CHARS
+
+    def _small_tier_verdict(self, data: Dict, cv_text: str) -> Optional[str]:
+        """Motivo para escalar la salida del modelo chico, o None si se acepta"""
+        faltantes = [k for k in CV_ANALYSIS_SCHEMA["required"] if k not in data]
+        if faltantes:
+            return "secciones_faltantes"
+        return escalation_reason(data, cv_text)
+
+    def _small_tier_error(self, e: Exception) -> str:
+        """Motivo para escalar tras un error del modelo chico (Ollama caído no llega acá: se propaga)"""
+        if isinstance(e, JSONStreamError):
+            return "json_invalido"
+        if isinstance(e, DeadlineExceeded):
+            return "plazo_agotado"
+        if getattr(e, "status_code", None) == 404:
+            cascade_stats.disable(f"modelo {CASCADE_SMALL_MODEL} no disponible en Ollama")
+            return "modelo_no_disponible"
+        return "error_modelo_chico"
+
+    def _record_tier(self, tier: str, inicio: float, motivo: Optional[str] = None, small_seconds: float = 0.0):
+        cascade_stats.record(tier, time.perf_counter() - inicio, motivo, small_seconds)
+
+    def _analyze_single(self, cv_text: str, use_cache: bool, budget: Deadline, cv_id: Optional[int]) -> Dict:
+        """
+        Análisis en una sola llamada. Los CVs cortos pasan primero por el modelo
+        chico; se escala a self.model si la salida no valida, faltan secciones
+        o las heurísticas de confianza fallan (ej: rol "Por definir").
+        """
+        messages, options = self._analysis_request(cv_text)
+        inicio = time.perf_counter()
+        motivo, small_seconds = None, 0.0
+        if self._use_cascade(cv_text):
+            try:
+                data = self._chat_json(
+                    messages, options, CV_ANALYSIS_SCHEMA, use_cache, "analisis:small",
+                    budget.child(CASCADE_SMALL_DEADLINE_SECONDS, "analisis:small"), cv_id, CASCADE_SMALL_MODEL
+                )
+                motivo = self._small_tier_verdict(data, cv_text)
+            except (JSONStreamError, DeadlineExceeded, ResponseError) as e:
+                motivo = self._small_tier_error(e)
+            if motivo is None:
+                self._record_tier(TIER_SMALL, inicio)
+                return data
+            small_seconds = time.perf_counter() - inicio
+            print(f"[INFO] Escalando CV a {self.model} (motivo: {motivo})")
+
+        try:
+            data = self._chat_json(
+                messages, options, CV_ANALYSIS_SCHEMA, use_cache,
+                deadline=budget.child(LLM_CALL_DEADLINE_SECONDS, "analisis"), cv_id=cv_id
+            )
+        except SECTION_ERRORS as e:
+            # Las secciones válidas se conservan; el resto se re-pide por separado
+            data = getattr(e, "partial", None) or {}
+            print(f"[WARNING] Análisis incompleto, se conservan {len(data)} secciones: {e}")
+        self._record_tier(TIER_LARGE, inicio, motivo, small_seconds)
+        return data
+
+    async def _aanalyze_single(self, cv_text: str, use_cache: bool, budget: Deadline, cv_id: Optional[int]) -> Dict:
+        """Versión asíncrona de _analyze_single"""
+        messages, options = self._analysis_request(cv_text)
+        inicio = time.perf_counter()
+        motivo, small_seconds = None, 0.0
+        if self._use_cascade(cv_text):
+            try:
+                data = await self._achat_json(
+                    messages, options, CV_ANALYSIS_SCHEMA, use_cache, "analisis:small",
+                    budget.child(CASCADE_SMALL_DEADLINE_SECONDS, "analisis:small"), cv_id, CASCADE_SMALL_MODEL
+                )
+                motivo = self._small_tier_verdict(data, cv_text)
+            except (JSONStreamError, DeadlineExceeded, ResponseError) as e:
+                motivo = self._small_tier_error(e)
+            if motivo is None:
+                self._record_tier(TIER_SMALL, inicio)
+                return data
+            small_seconds = time.perf_counter() - inicio
+            print(f"[INFO] Escalando CV a {self.model} (motivo: {motivo})")
+
+        try:
+            data = await self._achat_json(
+                messages, options, CV_ANALYSIS_SCHEMA, use_cache,
+                deadline=budget.child(LLM_CALL_DEADLINE_SECONDS, "analisis"), cv_id=cv_id
+            )
+        except SECTION_ERRORS as e:
+            # Las secciones válidas se conservan; el resto se re-pide por separado
+            data = getattr(e, "partial", None) or {}
+            print(f"[WARNING] Análisis incompleto, se conservan {len(data)} secciones: {e}")
+        self._record_tier(TIER_LARGE, inicio, motivo, small_seconds)
+        return data
+
+    # ===== Re-pedido de secciones faltantes =====
+    def _missing_sections(self, data: Dict) -> List[str]:
+        """Secciones obligatorias del esquema que no llegaron (o llegaron inválidas y se descartaron)"""
+        return [clave for clave in CV_ANALYSIS_SCHEMA["required"] if clave not in data]
+
+    def _has_model_data(self, data: Dict) -> bool:
+        """True si al menos una sección vino del modelo (no solo los valores vacíos por defecto)"""
+        return any(
+            clave in data and data[clave] != SECTION_DEFAULTS.get(clave)
+            for clave in CV_ANALYSIS_SCHEMA["required"]
+        )
+
+    def _reask_requests(self, cv_text: str, faltantes: List[str]) -> List[Tuple[str, List[Dict], Dict, Dict]]:
+        """
+        Llamadas de extracción solo para las secciones faltantes. Cada una recibe
+        el fragmento del CV que le corresponde o, si no se detecta, el CV completo.
+        """
+        sections = split_cv_sections(cv_text)
+        requests_ = []
+        for clave, fuentes, alternativas, num_predict in SECTION_TASKS:
+            if clave not in faltantes:
+                continue
+            texto = self._section_text(sections, fuentes, alternativas)
+            max_ctx = SECTION_NUM_CTX if texto else MAX_NUM_CTX
+            messages = [{"role": "user", "content": self.create_section_prompt(clave, texto or cv_text)}]
+            options = self._sized_options(messages, num_predict, max_ctx=max_ctx)
+            requests_.append((clave, messages, options, subschema(clave)))
+        return requests_
+
+    def _reask_summary(self, data: Dict, faltantes: List[str]) -> Optional[Tuple[List[str], List[Dict], Dict, Dict]]:
+        claves = [clave for clave in SUMMARY_KEYS if clave in faltantes]
+        if not claves:
+            return None
+        return (claves, *self._summary_request({**SECTION_DEFAULTS, **data}, claves))
+
+    def _reask_sections(self, cv_text: str, data: Dict, use_cache: bool, budget: Deadline,
+                        cv_id: Optional[int] = None) -> Dict:
+        """
+        Completa un análisis parcial re-pidiendo solo las secciones que faltan,
+        con prompts chicos. Lo ya extraído se conserva; una sección que vuelve a
+        fallar queda vacía en lugar de descartar el CV completo.
+        """
+        faltantes = self._missing_sections(data)
+        if not faltantes:
+            return data
+        print(f"[INFO] Re-pidiendo secciones faltantes: {', '.join(faltantes)}")
+        for clave, messages, options, schema in self._reask_requests(cv_text, faltantes):
+            if budget.expired():
+                print(f"[WARNING] Presupuesto agotado: sección '{clave}' sin re-pedir")
+                continue
+            try:
+                data.update(self._chat_json(
+                    messages, options, schema, use_cache, f"reask:{clave}",
+                    budget.child(LLM_SECTION_DEADLINE_SECONDS, f"reask:{clave}"), cv_id
+                ))
+            except SECTION_ERRORS as e:
+                print(f"[WARNING] Sección '{clave}' sin recuperar: {e}")
+        resumen = self._reask_summary(data, faltantes) if not budget.expired() else None
+        if resumen:
+            claves, messages, options, schema = resumen
+            try:
+                data.update(self._chat_json(
+                    messages, options, schema, use_cache, "reask:resumen",
+                    budget.child(LLM_CALL_DEADLINE_SECONDS, "reask:resumen"), cv_id
+                ))
+            except SECTION_ERRORS as e:
+                print(f"[WARNING] Resumen sin recuperar ({', '.join(claves)}): {e}")
+                data.update(getattr(e, "partial", None) or {})
+        return data
+
+    async def _areask_sections(self, cv_text: str, data: Dict, use_cache: bool, budget: Deadline,
+                               cv_id: Optional[int] = None) -> Dict:
+        """Versión asíncrona de _reask_sections (las extracciones van en paralelo)"""
+        faltantes = self._missing_sections(data)
+        if not faltantes:
+            return data
+        print(f"[INFO] Re-pidiendo secciones faltantes: {', '.join(faltantes)}")
+        requests_ = self._reask_requests(cv_text, faltantes) if not budget.expired() else []
+        resultados = await asyncio.gather(*[
+            self._achat_json(
+                m, o, sch, use_cache, f"reask:{clave}",
+                budget.child(LLM_SECTION_DEADLINE_SECONDS, f"reask:{clave}"), cv_id
+            )
+            for clave, m, o, sch in requests_
+        ], return_exceptions=True)
+        for (clave, _, _, _), resultado in zip(requests_, resultados):
+            if isinstance(resultado, SECTION_ERRORS):
+                print(f"[WARNING] Sección '{clave}' sin recuperar: {resultado}")
+            elif isinstance(resultado, BaseException):
+                raise resultado
+            else:
+                data.update(resultado)
+        resumen = self._reask_summary(data, faltantes) if not budget.expired() else None
+        if resumen:
+            claves, messages, options, schema = resumen
+            try:
+                data.update(await self._achat_json(
+                    messages, options, schema, use_cache, "reask:resumen",
+                    budget.child(LLM_CALL_DEADLINE_SECONDS, "reask:resumen"), cv_id
+                ))
+            except SECTION_ERRORS as e:
+                print(f"[WARNING] Resumen sin recuperar ({', '.join(claves)}): {e}")
+                data.update(getattr(e, "partial", None) or {})
+        return data
+
+    def _sections_for(self, cv_text: str) -> Optional[Dict[str, str]]:
+        """Secciones del CV si conviene el análisis por secciones; None para el prompt único"""
+        sections = split_cv_sections(cv_text)
+        return sections if should_split(cv_text, sections) else None
+
+    def _analysis_from_data(self, analysis_data: Dict) -> CVAnalysis:
+        # Lo que no se pudo recuperar ni re-pidiendo queda vacío
+        for clave, vacio in SECTION_DEFAULTS.items():
+            analysis_data.setdefault(clave, vacio)
+        cv_analysis = self._create_cv_analysis_object(analysis_data)
+        print(f"[SUCCESS] Análisis completado para: {cv_analysis.nombre}")
+        return cv_analysis
+
+    # ===== Insights diferidos =====
+    def generate_insights(self, analysis: CVAnalysis, use_cache: bool = True, deadline: Optional[Deadline] = None,
+                          cv_id: Optional[int] = None) -> CVAnalysis:
+        """
+        Completa los insights de un análisis ya guardado (se llama la primera vez
+        que se consulta el CV). Parte de los datos extraídos, no del texto del CV,
+        así que el prompt es corto. Lanza JSONStreamError, DeadlineExceeded o
+        CircuitOpenError si no se pudieron generar; quien llama decide si reintentar.
+        """
+        datos = {
+            k: v for k, v in analysis_to_dict(analysis).items()
+            if k not in INSIGHT_FIELDS and k not in ("embedding_text", "insights_generated")
+        }
+        messages = [{"role": "user", "content": self.create_insights_prompt(datos)}]
+        options = self._sized_options(messages, 1024)
+        budget = deadline or Deadline(None)
+        data = self._chat_json(
+            messages, options, INSIGHTS_SCHEMA, use_cache, "insights",
+            budget.child(LLM_CALL_DEADLINE_SECONDS, "insights"), cv_id
+        )
+        for campo in INSIGHT_FIELDS:
+            setattr(analysis, campo, data[campo])
+        analysis.insights_generated = True
+        return analysis
+
+    def process_cv_with_ollama(self, cv_text: str, use_cache: bool = True, deadline: Optional[Deadline] = None,
+                               cv_id: Optional[int] = None) -> CVAnalysis:
+        """
+        Procesa un CV usando Ollama y retorna análisis estructurado.
+        Los CVs largos se dividen en secciones que se analizan en paralelo.
+        Con use_cache=False se ignora la caché (la respuesta nueva la reemplaza).
+        deadline es el presupuesto de la petición; cada llamada tiene además su propio plazo.
+        cv_id solo se usa para asociar la telemetría de las llamadas al CV.
+        """
+        budget = deadline or Deadline(None)
+        try:
+            print(f"[INFO] Procesando CV con Ollama modelo: {self.model}")
+
+            sections = self._sections_for(cv_text)
+            if sections:
+                inicio = time.perf_counter()
+                analysis_data = self._process_sections(sections, use_cache, budget, cv_id)
+                self._record_tier(TIER_LARGE, inicio)
+            else:
+                analysis_data = self._analyze_single(cv_text, use_cache, budget, cv_id)
+
+            if not analysis_data:
+                print("[ERROR] Ollama no devolvió ninguna sección válida")
+                return self._create_fallback_analysis(cv_text)
+            analysis_data = self._reask_sections(cv_text, analysis_data, use_cache, budget, cv_id)
+            if not self._has_model_data(analysis_data):
+                print("[ERROR] No se recuperó ninguna sección del CV")
+                return self._create_fallback_analysis(cv_text)
+            return self._analysis_from_data(analysis_data)
+            
+        except JSONStreamError as e:
+            print(f"[ERROR] Respuesta de Ollama descartada en streaming: {e}")
+            return self._create_fallback_analysis(cv_text)
+
+        except (DeadlineExceeded, CircuitOpenError) as e:
+            print(f"[WARNING] {e}; se usa el análisis de fallback")
+            return self._create_fallback_analysis(cv_text)
             
         except Exception as e:
             print(f"[ERROR] Error procesando CV con Ollama: {str(e)}")
             # Retornar análisis básico como fallback
             return self._create_fallback_analysis(cv_text)
-    
-    def _parse_ollama_response(self, response: str) -> Dict:
-        """Parsea la respuesta JSON de Ollama"""
+
+    async def aprocess_cv_with_ollama(self, cv_text: str, use_cache: bool = True,
+                                      deadline: Optional[Deadline] = None, cv_id: Optional[int] = None) -> CVAnalysis:
+        """Versión asíncrona de process_cv_with_ollama usando ollama.AsyncClient"""
+        budget = deadline or Deadline(None)
         try:
-            # Limpiar respuesta si tiene texto extra
-            response = response.strip()
-            
-            # Buscar JSON válido en la respuesta
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
+            print(f"[INFO] Procesando CV con Ollama (async) modelo: {self.model}")
+
+            sections = self._sections_for(cv_text)
+            if sections:
+                inicio = time.perf_counter()
+                analysis_data = await self._aprocess_sections(sections, use_cache, budget, cv_id)
+                self._record_tier(TIER_LARGE, inicio)
             else:
-                json_str = response
-            
-            # Parsear JSON
-            return json.loads(json_str)
-            
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] Error parseando JSON de Ollama: {e}")
-            print(f"[DEBUG] Respuesta problemática: {response[:300]}...")
-            
-            # Intentar parsear línea por línea para encontrar JSON válido
-            lines = response.split('\n')
-            for i, line in enumerate(lines):
-                if line.strip().startswith('{'):
-                    try:
-                        remaining_text = '\n'.join(lines[i:])
-                        return json.loads(remaining_text)
-                    except:
-                        continue
-            
-            raise Exception("No se pudo extraer JSON válido de la respuesta de Ollama")
+                analysis_data = await self._aanalyze_single(cv_text, use_cache, budget, cv_id)
+
+            if not analysis_data:
+                print("[ERROR] Ollama no devolvió ninguna sección válida")
+                return self._create_fallback_analysis(cv_text)
+            analysis_data = await self._areask_sections(cv_text, analysis_data, use_cache, budget, cv_id)
+            if not self._has_model_data(analysis_data):
+                print("[ERROR] No se recuperó ninguna sección del CV")
+                return self._create_fallback_analysis(cv_text)
+            return self._analysis_from_data(analysis_data)
+            
+        except JSONStreamError as e:
+            print(f"[ERROR] Respuesta de Ollama descartada en streaming: {e}")
+            return self._create_fallback_analysis(cv_text)
+
+        except (DeadlineExceeded, CircuitOpenError) as e:
+            print(f"[WARNING] {e}; se usa el análisis de fallback")
+            return self._create_fallback_analysis(cv_text)
+            
+        except Exception as e:
+            print(f"[ERROR] Error procesando CV con Ollama: {str(e)}")
+            return self._create_fallback_analysis(cv_text)
     
     def _create_cv_analysis_object(self, data: Dict) -> CVAnalysis:
         """Convierte el diccionario de Ollama a objeto CVAnalysis"""
@@ -387,7 +1125,6 @@ class OllamaCVProcessor:
         competencias = data.get("competencias", {})
         formacion = data.get("formacion", {})
         experiencia = data.get("experiencia", {})
-        insights = data.get("insights", {})
         evaluacion = data.get("evaluacion", {})
         embedding = data.get("embedding_optimizado", {})
         
@@ -405,7 +1142,8 @@ class OllamaCVProcessor:
             seniority=perfil.get("seniority", "Junior"),
             sector=perfil.get("sector", "General"),
             anos_experiencia=perfil.get("anos_experiencia", 0),
-            resumen_profesional=perfil.get("resumen_profesional", ""),
+            # Resumen e insights no están en CV_ANALYSIS_SCHEMA: los completa generate_insights()
+            resumen_profesional="",
             
             # Habilidades y competencias
             habilidades_tecnicas=competencias.get("habilidades_tecnicas", []),
@@ -421,9 +1159,9 @@ class OllamaCVProcessor:
             proyectos_destacados=experiencia.get("proyectos_destacados", []),
             
             # Insights
-            fortalezas=insights.get("fortalezas", []),
-            areas_mejora=insights.get("areas_mejora", []),
-            industrias_relacionadas=insights.get("industrias_relacionadas", []),
+            fortalezas=[],
+            areas_mejora=[],
+            industrias_relacionadas=[],
             
             # Evaluación
             overall_score=float(evaluacion.get("overall_score", 50.0)),
@@ -463,12 +1201,22 @@ class OllamaCVProcessor:
             industrias_relacionadas=[],
             overall_score=30.0,
             calidad_cv="Por evaluar",
-            embedding_text=f"Información del candidato: {cv_text[:500]}..."
+            embedding_text=f"Información del candidato: {cv_text[:500]}...",
+            # Sin análisis real no hay de qué generar insights
+            insights_generated=True
         )
 
 
 
-    def save_cv_from_analysis_corrected(self, analysis, filename: str):
+    def save_cv_from_analysis_corrected(self, analysis, filename: str, cv: Optional[CV] = None, processed_status: str = "completed",
+                                        commit: bool = True):
+        """
+        Guarda el análisis en la BD. Si se pasa un CV existente (ej: el registro
+        "pending" creado por /upload) se completa ese registro en lugar de crear uno nuevo.
+        processed_status permite dejarlo en "processing" si aún faltan etapas.
+        Con commit=False solo hace flush: quien llama confirma varios CVs en un
+        solo commit (ej: el guardado por lotes) y maneja el rollback.
+        """
         try:
             print(f"[INFO] Guardando CV con lógica corregida: {analysis.nombre}")
 
@@ -476,9 +1224,8 @@ class OllamaCVProcessor:
             rol = self.get_or_create_role(analysis.rol_sugerido)
             puesto = self.get_or_create_seniority_level(analysis.seniority, analysis.anos_experiencia)
 
-            cv = CV(
+            campos = dict(
                 filename=filename,
-                contenido=analysis.embedding_text or "Contenido procesado con Ollama",
                 nombre_completo=analysis.nombre if analysis.nombre != "N/A" else None,
                 email=analysis.email if analysis.email and analysis.email != "N/A" else None,
                 telefono=analysis.telefono if analysis.telefono and analysis.telefono not in ["N/A", "No disponible"] else None,
@@ -491,12 +1238,31 @@ class OllamaCVProcessor:
                 id_industria=industria.id if industria else None,
                 overall_score=analysis.overall_score,
                 anhos_experiencia=analysis.anos_experiencia,
-                processed_status="completed"
+                analysis_json=analysis_to_dict(analysis),
+                processed_status=processed_status
             )
 
-            self.session.add(cv)
+            if cv is None:
+                cv = CV(
+                    contenido=analysis.embedding_text or "Contenido procesado con Ollama",
+                    **campos
+                )
+                self.session.add(cv)
+            else:
+                # Conservar el texto extraído del PDF si ya estaba guardado
+                if not cv.contenido:
+                    cv.contenido = analysis.embedding_text or "Contenido procesado con Ollama"
+                for campo, valor in campos.items():
+                    setattr(cv, campo, valor)
+                # El análisis reemplaza habilidades e idiomas de una clasificación
+                # previa (ej: la vía rápida por regex del modo tiered)
+                cv.habilidades = []
+                cv.lenguajes = []
+
             self.session.flush()
 
+            # Filas hijas (experiencias, educación, proyectos): un solo add_all al final
+            nuevos = []
             for exp in analysis.experiencias:
                 if isinstance(exp, dict):
                     exp_industria = self.determine_company_industry(exp.get('empresa', ''), exp.get('descripcion', ''))
@@ -510,7 +1276,7 @@ class OllamaCVProcessor:
                         id_industria=exp_industria.id if exp_industria else industria.id,
                         es_actual=exp.get('actual', False)
                     )
-                    self.session.add(experiencia)
+                    nuevos.append(experiencia)
 
             def safe_habilidad_nombre(nombre):
                 return nombre[:100] if nombre and len(nombre) > 100 else nombre
@@ -542,7 +1308,7 @@ class OllamaCVProcessor:
                         campo_estudio=edu.get('campo', None),
                         esta_cursando=edu.get('en_curso', False)
                     )
-                    self.session.add(educacion)
+                    nuevos.append(educacion)
 
             for proyecto in analysis.proyectos_destacados:
                 if isinstance(proyecto, dict):
@@ -552,9 +1318,13 @@ class OllamaCVProcessor:
                         descripcion=proyecto.get('descripcion', ''),
                         tecnologias_usadas=', '.join(proyecto.get('tecnologias', []))
                     )
-                    self.session.add(proyecto_obj)
+                    nuevos.append(proyecto_obj)
 
-            self.session.commit()
+            self.session.add_all(nuevos)
+            if commit:
+                self.session.commit()
+            else:
+                self.session.flush()
 
             print(f"[SUCCESS] CV guardado con nueva lógica:")
             print(f"  - ID: {cv.id}")
@@ -567,7 +1337,8 @@ class OllamaCVProcessor:
             return cv
 
         except Exception as e:
-            self.session.rollback()
+            if commit:
+                self.session.rollback()
             print(f"[ERROR] Error guardando CV: {e}")
             raise Exception(f"Error guardando CV: {e}")
 
@@ -0,0 +1,427 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+import httpx
+from dotenv import load_dotenv
+from ollama import Client as OllamaClient, AsyncClient as OllamaAsyncClient, ResponseError
+
+from circuit_breaker import CircuitBreaker, ollama_breaker
+from deadlines import Deadline, DeadlineExceeded
+
+load_dotenv()
+
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "3"))
+# Fallos consecutivos para sacar un host de la rotación
+OLLAMA_EVICT_AFTER = int(os.getenv("OLLAMA_EVICT_AFTER", "2"))
+# Timeouts de cada petición HTTP: conexión y máximo silencio entre bytes
+# (en streaming, entre fragmentos). Evitan que un Ollama colgado bloquee para siempre
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+# Cuánto mantiene Ollama el modelo en memoria tras cada llamada ("30m", "1h",
+# segundos, o -1 para no descargarlo nunca)
+_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_KEEP_ALIVE = int(_keep_alive) if _keep_alive.lstrip("-").isdigit() else _keep_alive
+
+
+def hosts_from_env() -> List[str]:
+    """
+    OLLAMA_HOSTS (separados por coma) o, si no está, OLLAMA_HOST.
+    API_URL (usada antes por llm_utils) se acepta como último recurso.
+    """
+    hosts = os.getenv("OLLAMA_HOSTS") or os.getenv("OLLAMA_HOST")
+    if not hosts and os.getenv("API_URL"):
+        hosts = os.getenv("API_URL").split("/api/")[0]
+    hosts = hosts or "http://localhost:11434"
+    return [h.strip().rstrip("/") for h in hosts.split(",") if h.strip()]
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+
+
+def _is_backend_error(e: Exception) -> bool:
+    """Errores atribuibles al host (caído, timeout, 5xx) y no a la petición"""
+    if isinstance(e, (ConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(e, ResponseError) and getattr(e, "status_code", 0) >= 500
+
+
+class _Backend:
+    def __init__(self, host: str, client, async_client, probe_client):
+        self.host = host
+        self.client = client
+        self.async_client = async_client
+        self.probe_client = probe_client
+        self.healthy = True
+        self.outstanding = 0
+        self.total_requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_probe_at: Optional[float] = None
+
+
+class OllamaPool:
+    """
+    Pool de servidores Ollama. Cada llamada va al host sano con menos
+    peticiones en curso; si un host falla por conexión, timeout o 5xx la
+    llamada se reintenta en otro (en streaming, solo si aún no llegó ningún
+    fragmento). Tras OLLAMA_EVICT_AFTER fallos seguidos el host sale de la
+    rotación y un chequeo periódico (GET /api/tags) lo vuelve a admitir
+    cuando responde.
+
+    client() y async_client() exponen la misma interfaz que ollama.Client /
+    ollama.AsyncClient (chat, generate), así que el resto del código no
+    distingue si hay uno o varios hosts. Las fábricas de clientes se pueden
+    reemplazar para apuntar a servidores stub.
+
+    Por encima de los hosts hay un circuit breaker: si las llamadas fallan en
+    todos los hosts varias veces seguidas, las siguientes se rechazan al
+    instante con CircuitOpenError hasta que una llamada de prueba funcione.
+    """
+
+    def __init__(
+        self,
+        hosts: List[str],
+        client_factory: Callable[[str], Any] = lambda host: OllamaClient(host=host, timeout=_http_timeout()),
+        async_client_factory: Callable[[str], Any] = lambda host: OllamaAsyncClient(host=host, timeout=_http_timeout()),
+        probe_factory: Callable[[str], Any] = lambda host: OllamaClient(host=host, timeout=OLLAMA_HEALTH_TIMEOUT),
+        health_interval: float = OLLAMA_HEALTH_INTERVAL,
+        evict_after: int = OLLAMA_EVICT_AFTER,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        if not hosts:
+            raise ValueError("OllamaPool necesita al menos un host")
+        self.backends = [
+            _Backend(h, client_factory(h), async_client_factory(h), probe_factory(h)) for h in hosts
+        ]
+        self.async_client_factory = async_client_factory
+        self.health_interval = health_interval
+        self.evict_after = evict_after
+        self.breaker = breaker or CircuitBreaker("ollama")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_clients: Dict[str, Any] = {}
+
+    # ===== Selección de host =====
+    def _acquire(self, exclude: Set[str]) -> _Backend:
+        with self._lock:
+            candidatos = [b for b in self.backends if b.healthy and b.host not in exclude]
+            if not candidatos:
+                # Sin hosts sanos se intenta igual con los restantes antes de fallar
+                candidatos = [b for b in self.backends if b.host not in exclude]
+            if not candidatos:
+                raise ConnectionError("No hay servidores de Ollama disponibles")
+            backend = min(candidatos, key=lambda b: (b.outstanding, b.total_requests))
+            backend.outstanding += 1
+            backend.total_requests += 1
+            return backend
+
+    def _release(self, backend: _Backend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _mark_success(self, backend: _Backend):
+        with self._lock:
+            backend.consecutive_failures = 0
+            if not backend.healthy:
+                backend.healthy = True
+                print(f"[INFO] Ollama {backend.host} readmitido en el pool")
+
+    def _mark_failure(self, backend: _Backend, error: Exception):
+        with self._lock:
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            backend.last_error = str(error)[:200]
+            if backend.healthy and backend.consecutive_failures >= self.evict_after:
+                backend.healthy = False
+                print(f"[WARNING] Ollama {backend.host} fuera del pool tras {backend.consecutive_failures} fallos: {error}")
+
+    # ===== Llamadas sync =====
+    def _call(self, method: str, kwargs: Dict[str, Any]):
+        kwargs.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
+        if kwargs.get("stream"):
+            return self._stream(method, kwargs)
+        self.breaker.allow()
+        intentados: Set[str] = set()
+        while True:
+            backend = self._acquire(intentados)
+            try:
+                result = getattr(backend.client, method)(**kwargs)
+                self._mark_success(backend)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not _is_backend_error(e):
+                    # El host respondió (ej: 4xx): el backend está vivo
+                    self.breaker.record_success()
+                    raise
+                self._mark_failure(backend, e)
+                intentados.add(backend.host)
+                if len(intentados) >= len(self.backends):
+                    self.breaker.record_failure(e)
+                    raise
+                print(f"[WARNING] Ollama {backend.host} falló ({e}); reintentando en otro host")
+            finally:
+                self._release(backend)
+
+    def _stream(self, method: str, kwargs: Dict[str, Any]):
+        self.breaker.allow()
+        intentados: Set[str] = set()
+        while True:
+            backend = self._acquire(intentados)
+            recibido = False
+            try:
+                for part in getattr(backend.client, method)(**kwargs):
+                    if not recibido:
+                        recibido = True
+                        self.breaker.record_success()
+                    yield part
+                self._mark_success(backend)
+                return
+            except Exception as e:
+                if not _is_backend_error(e):
+                    self.breaker.record_success()
+                    raise
+                self._mark_failure(backend, e)
+                intentados.add(backend.host)
+                if recibido or len(intentados) >= len(self.backends):
+                    self.breaker.record_failure(e)
+                    raise
+                print(f"[WARNING] Ollama {backend.host} falló ({e}); reintentando en otro host")
+            finally:
+                self._release(backend)
+
+    # ===== Llamadas async =====
+    async def _acall(self, method: str, kwargs: Dict[str, Any]):
+        kwargs.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
+        if kwargs.get("stream"):
+            return self._astream(method, kwargs)
+        self.breaker.allow()
+        intentados: Set[str] = set()
+        while True:
+            backend = self._acquire(intentados)
+            try:
+                result = await getattr(backend.async_client, method)(**kwargs)
+                self._mark_success(backend)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not _is_backend_error(e):
+                    self.breaker.record_success()
+                    raise
+                self._mark_failure(backend, e)
+                intentados.add(backend.host)
+                if len(intentados) >= len(self.backends):
+                    self.breaker.record_failure(e)
+                    raise
+                print(f"[WARNING] Ollama {backend.host} falló ({e}); reintentando en otro host")
+            finally:
+                self._release(backend)
+
+    async def _astream(self, method: str, kwargs: Dict[str, Any], exclude: Set[str] = frozenset(),
+                       on_host: Optional[Callable[[str], None]] = None, clients: Optional[Dict[str, Any]] = None):
+        self.breaker.allow()
+        intentados: Set[str] = set(exclude)
+        while True:
+            backend = self._acquire(intentados)
+            if on_host:
+                on_host(backend.host)
+            client = clients[backend.host] if clients else backend.async_client
+            recibido = False
+            try:
+                async for part in await getattr(client, method)(**kwargs):
+                    if not recibido:
+                        recibido = True
+                        self.breaker.record_success()
+                    yield part
+                self._mark_success(backend)
+                return
+            except Exception as e:
+                if not _is_backend_error(e):
+                    self.breaker.record_success()
+                    raise
+                self._mark_failure(backend, e)
+                intentados.add(backend.host)
+                if recibido or len(intentados) >= len(self.backends):
+                    self.breaker.record_failure(e)
+                    raise
+                print(f"[WARNING] Ollama {backend.host} falló ({e}); reintentando en otro host")
+            finally:
+                self._release(backend)
+
+    def astream(self, method: str, kwargs: Dict[str, Any], exclude: Set[str] = frozenset(),
+                on_host: Optional[Callable[[str], None]] = None, clients: Optional[Dict[str, Any]] = None):
+        """
+        Llamada async en streaming sin pasar por los hosts de exclude (ej: el que
+        ya atiende la misma petición); on_host recibe cada host elegido. clients
+        reemplaza los clientes async del pool (host -> cliente) cuando la llamada
+        corre en otro event loop (ej: loop_clients() en run_in_loop()).
+        """
+        kwargs.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
+        return self._astream(method, {**kwargs, "stream": True}, exclude, on_host, clients)
+
+    # ===== Streaming sync con plazo =====
+    def run_in_loop(self, coro):
+        """
+        Corre coro en el event loop propio del pool (un hilo aparte) y retorna
+        su concurrent.futures.Future. Ahí las llamadas son tareas async:
+        cancelarlas cierra su conexión al instante y Ollama deja de generar,
+        cosa que no se puede hacer con un hilo sync bloqueado en la lectura.
+        """
+        with self._lock:
+            if self._loop is None:
+                # Clientes propios: los de async_client() quedan atados al event loop de la API
+                self._loop_clients = {b.host: self.async_client_factory(b.host) for b in self.backends}
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="ollama-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def loop_clients(self) -> Dict[str, Any]:
+        """Clientes async por host (para astream) de las llamadas que corren en run_in_loop()"""
+        return self._loop_clients
+
+    def stream(self, method: str, kwargs: Dict[str, Any], deadline: Deadline) -> Iterator[Any]:
+        """
+        Llamada sync en streaming con plazo. La espera de cada fragmento, incluida
+        la del primero (carga del modelo y evaluación del prompt), se corta con
+        DeadlineExceeded al vencer deadline y la petición se cancela en Ollama;
+        con un cliente sync el único límite sería el timeout de lectura HTTP.
+        """
+        deadline.check()
+        salida: "queue.Queue" = queue.Queue()
+
+        async def consumir():
+            try:
+                async for part in self.astream(method, kwargs, clients=self.loop_clients()):
+                    salida.put((part, None))
+                salida.put((None, None))
+            except Exception as e:
+                salida.put((None, e))
+
+        tarea = self.run_in_loop(consumir())
+        try:
+            while True:
+                try:
+                    part, error = salida.get(timeout=deadline.remaining())
+                except queue.Empty:
+                    raise DeadlineExceeded(deadline.name, deadline.seconds)
+                if error is not None:
+                    raise error
+                if part is None:
+                    return
+                yield part
+        finally:
+            tarea.cancel()
+
+    def client(self) -> "PooledClient":
+        return PooledClient(self)
+
+    def async_client(self) -> "AsyncPooledClient":
+        return AsyncPooledClient(self)
+
+    # ===== Precarga de modelos =====
+    def preload(self, model: str, keep_alive=OLLAMA_KEEP_ALIVE) -> List[str]:
+        """
+        Carga el modelo en memoria en cada host sano (generate con prompt
+        vacío solo carga el modelo). Retorna los hosts donde quedó cargado.
+        """
+        cargados = []
+        for backend in [b for b in self.backends if b.healthy]:
+            try:
+                backend.client.generate(model=model, prompt="", keep_alive=keep_alive)
+                self._mark_success(backend)
+                cargados.append(backend.host)
+            except Exception as e:
+                if _is_backend_error(e):
+                    self._mark_failure(backend, e)
+                print(f"[WARNING] No se pudo precargar {model} en {backend.host}: {e}")
+        return cargados
+
+    # ===== Chequeos de salud =====
+    def probe_all(self):
+        """Consulta GET /api/tags en cada host; evicta o readmite según responda"""
+        for backend in self.backends:
+            try:
+                backend.probe_client.list()
+                self._mark_success(backend)
+                self.breaker.probe_succeeded()
+            except Exception as e:
+                self._mark_failure(backend, e)
+            finally:
+                backend.last_probe_at = time.time()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.probe_all()
+
+    def start_health_checks(self):
+        if self._health_thread is None or not self._health_thread.is_alive():
+            self._stop.clear()
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+
+    def healthy_hosts(self) -> List[str]:
+        with self._lock:
+            return [b.host for b in self.backends if b.healthy]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hosts": len(self.backends),
+                "healthy": sum(1 for b in self.backends if b.healthy),
+                "circuit": self.breaker.stats(),
+                "backends": [
+                    {
+                        "host": b.host,
+                        "healthy": b.healthy,
+                        "outstanding": b.outstanding,
+                        "total_requests": b.total_requests,
+                        "failures": b.failures,
+                        "consecutive_failures": b.consecutive_failures,
+                        "last_error": b.last_error,
+                        "last_probe_at": b.last_probe_at,
+                    }
+                    for b in self.backends
+                ],
+            }
+
+
+class PooledClient:
+    """Misma interfaz que ollama.Client, repartida entre los hosts del pool"""
+
+    def __init__(self, pool: OllamaPool):
+        self.pool = pool
+
+    def chat(self, **kwargs):
+        return self.pool._call("chat", kwargs)
+
+    def generate(self, **kwargs):
+        return self.pool._call("generate", kwargs)
+
+
+class AsyncPooledClient:
+    """Misma interfaz que ollama.AsyncClient, repartida entre los hosts del pool"""
+
+    def __init__(self, pool: OllamaPool):
+        self.pool = pool
+
+    async def chat(self, **kwargs):
+        return await self.pool._acall("chat", kwargs)
+
+    async def generate(self, **kwargs):
+        return await self.pool._acall("generate", kwargs)
+
+
+# Pool compartido por la API, el procesador de CVs y llm_utils
+ollama_pool = OllamaPool(hosts_from_env(), breaker=ollama_breaker)
@@ -0,0 +1,97 @@
+import hashlib
+import io
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import pdfplumber
+
+from text_normalizer import normalize_cv_pages, TEXT_NORMALIZE_ENABLED
+
+
+# Funciones de extracción sin dependencias de la app, para poder ejecutarlas
+# en un pool de procesos (deben ser importables y serializables).
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "20"))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class PDFLimitError(Exception):
+    """El PDF supera el tamaño o la cantidad de páginas permitidas"""
+
+
+def _extract_pdf_pages(source, max_pages: Optional[int] = None) -> List[str]:
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with pdfplumber.open(source) as pdf:
+        if max_pages is not None and len(pdf.pages) > max_pages:
+            raise PDFLimitError(f"El PDF tiene {len(pdf.pages)} páginas (máximo {max_pages})")
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def extract_pdf_text_report(source, max_pages: Optional[int] = None,
+                            normalize: bool = TEXT_NORMALIZE_ENABLED) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Extrae el texto de un PDF y lo normaliza (ver text_normalizer) antes de
+    que llegue al LLM. Retorna (texto, reporte de la normalización o None)
+    """
+    pages = _extract_pdf_pages(source, max_pages)
+    if not normalize:
+        return "\n".join(pages).strip(), None
+    return normalize_cv_pages(pages)
+
+
+def extract_pdf_text(source, max_pages: Optional[int] = None) -> str:
+    """
+    Extrae el texto de un PDF. Acepta una ruta, un objeto tipo archivo
+    (ej: el SpooledTemporaryFile del upload) o bytes en memoria
+    """
+    return extract_pdf_text_report(source, max_pages)[0]
+
+
+def extract_pdf_text_safe(source, max_pages: Optional[int] = MAX_PDF_PAGES):
+    """
+    Igual que extract_pdf_text_report pero retorna (texto, error, reporte)
+    en lugar de lanzar
+    """
+    try:
+        text, report = extract_pdf_text_report(source, max_pages=max_pages)
+        return text, None, report
+    except PDFLimitError as e:
+        return "", str(e), None
+    except Exception as e:
+        return "", f"Error al procesar PDF: {str(e)}", None
+
+
+def count_pdf_pages(source) -> int:
+    """Cantidad de páginas sin extraer texto"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with pdfplumber.open(source) as pdf:
+        return len(pdf.pages)
+
+
+async def read_upload_limited(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[bytes, str]:
+    """
+    Lee un UploadFile por partes a un buffer en memoria, calculando el SHA-256
+    al vuelo. Corta apenas se supera max_bytes, sin leer el resto del archivo.
+    Retorna (contenido, sha256).
+    """
+    size = getattr(upload, "size", None)
+    if size is not None and size > max_bytes:
+        raise PDFLimitError(f"{upload.filename} pesa {size} bytes (máximo {max_bytes})")
+
+    buffer = io.BytesIO()
+    digest = hashlib.sha256()
+    total = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise PDFLimitError(f"{upload.filename} supera el máximo de {max_bytes} bytes")
+        digest.update(chunk)
+        buffer.write(chunk)
+
+    return buffer.getvalue(), digest.hexdigest()
@@ -0,0 +1,89 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", reloj.monotonic)
+    return reloj
+
+
+def abrir(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure(ConnectionError("sin conexión"))
+
+
+def test_se_abre_tras_el_umbral_de_fallos(reloj):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=30)
+    breaker.record_failure(ConnectionError("x"))
+    breaker.record_failure(ConnectionError("x"))
+    breaker.allow()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure(ConnectionError("x"))
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.allow()
+    assert exc.value.retry_in == 30
+    assert breaker.stats()["times_opened"] == 1
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_un_exito_reinicia_el_conteo(reloj):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    breaker.record_failure(ConnectionError("x"))
+    breaker.record_success()
+    breaker.record_failure(ConnectionError("x"))
+    assert breaker.state == CLOSED
+
+
+def test_tras_el_reset_deja_pasar_una_sola_llamada_de_prueba(reloj):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    abrir(breaker)
+    reloj.ahora += 31
+    assert not breaker.is_open()
+
+    breaker.allow()
+    # Mientras la prueba no se resuelve, el resto sigue rechazado
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_prueba_fallida_vuelve_a_abrir(reloj):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    abrir(breaker)
+    reloj.ahora += 31
+    breaker.allow()
+    breaker.record_failure(ConnectionError("sigue caído"))
+    assert breaker.state == OPEN
+    assert breaker.opened_at == reloj.ahora
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    # Seguía abierto: no cuenta como una nueva apertura
+    assert breaker.stats()["times_opened"] == 1
+
+
+def test_chequeo_de_salud_adelanta_la_prueba(reloj):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    abrir(breaker)
+    breaker.probe_succeeded()
+    assert breaker.state == HALF_OPEN
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
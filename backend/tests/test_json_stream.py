@@ -0,0 +1,102 @@
+import pytest
+
+from json_stream import IncrementalJSONObjectParser, JSONStreamError, validate_schema
+
+SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["nombre", "habilidades"],
+    "properties": {
+        "nombre": {"type": "string"},
+        "habilidades": {"type": "array", "items": {"type": "string"}},
+        "score": {"type": "integer"},
+    },
+}
+
+
+def feed_all(parser, chunks):
+    secciones = []
+    for chunk in chunks:
+        secciones.extend(parser.feed(chunk))
+    return secciones
+
+
+def test_secciones_se_emiten_al_completarse():
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    assert parser.feed('{"nombre": "An') == []
+    assert parser.feed('a", "habilidades": ["Python", "SQL"]') == [("nombre", "Ana")]
+    assert parser.feed(', "score": 8}') == [("habilidades", ["Python", "SQL"]), ("score", 8)]
+    assert parser.done
+    assert parser.close() == {"nombre": "Ana", "habilidades": ["Python", "SQL"], "score": 8}
+    assert parser.missing_sections() == []
+
+
+def test_caracter_por_caracter_con_comas_y_llaves_en_strings():
+    texto = '{"nombre": "Pérez, {Juan} \\"JP\\"", "habilidades": ["C, C++", "[Go]"]}'
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    feed_all(parser, list(texto))
+    assert parser.close() == {"nombre": 'Pérez, {Juan} "JP"', "habilidades": ["C, C++", "[Go]"]}
+    assert parser.chunks_at_done == len(texto)
+
+
+def test_texto_antes_del_objeto_se_tolera_hasta_el_limite():
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    feed_all(parser, ['Aquí está el JSON:\n', '{"nombre": "Ana", "habilidades": []}'])
+    assert parser.close()["nombre"] == "Ana"
+
+    parser = IncrementalJSONObjectParser(SCHEMA, max_prefix_chars=5)
+    with pytest.raises(JSONStreamError):
+        parser.feed("no hay ningún objeto")
+
+
+def test_seccion_invalida_falla_al_cerrarse():
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    assert parser.feed('{"nombre": "Ana", ') == [("nombre", "Ana")]
+    with pytest.raises(JSONStreamError, match="habilidades"):
+        parser.feed('"habilidades": "Python", ')
+    assert parser.sections == {"nombre": "Ana"}
+
+
+def test_clave_desconocida_falla_al_terminar_su_nombre():
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    with pytest.raises(JSONStreamError, match="inesperada"):
+        parser.feed('{"foto": ')
+
+
+def test_seccion_mal_formada_y_vacia():
+    with pytest.raises(JSONStreamError, match="mal formada"):
+        IncrementalJSONObjectParser(SCHEMA).feed('{"nombre": Ana, ')
+    with pytest.raises(JSONStreamError, match="vacía"):
+        IncrementalJSONObjectParser(SCHEMA).feed('{"nombre": "Ana",, ')
+    # La coma final antes de "}" se tolera
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    parser.feed('{"nombre": "Ana", "habilidades": [],}')
+    assert parser.done
+
+
+def test_close_con_objeto_incompleto():
+    with pytest.raises(JSONStreamError, match="no contiene"):
+        IncrementalJSONObjectParser(SCHEMA).close()
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    parser.feed('{"nombre": "Ana", "habilidades": ["Py')
+    with pytest.raises(JSONStreamError, match="habilidades"):
+        parser.close()
+    assert parser.missing_sections() == ["habilidades"]
+
+
+def test_lo_que_llega_despues_del_objeto_se_ignora():
+    parser = IncrementalJSONObjectParser(SCHEMA)
+    parser.feed('{"nombre": "Ana", "habilidades": []}')
+    assert parser.feed('{"otro": 1}') == []
+    assert parser.chunks_at_done == 1
+
+
+def test_validate_schema():
+    assert validate_schema({"nombre": "Ana", "habilidades": ["x"]}, SCHEMA) == []
+    assert validate_schema({"nombre": "Ana"}, SCHEMA) == ["$.habilidades: falta"]
+    assert validate_schema({"nombre": "Ana", "habilidades": [], "score": True}, SCHEMA) == [
+        "$.score: se esperaba integer, llegó bool"
+    ]
+    assert validate_schema(["a", 1], {"type": "array", "items": {"type": "string"}}) == [
+        "$[1]: se esperaba string, llegó int"
+    ]
@@ -0,0 +1,104 @@
+import pytest
+
+import llm_cache
+from llm_cache import LLMResponseCache, make_cache_key
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1_000_000.0
+
+    def time(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(llm_cache.time, "time", reloj.time)
+    return reloj
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def crear(**kwargs):
+        kwargs.setdefault("memory_items", 2)
+        kwargs.setdefault("max_bytes", 1024 * 1024)
+        kwargs.setdefault("ttl_seconds", 3600)
+        return LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), enabled=True, **kwargs)
+    return crear
+
+
+def test_make_cache_key_depende_de_modelo_prompt_y_opciones():
+    mensajes = [{"role": "user", "content": "hola"}]
+    clave = make_cache_key("llama3", mensajes, {"temperature": 0.1, "num_ctx": 2048})
+    assert clave == make_cache_key("llama3", mensajes, {"num_ctx": 2048, "temperature": 0.1})
+    assert clave != make_cache_key("mistral", mensajes, {"temperature": 0.1, "num_ctx": 2048})
+    assert clave != make_cache_key("llama3", mensajes, {"temperature": 0.2, "num_ctx": 2048})
+    assert clave != make_cache_key("llama3", [{"role": "user", "content": "hola!"}], {"temperature": 0.1, "num_ctx": 2048})
+
+
+def test_lru_en_memoria_y_respaldo_en_disco(make_cache, reloj):
+    cache = make_cache(memory_items=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    # "b" era la menos usada: sale de memoria pero sigue en disco
+    assert list(cache._memory) == ["a", "c"]
+    assert cache.get("b") == "B"
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["disk_hits"] == 1
+    assert stats["memory_entries"] == 2
+    assert stats["disk_entries"] == 3
+
+
+def test_persiste_entre_instancias(make_cache, reloj):
+    make_cache().set("a", "A", model="llama3")
+    cache = make_cache()
+    assert cache.get("a") == "A"
+    assert cache.get("x") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_vence_en_memoria_y_en_disco(make_cache, reloj):
+    cache = make_cache(ttl_seconds=60)
+    cache.set("a", "A")
+    reloj.ahora += 61
+    assert cache.get("a") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_set_borra_las_entradas_vencidas(make_cache, reloj):
+    cache = make_cache(ttl_seconds=60)
+    cache.set("a", "A")
+    reloj.ahora += 61
+    cache.set("b", "B")
+    assert cache.stats()["disk_entries"] == 1
+
+
+def test_desalojo_por_tamano_quita_las_menos_usadas(make_cache, reloj):
+    cache = make_cache(max_bytes=350)
+    for clave in "abc":
+        cache.set(clave, clave * 100)
+        reloj.ahora += 1
+    # "a" fue leída hace poco; "b" es la menos usada
+    cache.get("a")
+    reloj.ahora += 1
+    cache.set("d", "d" * 100)
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["disk_bytes"] <= 350 * 0.9
+    assert cache.get("b") is None
+    for clave in "acd":
+        assert cache.get(clave) == clave * 100
+
+
+def test_deshabilitada_no_guarda_nada(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), enabled=False)
+    cache.set("a", "A")
+    assert cache.get("a") is None
+    assert not (tmp_path / "cache.sqlite3").exists()
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PriorityScheduler, SchedulerSaturated, _Waiter
+
+
+def make_scheduler(max_concurrent=1, max_queue=2):
+    return PriorityScheduler("test", max_concurrent, max_queue, default_service_seconds=10)
+
+
+def test_admision_inmediata_hasta_max_concurrent():
+    scheduler = make_scheduler(max_concurrent=2)
+    assert scheduler._enter(_Waiter("a", PRIORITY_BATCH), bounded=True)
+    assert scheduler._enter(_Waiter("b", PRIORITY_BATCH), bounded=True)
+    assert not scheduler._enter(_Waiter("c", PRIORITY_BATCH), bounded=True)
+    stats = scheduler.stats()
+    assert stats["active"] == 2
+    assert stats["queued"] == 1
+
+
+def test_cola_llena_rechaza_con_retry_after():
+    scheduler = make_scheduler(max_concurrent=1, max_queue=1)
+    scheduler._enter(_Waiter("a", PRIORITY_BATCH), bounded=True)
+    scheduler._enter(_Waiter("b", PRIORITY_BATCH), bounded=True)
+    with pytest.raises(SchedulerSaturated) as exc:
+        scheduler._enter(_Waiter("c", PRIORITY_BATCH), bounded=True)
+    # 1 en cola + la rechazada, 10 s cada una, 1 slot
+    assert exc.value.retry_after == 20
+    # bounded=False (trabajo ya admitido) espera aunque la cola esté llena
+    assert not scheduler._enter(_Waiter("d", PRIORITY_BATCH), bounded=False)
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_ensure_capacity_cuenta_el_backlog():
+    scheduler = make_scheduler(max_queue=3)
+    scheduler.ensure_capacity("upload", backlog=2)
+    with pytest.raises(SchedulerSaturated):
+        scheduler.ensure_capacity("upload", backlog=3)
+
+
+def test_interactiva_antes_que_lote_y_fifo_dentro_de_la_prioridad():
+    scheduler = make_scheduler(max_queue=10)
+    scheduler._enter(_Waiter("activa", PRIORITY_BATCH), bounded=True)
+    lote1 = _Waiter("lote1", PRIORITY_BATCH)
+    lote2 = _Waiter("lote2", PRIORITY_BATCH)
+    interactiva = _Waiter("ask", PRIORITY_INTERACTIVE)
+    for w in (lote1, lote2, interactiva):
+        scheduler._enter(w, bounded=True)
+
+    orden = []
+    for _ in range(3):
+        scheduler._release()
+        despierta = next(w for w in (lote1, lote2, interactiva) if w.event.is_set() and w not in orden)
+        orden.append(despierta)
+    assert orden == [interactiva, lote1, lote2]
+
+
+def test_envejecimiento_adelanta_al_lote_que_espera(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "SCHEDULER_AGING_SECONDS", 30)
+    scheduler = make_scheduler(max_queue=10)
+    scheduler._enter(_Waiter("activa", PRIORITY_BATCH), bounded=True)
+    lote = _Waiter("lote", PRIORITY_BATCH)
+    interactiva = _Waiter("ask", PRIORITY_INTERACTIVE)
+    # El lote lleva más de un escalón de envejecimiento en cola
+    lote.enqueued_at -= 45
+    scheduler._enter(lote, bounded=True)
+    scheduler._enter(interactiva, bounded=True)
+
+    scheduler._release()
+    assert lote.event.is_set()
+    assert not interactiva.event.is_set()
+
+
+def test_slot_sync_libera_y_pasa_el_slot():
+    scheduler = make_scheduler(max_concurrent=1)
+    admitido = threading.Event()
+
+    def segundo():
+        with scheduler.slot("b"):
+            admitido.set()
+
+    with scheduler.slot("a"):
+        hilo = threading.Thread(target=segundo)
+        hilo.start()
+        while scheduler.stats()["queued"] == 0:
+            time.sleep(0.01)
+        assert not admitido.is_set()
+    hilo.join(2)
+    assert admitido.is_set()
+    stats = scheduler.stats()
+    assert stats["active"] == 0
+    assert stats["admitted"] == 2
+
+
+def test_aslot_cancelado_sale_de_la_cola():
+    async def escenario():
+        scheduler = make_scheduler(max_concurrent=1)
+        async with scheduler.aslot("a"):
+            async def esperar():
+                async with scheduler.aslot("b"):
+                    pass
+            tarea = asyncio.ensure_future(esperar())
+            await asyncio.sleep(0.01)
+            assert scheduler.stats()["queued"] == 1
+            tarea.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarea
+            assert scheduler.stats()["queued"] == 0
+        return scheduler.stats()
+
+    stats = asyncio.run(escenario())
+    assert stats["active"] == 0
+
+
+def test_try_slot_no_se_encola():
+    scheduler = make_scheduler(max_concurrent=1)
+    with scheduler.try_slot("hedge") as libre:
+        assert libre
+        with scheduler.try_slot("hedge") as otro:
+            assert not otro
+        assert scheduler.stats()["queued"] == 0
+    assert scheduler.stats()["active"] == 0
+
+    # Con alguien esperando tampoco toma el slot, aunque haya uno libre
+    scheduler = make_scheduler(max_concurrent=2)
+    scheduler._enter(_Waiter("a", PRIORITY_BATCH), bounded=True)
+    scheduler._queue.append(_Waiter("b", PRIORITY_BATCH))
+    with scheduler.try_slot("hedge") as libre:
+        assert not libre
@@ -0,0 +1,59 @@
+from text_normalizer import normalize_cv_pages
+
+
+def test_quita_numeros_de_pagina_y_pie_repetido():
+    pages = [
+        "Ana Pérez\nana@mail.com\nPerfil\nExperiencia\nDesarrolladora Python\nBackend\nCurriculum Ana Pérez - confidencial\nPágina 1 de 3",
+        "Proyectos\nAPI de pagos\nPagos en línea\nMigración a la nube\nCurriculum Ana Pérez - confidencial\nPágina 2 de 3",
+        "Educación\nIngeniería\nUniversidad\nCursos\nCurriculum Ana Pérez - confidencial\nPágina 3 de 3",
+    ]
+    texto, reporte = normalize_cv_pages(pages)
+    assert "Página" not in texto
+    # Se conserva la primera aparición del pie
+    assert texto.count("Curriculum Ana Pérez - confidencial") == 1
+    assert reporte["page_numbers_removed"] == 3
+    assert reporte["repeated_lines_removed"] == 2
+    for linea in ("Experiencia", "API de pagos", "Ingeniería"):
+        assert linea in texto
+
+
+def test_el_cuerpo_de_la_pagina_no_se_toca():
+    cuerpo = "Idiomas\nInglés: 8/10\nNivel\n3\nExperiencia\n2015 - 2017\nAnalista"
+    pages = [f"Encabezado\nSección uno\nIntro\n{cuerpo}\nCierre\nFin\nOtro", f"Encabezado\nSección dos\nIntro\n{cuerpo}\nCierre\nFin\nOtro"]
+    texto, reporte = normalize_cv_pages(pages)
+    assert texto.count("8/10") == 2
+    assert texto.count("\n3\n") == 2
+    assert texto.count("2015 - 2017") == 2
+    assert reporte["page_numbers_removed"] == 0
+
+
+def test_fechas_en_el_borde_no_son_encabezados():
+    pages = ["2015 - 2017\nAnalista en Acme\nReportes", "2015 - 2017\nAnalista en Beta\nAuditoría"]
+    texto, reporte = normalize_cv_pages(pages)
+    assert texto.count("2015 - 2017") == 2
+    assert reporte["repeated_lines_removed"] == 0
+
+
+def test_linea_repetida_en_minoria_de_paginas_se_conserva():
+    pages = [
+        "Resumen\nTexto uno\nNota al pie",
+        "Experiencia\nTexto dos\nNota al pie",
+        "Educación\nTexto tres\nOtra cosa",
+        "Cursos\nTexto cuatro\nMás cosas",
+    ]
+    texto, reporte = normalize_cv_pages(pages)
+    assert texto.count("Nota al pie") == 2
+    assert reporte["repeated_lines_removed"] == 0
+
+
+def test_una_sola_pagina_no_busca_repetidos():
+    texto, reporte = normalize_cv_pages(["Ana\nAna\nAna"])
+    assert texto == "Ana\nAna\nAna"
+    assert reporte["repeated_lines_removed"] == 0
+
+
+def test_limpieza_de_lineas():
+    texto, reporte = normalize_cv_pages(["•  Desarrollo   de  micro-\nservicios(cid:12)\n\n\n\n● Docker y K8s"])
+    assert texto == "- Desarrollo de microservicios\n\n- Docker y K8s"
+    assert reporte["hyphenations_joined"] == 1
+    assert reporte["chars_after"] < reporte["chars_before"]
@@ -0,0 +1,55 @@
+import pytest
+
+from token_budget import NUM_CTX_BUCKETS, TOKEN_SAFETY_MARGIN, TokenBudget
+
+
+@pytest.fixture
+def budget():
+    return TokenBudget(chars_per_token=4.0)
+
+
+def test_buckets_por_defecto():
+    assert NUM_CTX_BUCKETS == [2048, 4096, 8192]
+
+
+@pytest.mark.parametrize("prompt_tokens, num_predict, esperado", [
+    (100, 512, 2048),
+    (1000, 800, 2048),
+    (1000, 1000, 4096),
+    (3000, 512, 4096),
+    (4000, 1024, 8192),
+    (20000, 1024, 8192),
+])
+def test_size_context_elige_el_menor_bucket_que_alcanza(budget, prompt_tokens, num_predict, esperado):
+    assert budget.size_context(prompt_tokens, num_predict) == esperado
+
+
+def test_size_context_respeta_max_ctx(budget):
+    assert budget.size_context(3000, 512, max_ctx=2048) == 2048
+    assert budget.size_context(100, 512, max_ctx=4096) == 2048
+
+
+def test_plan_recorta_num_predict_antes_que_el_prompt(budget):
+    mensajes = [{"role": "user", "content": "x" * 6000 * 4}]
+    plan = budget.plan(mensajes, num_predict=2048)
+    prompt = plan["estimated_prompt_tokens"]
+    assert prompt == 6001 + 4
+    assert plan["num_ctx"] == 8192
+    assert plan["num_predict"] == 8192 - int(prompt * TOKEN_SAFETY_MARGIN)
+
+
+def test_plan_deja_al_menos_256_de_salida(budget):
+    mensajes = [{"role": "user", "content": "x" * 30000 * 4}]
+    plan = budget.plan(mensajes, num_predict=1024)
+    assert plan["num_ctx"] == 8192
+    assert plan["num_predict"] == 256
+
+
+def test_record_recalibra_chars_per_token(budget, capsys):
+    plan = {"estimated_prompt_tokens": 100, "num_predict": 512, "num_ctx": 2048}
+    budget.record("analysis", plan, chars=600, response={"prompt_eval_count": 200, "eval_count": 50})
+    assert budget.chars_per_token == pytest.approx(0.9 * 4.0 + 0.1 * 3.0)
+    assert budget.stats()["per_call_site"]["analysis"]["calls"] == 1
+    # Sin prompt_eval_count (prompt en la caché de Ollama) no se registra
+    budget.record("analysis", plan, chars=600, response={"eval_count": 50})
+    assert budget.stats()["per_call_site"]["analysis"]["calls"] == 1
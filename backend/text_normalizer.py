@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from token_budget import token_budget
+
+
+# Limpieza del texto que devuelve pdfplumber antes de mandarlo al LLM: cada
+# encabezado, número de página o espacio de más es prompt que Ollama evalúa.
+# Las funciones de normalización son puras, así que corren en el pool de
+# procesos junto con la extracción; el reporte se registra en el proceso principal.
+
+TEXT_NORMALIZE_ENABLED = os.getenv("TEXT_NORMALIZE_ENABLED", "true").lower() == "true"
+# Líneas del borde de cada página donde se buscan encabezados y pies repetidos
+HEADER_FOOTER_LINES = int(os.getenv("HEADER_FOOTER_LINES", "3"))
+
+_PAGE_NUMBER = re.compile(
+    r"^[-–—\s]*(p[aá]g(ina)?\.?|page)?\s*\d{1,3}(\s*(/|de|of)\s*\d{1,3})?[-–—\s]*$", re.IGNORECASE
+)
+_CID = re.compile(r"\(cid:\d+\)")
+_BULLET = re.compile(r"^[•●○◦▪■□►▶✓✔➢➤*·]+\s*")
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200b\u202f\u3000]+")
+_HYPHENATED = re.compile(r"(\w)[-\u00ad]\n([a-záéíóúñü])")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _clean_line(line: str) -> str:
+    line = _CID.sub("", line).replace("\u00ad", "")
+    line = _SPACES.sub(" ", line).strip()
+    return _BULLET.sub("- ", line)
+
+
+def _line_key(line: str) -> Optional[str]:
+    """
+    Clave para comparar encabezados/pies entre páginas (ignora números, ej: "Página 2").
+    None si la línea no tiene letras: fechas como "2015 - 2017" no son encabezados.
+    """
+    if not re.search(r"[^\W\d_]", line):
+        return None
+    return re.sub(r"\d+", "#", line.lower())
+
+
+def _border_positions(pagina: List[str]) -> Dict[int, Tuple[str, int]]:
+    """Índice -> posición ("top"/"bottom", n) de las primeras y últimas HEADER_FOOTER_LINES líneas no vacías"""
+    no_vacias = [i for i, l in enumerate(pagina) if l]
+    posiciones = {}
+    for n, i in enumerate(reversed(no_vacias[-HEADER_FOOTER_LINES:])):
+        posiciones[i] = ("bottom", n)
+    for n, i in enumerate(no_vacias[:HEADER_FOOTER_LINES]):
+        posiciones[i] = ("top", n)
+    return posiciones
+
+
+def normalize_cv_pages(pages: List[str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Normaliza el texto de un CV página por página. Retorna (texto, reporte):
+    - quita artefactos "(cid:NN)" de fuentes sin mapear
+    - en los bordes de cada página (primeras/últimas HEADER_FOOTER_LINES líneas)
+      quita números de página y los encabezados y pies que se repiten en la misma
+      posición en la mayoría de las páginas (se conserva la primera aparición,
+      que suele traer el nombre o contacto). El cuerpo de la página no se toca.
+    - une palabras cortadas con guion al final de línea
+    - unifica viñetas y colapsa espacios y líneas en blanco
+    """
+    paginas = [[_clean_line(l) for l in (p or "").splitlines()] for p in pages]
+    lineas_antes = sum(len(p) for p in paginas)
+    bordes = [_border_positions(p) for p in paginas]
+
+    # Encabezados/pies: misma clave en la misma posición del borde en la mayoría de las páginas
+    repetidas = set()
+    if len(paginas) > 1:
+        conteo = Counter()
+        for p, posiciones in zip(paginas, bordes):
+            conteo.update({(pos, _line_key(p[i])) for i, pos in posiciones.items() if _line_key(p[i])})
+        minimo = max(2, len(paginas) // 2 + 1)
+        repetidas = {clave for clave, n in conteo.items() if n >= minimo}
+
+    vistas = set()
+    numeros_pagina = repetidas_quitadas = 0
+    salida = []
+    for p, posiciones in zip(paginas, bordes):
+        for i, linea in enumerate(p):
+            if i in posiciones:
+                if _PAGE_NUMBER.match(linea):
+                    numeros_pagina += 1
+                    continue
+                clave = (posiciones[i], _line_key(linea))
+                if clave in repetidas:
+                    if clave in vistas:
+                        repetidas_quitadas += 1
+                        continue
+                    vistas.add(clave)
+            salida.append(linea)
+        salida.append("")
+
+    texto = "\n".join(salida)
+    texto, guiones = _HYPHENATED.subn(r"\1\2", texto)
+    texto = _BLANK_LINES.sub("\n\n", texto).strip()
+
+    return texto, {
+        "pages": len(pages),
+        "chars_before": sum(len(p or "") for p in pages),
+        "chars_after": len(texto),
+        "lines_before": lineas_antes,
+        "lines_after": texto.count("\n") + 1 if texto else 0,
+        "page_numbers_removed": numeros_pagina,
+        "repeated_lines_removed": repetidas_quitadas,
+        "hyphenations_joined": guiones,
+    }
+
+
+class TextNormalizationStats:
+    """Reducción de tokens de prompt por CV gracias a la normalización"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cvs = 0
+        self.chars_before = 0
+        self.chars_after = 0
+        self.page_numbers_removed = 0
+        self.repeated_lines_removed = 0
+        self.hyphenations_joined = 0
+
+    def record(self, report: Optional[Dict[str, Any]], cv_id: Optional[int] = None):
+        if not report:
+            return
+        antes = int(report["chars_before"] / token_budget.chars_per_token)
+        despues = int(report["chars_after"] / token_budget.chars_per_token)
+        if antes:
+            print(
+                f"[INFO] Texto normalizado (CV {cv_id}): ~{antes} -> ~{despues} tokens "
+                f"({(antes - despues) * 100 / antes:.0f}% menos), {report['repeated_lines_removed']} líneas repetidas, "
+                f"{report['page_numbers_removed']} números de página"
+            )
+        with self._lock:
+            self.cvs += 1
+            self.chars_before += report["chars_before"]
+            self.chars_after += report["chars_after"]
+            self.page_numbers_removed += report["page_numbers_removed"]
+            self.repeated_lines_removed += report["repeated_lines_removed"]
+            self.hyphenations_joined += report["hyphenations_joined"]
+
+    def stats(self, prompt_tokens_per_second: Optional[float] = None) -> Dict[str, Any]:
+        """prompt_tokens_per_second (de llm_telemetry) permite estimar el prompt-eval ahorrado"""
+        with self._lock:
+            ahorrados = int((self.chars_before - self.chars_after) / token_budget.chars_per_token)
+            return {
+                "enabled": TEXT_NORMALIZE_ENABLED,
+                "cvs": self.cvs,
+                "chars_before": self.chars_before,
+                "chars_after": self.chars_after,
+                "reduction": round(1 - self.chars_after / self.chars_before, 3) if self.chars_before else None,
+                "estimated_tokens_saved": ahorrados,
+                "avg_tokens_saved_per_cv": round(ahorrados / self.cvs, 1) if self.cvs else None,
+                "estimated_prompt_eval_seconds_saved": (
+                    round(ahorrados / prompt_tokens_per_second, 1) if prompt_tokens_per_second else None
+                ),
+                "page_numbers_removed": self.page_numbers_removed,
+                "repeated_lines_removed": self.repeated_lines_removed,
+                "hyphenations_joined": self.hyphenations_joined,
+            }
+
+
+# Instancia compartida
+text_normalization_stats = TextNormalizationStats()
@@ -0,0 +1,126 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Caracteres por token de partida (texto en español con llama3); se recalibra
+# con el prompt_eval_count real que devuelve Ollama
+CHARS_PER_TOKEN = float(os.getenv("TOKEN_CHARS_PER_TOKEN", "3.5"))
+# num_ctx se redondea a estos tamaños: cada valor distinto obliga a Ollama a
+# recrear el KV cache, así que conviene pocos escalones
+NUM_CTX_BUCKETS = sorted(int(x) for x in os.getenv("NUM_CTX_BUCKETS", "2048,4096,8192").split(","))
+MAX_NUM_CTX = NUM_CTX_BUCKETS[-1]
+# Margen sobre la estimación para no truncar el prompt si se queda corta
+TOKEN_SAFETY_MARGIN = float(os.getenv("TOKEN_SAFETY_MARGIN", "1.15"))
+
+
+class TokenBudget:
+    """
+    Estima tokens de prompts y dimensiona num_ctx / num_predict por llamada.
+    Compara las estimaciones con prompt_eval_count / eval_count reales para
+    ajustar la relación caracteres/token y para registrar los desvíos.
+    """
+
+    def __init__(self, chars_per_token: float = CHARS_PER_TOKEN):
+        self.chars_per_token = chars_per_token
+        self._lock = threading.Lock()
+        self._per_site: Dict[str, Dict[str, Any]] = {}
+
+    # ===== Estimación =====
+    def estimate_tokens(self, text: str) -> int:
+        if not text:
+            return 0
+        return int(len(text) / self.chars_per_token) + 1
+
+    def estimate_messages(self, messages: List[Dict[str, Any]]) -> int:
+        # ~4 tokens de plantilla por mensaje (rol y separadores)
+        return sum(self.estimate_tokens(m.get("content", "")) + 4 for m in messages)
+
+    def size_context(self, prompt_tokens: int, num_predict: int, max_ctx: int = MAX_NUM_CTX) -> int:
+        """Menor escalón de num_ctx que entra prompt + salida (con margen), sin pasar de max_ctx"""
+        necesario = int(prompt_tokens * TOKEN_SAFETY_MARGIN) + num_predict
+        for bucket in NUM_CTX_BUCKETS:
+            if bucket >= necesario and bucket <= max_ctx:
+                return bucket
+        return max_ctx
+
+    def plan(self, messages: List[Dict[str, Any]], num_predict: int, max_ctx: int = MAX_NUM_CTX) -> Dict[str, int]:
+        """
+        num_ctx y num_predict para una llamada. Si el prompt no deja lugar a
+        toda la salida pedida, se recorta num_predict antes que truncar el prompt.
+        """
+        prompt_tokens = self.estimate_messages(messages)
+        num_ctx = self.size_context(prompt_tokens, num_predict, max_ctx)
+        disponible = num_ctx - int(prompt_tokens * TOKEN_SAFETY_MARGIN)
+        if disponible < num_predict:
+            num_predict = max(256, disponible)
+        return {"num_ctx": num_ctx, "num_predict": num_predict, "estimated_prompt_tokens": prompt_tokens}
+
+    # ===== Medición =====
+    def record(self, call_site: str, plan: Dict[str, int], chars: int, response: Any):
+        """
+        Registra estimado vs real a partir de la respuesta final de Ollama
+        (la que trae prompt_eval_count / eval_count) y recalibra chars_per_token.
+        """
+        if response is None:
+            return
+        prompt_real = response.get("prompt_eval_count")
+        salida_real = response.get("eval_count")
+        if not prompt_real:
+            # Ollama omite prompt_eval_count si el prompt salió de su propia caché
+            return
+
+        estimado = plan["estimated_prompt_tokens"]
+        error = (estimado - prompt_real) * 100 / prompt_real
+        print(
+            f"[INFO] Tokens {call_site}: prompt estimado {estimado} / real {prompt_real} ({error:+.0f}%), "
+            f"salida {salida_real}/{plan['num_predict']}, num_ctx {plan['num_ctx']}"
+        )
+        if prompt_real + (salida_real or 0) >= plan["num_ctx"]:
+            print(f"[WARNING] {call_site}: se llenó el contexto ({plan['num_ctx']}), la respuesta pudo quedar truncada")
+        elif salida_real and salida_real >= plan["num_predict"]:
+            print(f"[WARNING] {call_site}: la salida alcanzó num_predict ({plan['num_predict']})")
+
+        with self._lock:
+            # Media móvil de la relación caracteres/token observada
+            if chars > 0:
+                self.chars_per_token = 0.9 * self.chars_per_token + 0.1 * (chars / prompt_real)
+            site = self._per_site.setdefault(call_site, {
+                "calls": 0, "estimated_prompt_tokens": 0, "prompt_eval_count": 0,
+                "eval_count": 0, "num_predict": 0, "num_ctx": 0
+            })
+            site["calls"] += 1
+            site["estimated_prompt_tokens"] += estimado
+            site["prompt_eval_count"] += prompt_real
+            site["eval_count"] += salida_real or 0
+            site["num_predict"] += plan["num_predict"]
+            site["num_ctx"] += plan["num_ctx"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "chars_per_token": round(self.chars_per_token, 3),
+                "num_ctx_buckets": NUM_CTX_BUCKETS,
+                "per_call_site": {
+                    nombre: {
+                        "calls": s["calls"],
+                        "avg_estimated_prompt_tokens": round(s["estimated_prompt_tokens"] / s["calls"], 1),
+                        "avg_prompt_eval_count": round(s["prompt_eval_count"] / s["calls"], 1),
+                        "avg_eval_count": round(s["eval_count"] / s["calls"], 1),
+                        "avg_num_predict": round(s["num_predict"] / s["calls"], 1),
+                        "avg_num_ctx": round(s["num_ctx"] / s["calls"], 1),
+                    }
+                    for nombre, s in self._per_site.items()
+                },
+            }
+
+
+def messages_chars(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(m.get("content", "")) for m in messages)
+
+
+# Instancia compartida
+token_budget = TokenBudget()
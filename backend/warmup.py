@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from model_cascade import CASCADE_ENABLED, CASCADE_SMALL_MODEL
+
+load_dotenv()
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+# Modelos de Ollama a precargar (los de OllamaCVProcessor y /ask; con la
+# cascada activa también el modelo chico, que hace la primera pasada de cada CV)
+_default_models = f"llama3,{CASCADE_SMALL_MODEL}" if CASCADE_ENABLED else "llama3"
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", _default_models).split(",") if m.strip()]
+# Si Ollama no responde al arrancar, reintentar cada tantos segundos
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+
+
+class ModelWarmup:
+    """
+    Calentamiento al arranque: precarga los modelos de Ollama (con el
+    keep_alive del pool) y hace un encode de prueba con SentenceTransformer
+    para pagar la inicialización de torch antes de la primera petición.
+    Corre en un hilo aparte; mientras no termine, is_ready() es False y
+    /health responde 503.
+    """
+
+    def __init__(
+        self,
+        pool,
+        encode: Callable[[List[str]], Any],
+        models: List[str] = WARMUP_MODELS,
+        retry_seconds: float = WARMUP_RETRY_SECONDS
+    ):
+        self.pool = pool
+        self.encode = encode
+        self.models = models
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._steps: Dict[str, Dict[str, Any]] = {}
+        self._ready = False
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+
+    def _set_step(self, nombre: str, ready: bool, seconds: float, error: Optional[str] = None, **extra):
+        with self._lock:
+            self._steps[nombre] = {"ready": ready, "seconds": round(seconds, 3), "error": error, **extra}
+
+    def _step_ready(self, nombre: str) -> bool:
+        with self._lock:
+            return self._steps.get(nombre, {}).get("ready", False)
+
+    def _warm_embeddings(self):
+        inicio = time.perf_counter()
+        try:
+            self.encode(["calentamiento del modelo de embeddings"])
+            self._set_step("embeddings", True, time.perf_counter() - inicio)
+        except Exception as e:
+            self._set_step("embeddings", False, time.perf_counter() - inicio, str(e)[:200])
+            print(f"[ERROR] Falló el encode de calentamiento: {e}")
+
+    def _warm_model(self, model: str):
+        inicio = time.perf_counter()
+        hosts = self.pool.preload(model)
+        segundos = time.perf_counter() - inicio
+        if hosts:
+            self._set_step(f"ollama:{model}", True, segundos, hosts=hosts)
+            print(f"[INFO] {model} precargado en {len(hosts)} host(s) en {segundos:.1f}s")
+        else:
+            self._set_step(f"ollama:{model}", False, segundos, "ningún host pudo cargar el modelo")
+
+    def run(self):
+        """Ejecuta los pasos pendientes hasta que todos estén listos (o se detenga)"""
+        self.started_at = time.time()
+        while not self._stop.is_set():
+            if not self._step_ready("embeddings"):
+                self._warm_embeddings()
+            for model in self.models:
+                if not self._step_ready(f"ollama:{model}"):
+                    self._warm_model(model)
+
+            with self._lock:
+                listo = all(s["ready"] for s in self._steps.values())
+                if listo:
+                    self._ready = True
+                    self.ready_at = time.time()
+            if listo:
+                print(f"[SUCCESS] Calentamiento completo en {self.ready_at - self.started_at:.1f}s")
+                return
+            print(f"[WARNING] Calentamiento incompleto; reintentando en {self.retry_seconds:.0f}s")
+            self._stop.wait(self.retry_seconds)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return self._ready
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self._ready,
+                "started_at": self.started_at,
+                "ready_at": self.ready_at,
+                "steps": dict(self._steps),
+            }
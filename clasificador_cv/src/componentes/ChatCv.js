@@ -132,6 +132,34 @@ ${busqueda ? `Descripción adicional: ${busqueda}` : ""}
     }
   };
 
+  // CONSULTA CON LLM EN STREAMING (Server-Sent Events de /ask/stream)
+  const consultarLLMStream = (chatParams) =>
+    new Promise((resolve, reject) => {
+      const source = new EventSource(
+        `http://localhost:8000/ask/stream?${chatParams}`
+      );
+      let texto = "";
+
+      source.addEventListener("token", (event) => {
+        texto += JSON.parse(event.data).text;
+        setChatResponse(texto);
+      });
+
+      source.addEventListener("done", () => {
+        source.close();
+        resolve(texto);
+      });
+
+      source.addEventListener("error", (event) => {
+        source.close();
+        // Los errores del servidor traen detalle; los de conexión (ej: 429) no
+        const detalle = event.data
+          ? JSON.parse(event.data).detail
+          : "no se pudo conectar con el servidor (puede estar saturado)";
+        reject(new Error(detalle));
+      });
+    });
+
   // CONSULTA CON LLM - MODIFICADA para buscar candidatos también
   const consultarLLM = async (texto) => {
     try {
@@ -154,19 +182,13 @@ ${busqueda ? `Descripción adicional: ${busqueda}` : ""}
         }
       }
 
-      const chatResponse = await fetch(
-        `http://localhost:8000/ask?${chatParams}`
-      );
-
-      if (!chatResponse.ok) {
-        throw new Error(
-          `Error ${chatResponse.status}: ${await chatResponse.text()}`
-        );
+      // La respuesta llega por SSE: se va mostrando a medida que el modelo la genera
+      setChatResponse("");
+      const respuesta = await consultarLLMStream(chatParams);
+      if (!respuesta.trim()) {
+        setChatResponse("No se recibió respuesta del modelo.");
       }
 
-      const chatData = await chatResponse.json();
-      setChatResponse(chatData.answer || "No se recibió respuesta del modelo.");
-
       // Ahora también buscamos candidatos relacionados
       const searchParams = new URLSearchParams({
         query: texto,
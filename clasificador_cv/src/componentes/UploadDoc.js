@@ -10,6 +10,7 @@ function UploadDoc() {
 
   const fileTypes = {
     pdf: "PDF",
+    zip: "ZIP",
     docx: "Word",
     xlsx: "Excel",
     xls: "Excel",
@@ -66,6 +67,49 @@ function UploadDoc() {
     });
     setUploadProgress(initialProgress);
 
+    // Varios archivos (o un zip) se envían juntos al endpoint por lotes
+    if (files.length > 1 || files[0].name.toLowerCase().endsWith(".zip")) {
+      try {
+        const animations = files.map((file) => simulateUpload(file.name));
+
+        const formData = new FormData();
+        files.forEach((file) => formData.append("files", file));
+
+        const response = await axios.post(
+          "http://localhost:8000/upload/batch",
+          formData,
+          {
+            headers: {
+              "Content-Type": "multipart/form-data",
+            },
+          }
+        );
+
+        await Promise.all(animations);
+
+        const { completed, errors, throughput_cvs_per_minute } = response.data;
+        console.log("Lote procesado:", response.data);
+
+        setMessage({
+          text: `✅ Lote procesado: ${completed} correctos, ${errors} con error (${throughput_cvs_per_minute} CVs/min)`,
+          type: errors > 0 ? "error" : "success",
+        });
+      } catch (error) {
+        console.error("Error al subir el lote:", error);
+        setMessage({
+          text: `Error al subir el lote: ${
+            error.response?.data?.detail || error.message
+          }`,
+          type: "error",
+        });
+      }
+
+      setUploading(false);
+      setFiles([]);
+      if (fileInputRef.current) fileInputRef.current.value = "";
+      return;
+    }
+
     for (const file of files) {
       try {
         const uploadAnimation = simulateUpload(file.name);
@@ -85,11 +129,11 @@ function UploadDoc() {
 
         await uploadAnimation;
 
-        const { id, role, experience } = response.data;
+        const { job_id } = response.data;
         console.log(`Archivo ${file.name} subido exitosamente:`, response.data);
 
         setMessage({
-          text: `✅ ${file.name} subido correctamente (Rol: ${role}, Experiencia: ${experience})`,
+          text: `✅ ${file.name} subido correctamente (en proceso, job #${job_id})`,
           type: "success",
         });
 
@@ -145,7 +189,7 @@ function UploadDoc() {
             multiple
             onChange={handleFileChange}
             ref={fileInputRef}
-            accept=".pdf,.docx,.xlsx,.xls,.csv,.txt"
+            accept=".pdf,.zip,.docx,.xlsx,.xls,.csv,.txt"
             className="hidden"
           />
           <label